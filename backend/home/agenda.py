@@ -0,0 +1,69 @@
+"""
+The daily agenda behind the mobile home screen.
+
+One cache entry per user and day holds today's appointments, the
+medications to take today and the open to-do items, serialized. It is built
+on first access and deleted by the signal receivers in home.signals
+whenever one of its rows changes. Entries also expire after AGENDA_TTL, the
+bound on staleness when writes bypass signals (queryset updates) or the
+cache is not shared between processes.
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from hospital_operations.pharmacy.models import Medication
+from home.api.v1.serializers import AppointmentSerializer, ToDOListSerializer
+from patient.serializers import MedicationSerializer
+from users.models import Appointment, ToDoList
+
+AGENDA_TTL = 60 * 60
+
+
+def agenda_key(user_id, day):
+    return f'agenda:{user_id}:{day.isoformat()}'
+
+
+def build_agenda(user_id, day):
+    """
+    Returns the agenda of a user for a day, read from the database.
+    """
+    start_of_day = timezone.make_aware(datetime.combine(day, time.min))
+    start_of_next_day = start_of_day + timedelta(days=1)
+    appointments = AppointmentSerializer.setup_eager_loading(
+        Appointment.objects.filter(user=user_id, date=day)
+    ).order_by('consult_time', 'id')
+    medications = Medication.objects.filter(
+        prescription__user=user_id, frm__lt=start_of_next_day, to__gte=start_of_day
+    ).order_by('frm', 'id')
+    # open items, and the ones ticked off today
+    todos = ToDoList.objects.filter(
+        Q(completed=False) | Q(updated_at__gte=start_of_day), created_by=user_id
+    ).order_by('completed', '-created_at', '-id')
+    # plain lists, ReturnList keeps a reference to its serializer
+    return {
+        'date': day.isoformat(),
+        'appointments': list(AppointmentSerializer(appointments, many=True).data),
+        'medications': list(MedicationSerializer(medications, many=True).data),
+        'todos': list(ToDOListSerializer(todos, many=True).data),
+    }
+
+
+def get_agenda(user_id):
+    """
+    Returns today's agenda of a user, from the cache when possible.
+    """
+    day = timezone.localdate()
+    key = agenda_key(user_id, day)
+    agenda = cache.get(key)
+    if agenda is None:
+        agenda = build_agenda(user_id, day)
+        cache.set(key, agenda, AGENDA_TTL)
+    return agenda
+
+
+def invalidate_agenda(user_id):
+    if user_id:
+        cache.delete(agenda_key(user_id, timezone.localdate()))
@@ -16,17 +16,18 @@ from django.template.loader import render_to_string
 import requests
 from django.core.exceptions import ValidationError
 from django.contrib.auth import authenticate
+from django.db.models import CharField, OuterRef, Subquery, Value
 from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
-from users.models import User, UserProfile, PatientInfo, Doctor, Instructor, Feedback, Appointment, ToDoList, LikeDoctor
+from users.models import User, UserProfile, PatientInfo, Doctor, DoctorSchedule, DoctorSlot, Instructor, Feedback, Appointment, ToDoList, LikeDoctor
 from modules.two_factor_authentication.twofactorauth.utils import Util
 from modules.two_factor_authentication.twofactorauth.models import TwoFactorAuth
 from meeting.zoom.models import Zoom
+from home.signed_urls import deferred_url, sign_key, signed_url
+from home.thumbnails import derivative_urls, enqueue_derivatives
 
 
 import os
-import boto3
-from urllib.parse import urlparse
 import environ
  
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -127,10 +128,35 @@ class SignupWithEmailSerializer(serializers.ModelSerializer):
         """rest_auth passes request so we must override to accept it"""
         return super().save()
 
+class ImageDerivativesField(serializers.Field):
+    """
+    The signed URLs of the resized copies of a user's picture, by size and format.
+
+    Attributes:
+        image_field (str): The picture field of the user.
+        sizes (tuple): The sizes shown, all by default.
+    """
+
+    def __init__(self, image_field, sizes=None, **kwargs):
+        self.image_field = image_field
+        self.sizes = sizes
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, user):
+        # the cached responses of home.http_cache outlive the URLs, they are signed when sent
+        deferred = getattr(self.context.get('view'), 'defer_signing', False)
+        return derivative_urls(user, self.image_field, self.sizes, sign=deferred_url if deferred else sign_key)
+
+
 class UserSerializer(serializers.ModelSerializer):
+    # lists of doctors show the small face, not the original picture
+    profile_picture_sizes = ImageDerivativesField('profile_picture', sizes=('small', 'medium'))
+
     class Meta:
         model = User
-        fields = ['id', 'email', 'full_name', 'first_name', 'last_name', 'dob','full_name','phone_number', 'gender', 'profile_picture']
+        fields = ['id', 'email', 'full_name', 'first_name', 'last_name', 'dob','full_name','phone_number', 'gender', 'profile_picture', 'profile_picture_sizes']
 
 class DoctorListSerializer(serializers.ModelSerializer):    
     class Meta:
@@ -146,10 +172,26 @@ class DoctorSerializer(serializers.ModelSerializer):
         model = Doctor
         fields = ['user', 'id', 'age', 'address', 'about_doctor', 'specialized', 'qualification', 'available_time', 'working_days', 'working_hours', 'experience', 'favourite']
    
+    @staticmethod
+    def setup_eager_loading(queryset, user):
+        """
+        Loads the doctor's user and annotates the favourite flag of `user` as `user_favourite`,
+        so a page of doctors is serialized without a query per doctor.
+        """
+        queryset = queryset.select_related('user')
+        if user is None or not user.is_authenticated:
+            return queryset.annotate(user_favourite=Value(None, output_field=CharField()))
+        likes = LikeDoctor.objects.filter(doctor=OuterRef('pk'), user=user)
+        return queryset.annotate(user_favourite=Subquery(likes.values('favourite')[:1]))
+
     def get_favourite(self, obj):
-        # Assuming obj is a Doctor instance, retrieve its favourite status
-        #like_doctor = LikeDoctor.objects.filter(doctor=obj, user=user).first()
-        like_doctor = LikeDoctor.objects.filter(doctor=obj).first()
+        # The favourite status of the doctor for the requesting user
+        if hasattr(obj, 'user_favourite'):
+            return obj.user_favourite
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return None
+        like_doctor = LikeDoctor.objects.filter(doctor=obj, user=request.user).first()
         if like_doctor:
             return like_doctor.favourite
         return None
@@ -510,56 +552,36 @@ class AvatarSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         instance.avatar = validated_data.get('avatar', instance.avatar)
         instance.save()
+        if 'avatar' in validated_data:
+            enqueue_derivatives(instance, 'avatar')
         return instance        
 
 class UserDetailSerializer(serializers.ModelSerializer):
     avatar_signed_url = serializers.SerializerMethodField()
+    avatar_sizes = ImageDerivativesField('avatar')
     class Meta:
         model=User
-        fields=['name', 'full_name', 'gender', 'email', 'phone_number', 'avatar', 'avatar_signed_url']
+        fields=['name', 'full_name', 'gender', 'email', 'phone_number', 'avatar', 'avatar_signed_url', 'avatar_sizes']
  
     def get_avatar_signed_url(self, obj):
-            avatar_url = obj.avatar.url if obj.avatar else None
-            # Extract the object key from the avatar URL
-            if avatar_url:
-                parsed_url = urlparse(avatar_url)
-                object_key = parsed_url.path[1:]  # Remove the leading slash
-                # Generate a signed URL using the extracted object key
-                s3 = boto3.client('s3',
-                                region_name=env.str("AWS_STORAGE_REGION", ""),
-                                config=boto3.session.Config(signature_version='s3v4'))
-                expiration_time = 3600  # URL expires after 1 hour
-                signed_url = s3.generate_presigned_url(
-                    'get_object', Params = {'Bucket': 'loopafrica-44703', 'Key': object_key},
-                    ExpiresIn = expiration_time, HttpMethod='GET'
-                )
-                return signed_url
-            else:
-                return None
+        # URL expires after 1 hour
+        return signed_url(obj.avatar)
+
+    def update(self, instance, validated_data):
+        instance = super().update(instance, validated_data)
+        if 'avatar' in validated_data:
+            enqueue_derivatives(instance, 'avatar')
+        return instance
             
 class UserProfilePicUpdateSerializer(serializers.ModelSerializer):
     profile_picture_signed_url = serializers.SerializerMethodField()
+    profile_picture_sizes = ImageDerivativesField('profile_picture')
     class Meta:
         model = User
-        fields = ['id', 'profile_picture', 'profile_picture_signed_url']
+        fields = ['id', 'profile_picture', 'profile_picture_signed_url', 'profile_picture_sizes']
  
     def get_profile_picture_signed_url(self, obj):
-        profile_picture_url = obj.profile_picture.url if obj.profile_picture else None
- 
-        if profile_picture_url:
-            parsed_url = urlparse(profile_picture_url)
-            object_key = parsed_url.path[1:]   # Remove the leading slash
-            # Generate a signed URL using the extracted object key
-            s3 = boto3.client('s3', region_name=env.str("AWS_STORAGE_REGION", ""),
-                                config=boto3.session.Config(signature_version='s3v4'))
-            #expiration_time = 3600    # URL expires after 1 hour
-            signed_url = s3.generate_presigned_url(
-                    'get_object', Params = {'Bucket': 'loopafrica-44703', 'Key': object_key},
-                    HttpMethod='GET'
-                )
-            return signed_url
-        else:
-            return None
+        return signed_url(obj.profile_picture)
    
     def update(self, instance, validated_data):
         profile_picture = validated_data.get('profile_picture', None)
@@ -567,6 +589,8 @@ class UserProfilePicUpdateSerializer(serializers.ModelSerializer):
         if profile_picture:
             instance.profile_picture = profile_picture
             instance.save()
+            # the copies are written by the job worker, the response shows no sizes yet
+            enqueue_derivatives(instance, 'profile_picture')
         return instance
  
 
@@ -599,6 +623,13 @@ class AppointmentSerializer(serializers.ModelSerializer):
         model = Appointment
         fields = '__all__'
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Loads the doctor, its user and the Zoom meetings for every appointment in bulk.
+        """
+        return queryset.select_related('doctor__user').prefetch_related('zoom_appointment')
+
     def get_doctor_name(self, obj):        
         return obj.doctor.user.name if obj.doctor else None
 
@@ -763,6 +794,29 @@ class ToDOListSerializer(serializers.ModelSerializer):
         model = ToDoList
         fields = '__all__'
 
+class DoctorScheduleSerializer(serializers.ModelSerializer):
+    """
+    Serializer class for a weekly working period of a doctor.
+    """
+    class Meta:
+        model = DoctorSchedule
+        fields = ['weekday', 'start_time', 'end_time', 'slot_minutes']
+
+    def validate(self, attrs):
+        if attrs['start_time'] >= attrs['end_time']:
+            raise serializers.ValidationError("The start time must be before the end time.")
+        if not 0 < attrs.get('slot_minutes', 30) <= 24 * 60:
+            raise serializers.ValidationError("The slot length must be between 1 and 1440 minutes.")
+        return attrs
+
+class DoctorSlotSerializer(serializers.ModelSerializer):
+    """
+    Serializer class for a free slot of a doctor.
+    """
+    class Meta:
+        model = DoctorSlot
+        fields = ['date', 'start_time', 'end_time']
+
 class LikeDoctorSerializer(serializers.ModelSerializer):
     """
     Serializer class for LikeDoctor model.
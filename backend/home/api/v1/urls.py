@@ -15,7 +15,10 @@ from home.api.v1.viewsets import (
     DoctorViewSet,
     ToDoListViewSet,
     ResetPasswordView,
+    TodayView,
 )
+from jobs.viewsets import JobViewSet
+from integrations.views import IntegrationMetricsView
 
 router = DefaultRouter()
 router.register("signup", SignupViewSet, basename="signup")
@@ -24,6 +27,7 @@ router.register("feedback", FeedbackViewSet, basename="feedback")
 router.register(r'user-profiles', UserProfileViewSet, basename='user-profiles')
 router.register(r'doctors', DoctorViewSet, basename='doctors')
 router.register(r'todo', ToDoListViewSet, basename='todo-list')
+router.register(r'jobs', JobViewSet, basename='jobs')
 
 urlpatterns = [
     path("", include(router.urls)),
@@ -37,6 +41,8 @@ urlpatterns = [
     path('appointments/', AppointmentViewSet.as_view({'get':'list'}), name='list_appointments'),
     path('appointments/<int:pk>/', AppointmentViewSet.as_view({'get':'retrieve'}), name='get_appointment'),    
     path('appointments/todo_appointments/<int:user_id>/', AppointmentViewSet.as_view({'get': 'todo_appointments'}), name='todo_appointments'),
+    path('today/<int:user_id>/', TodayView.as_view(), name='today'),
     path('doctors/<int:pk>/favourite/', DoctorViewSet.as_view({'post': 'favourite'}), name='favourite'),
     path('resetpassword/',ResetPasswordView.as_view(), name='resetpassword'),
+    path('integrations/metrics/', IntegrationMetricsView.as_view(), name='integration_metrics'),
 ]
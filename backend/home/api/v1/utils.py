@@ -1,56 +1,91 @@
 import os
-import requests
 import json
- 
+from integrations.http import get_client
+from modules.django_push_notifications.push_notifications.resolver import resolve_subscription_ids
+
 APP_ID = os.environ.get('ONESIGNAL_APP_ID')
 REST_API_KEY = os.environ.get('ONESIGNAL_REST_API_KEY')
- 
-def send_push_notification(ids,message_title,message_body, consult_time, appointment_date, doctor_name, zoom_link, zoom_meeting_id, zoom_passcode):
-    headers = {
-                "accept": "application/json",
-                "content-type": "application/json",
-                "Authorization": f"Basic {REST_API_KEY}"
-            }
-    try:
-        subscription_ids = []
-        external_user_ids=[]
-        for id in ids:  
-            url = f"https://api.onesignal.com/apps/{APP_ID}/users/by/external_id/{id}"
-            response = requests.get(url, headers=headers)
-            data = response.json()
-            
-            if data.get('subscriptions',None):
-                subscription_ids.extend( item["id"] for item in data['subscriptions'])
-                external_user_ids.append(str(id)) # append external user id
+# OneSignal accepts at most 2000 external user ids and 2000 subscription ids per notification
+MAX_RECIPIENTS_PER_SEND = 2000
+
+def push_batches(resolved):
+    """
+    Splits the subscribed users of `resolved` into batches of at most
+    MAX_RECIPIENTS_PER_SEND subscription ids, each user's subscriptions in one batch.
+    """
+    batches, batch, size = [], [], 0
+    for external_id, subscription_ids in resolved.items():
         if not subscription_ids:
-            return
-        data = {
+            continue
+        if batch and size + len(subscription_ids) > MAX_RECIPIENTS_PER_SEND:
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(external_id)
+        size += len(subscription_ids)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def send_push(ids, message_title, data, on_sent=None):
+    """
+    Sends one push notification with `data` to every subscribed user in `ids`.
+
+    Subscription ids come from the local subscription cache, so a send to many
+    users costs one notification call per MAX_RECIPIENTS_PER_SEND subscriptions
+    rather than one lookup per user. Returns the ids of the notifications sent.
+
+    `on_sent` is called with the external ids of each batch once it is sent,
+    so a caller retried after a failed batch can leave out the users reached.
+
+    Raises:
+        requests.RequestException: If OneSignal cannot be reached or answers with an error.
+    """
+    resolved = resolve_subscription_ids(ids)
+    url = "https://onesignal.com/api/v1/notifications"
+    headers = {
+            "accept": "application/json",
+            "content-type": "application/json",
+            "Authorization": f"Basic {REST_API_KEY}"
+        }
+    notification_ids = []
+    for batch in push_batches(resolved):
+        payload = {
             "app_id": APP_ID,
-            "include_external_user_ids": external_user_ids, # include external user id
-            "include_player_ids": [sub_id for sub_id in subscription_ids],
+            "include_external_user_ids": batch, # include external user id
+            "include_player_ids": [sub_id for external_id in batch for sub_id in resolved[external_id]],
             "target_channel": "push",
-            "data": {
-                 "message": message_body,
-                 "doctor_name": doctor_name,
-                 "consult_time":consult_time,
-                 "appointment_date":appointment_date,
-                 "zoom_link":zoom_link,
-                 "zoom_meeting_id":zoom_meeting_id,
-                 "zoom_passcode":zoom_passcode
-            },
+            "data": data,
             "contents": {"en": message_title}
             }
-        url = "https://onesignal.com/api/v1/notifications"
-        headers = {
-                "accept": "application/json",
-                "content-type": "application/json",
-                "Authorization": f"Basic {REST_API_KEY}"
-            }
-        res = requests.post(url, json=data, headers=headers)
+        res = get_client('onesignal').post(url, json=payload, headers=headers, endpoint="notifications")
+        # an error response fails the send, the job calling it is retried
+        res.raise_for_status()
         var = res.json()
         #extract notification id from the response
-        notification_id = var.get('id')
-        
-        return notification_id
-    except Exception as e:
-            print(e)
\ No newline at end of file
+        notification_ids.append(var.get('id'))
+        if on_sent:
+            on_sent(batch)
+    return notification_ids
+
+def appointment_push_data(message_body, consult_time, appointment_date, doctor_name, zoom_link, zoom_meeting_id, zoom_passcode):
+    return {
+        "message": message_body,
+        "doctor_name": doctor_name,
+        "consult_time": consult_time,
+        "appointment_date": appointment_date,
+        "zoom_link": zoom_link,
+        "zoom_meeting_id": zoom_meeting_id,
+        "zoom_passcode": zoom_passcode,
+    }
+
+def send_push_notification(ids,message_title,message_body, consult_time, appointment_date, doctor_name, zoom_link, zoom_meeting_id, zoom_passcode):
+    """
+    Sends the appointment push notification to every subscribed user in `ids`.
+
+    Returns the id of the first notification sent. Failed calls raise, so a
+    job sending the notification is retried.
+    """
+    notification_ids = send_push(ids, message_title, appointment_push_data(
+        message_body, consult_time, appointment_date, doctor_name, zoom_link, zoom_meeting_id, zoom_passcode,
+    ))
+    return notification_ids[0] if notification_ids else None
@@ -1,5 +1,3 @@
-import os
-import requests
 from rest_framework.authtoken.serializers import AuthTokenSerializer
 from rest_framework.viewsets import ModelViewSet, ViewSet
 from rest_framework.authtoken.models import Token
@@ -10,23 +8,25 @@ from rest_framework import status, filters
 from rest_framework.mixins import UpdateModelMixin
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-from users.models import User, Feedback, Appointment, UserProfile, Doctor, ToDoList, LikeDoctor
-from meeting.zoom.models import Zoom
+from users.models import User, Feedback, Appointment, UserProfile, Doctor, DoctorSchedule, ToDoList, LikeDoctor
+from users.access import can_view_records
 from rest_framework.decorators import action
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from rest_framework.pagination import LimitOffsetPagination
 from django_filters.rest_framework import DjangoFilterBackend
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Case, When, Value, IntegerField
-from meeting.zoom.utils import create_meeting, generate_token
-from modules.two_factor_authentication.twofactorauth.utils import Util
-from modules.django_push_notifications.push_notifications.models import Notification
-from home.api.v1.utils import send_push_notification
-
-APP_ID = os.environ.get('ONESIGNAL_APP_ID')
-REST_API_KEY = os.environ.get('ONESIGNAL_REST_API_KEY')
+from home.agenda import get_agenda
+from home.http_cache import conditional_get
+from home.search import AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT, DoctorSearchFilter, autocomplete, search_doctors, specialization_facets
+from home.slots import SlotUnavailable, claim_slot, free_slots, rebuild_slots
+from home.tasks import enqueue_appointment_jobs
+from meeting.zoom.pool import claim_meeting, enqueue_refill
+from modules.django_push_notifications.push_notifications.tasks import enqueue_registration
+from jobs.serializers import JobSerializer
 
 from home.api.v1.serializers import (
     SignupSerializer,
@@ -42,6 +42,8 @@ from home.api.v1.serializers import (
     SendPasswordResetEmailSerializer,
     ChangePasswordSerializer,
     DoctorSerializer,
+    DoctorScheduleSerializer,
+    DoctorSlotSerializer,
     ToDOListSerializer,
     ResetPasswordSerializer,
 )
@@ -72,7 +74,7 @@ class SignUpWithEmailView(CreateAPIView):
         user_serializer = UserSerializer(user)
         return Response({"token": token.key, "user": user_serializer.data})
 
-#This is the loginviewset to register and subscribe user to onesignal.
+#This is the loginviewset, it queues the onesignal registration of new users.
 class LoginViewSet(ViewSet):
     """Based on rest_framework.authtoken.views.ObtainAuthToken"""
  
@@ -85,52 +87,10 @@ class LoginViewSet(ViewSet):
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data["user"]
         token, created = Token.objects.get_or_create(user=user)
-        
-        try:
-            user_id = user.id
-            headers = {
-                "accept": "application/json",
-                "content-type": "application/json",
-                "Authorization": f"Basic {REST_API_KEY}"
-            }
- 
-            # Check if the user is already subscribed
-            url = f"https://api.onesignal.com/apps/{APP_ID}/users/by/external_id/{user_id}"
-            response = requests.get(url, headers=headers)
-            data = response.json()
-            if data.get('id'):
-                # User is already subscribed, no need to subscribe again
-                pass
-            else:
-                # Register the user with OneSignal
-                url = f"https://api.onesignal.com/apps/{APP_ID}/users"
-                user_payload = {
-                    "identity": { "external_id": f"{user_id}" }
-                }
-                user_response = requests.post(url, json=user_payload, headers=headers)
-                # Subscribe the user to Android push notifications
-                android_sub_payload = {
-                    "subscription": {
-                        "type": "AndroidPush",
-                        "enabled": True,
-                        "token": str(user_id)  # Using user's ID as token
-                    }
-                }
-                android_sub_url = f"https://api.onesignal.com/apps/{APP_ID}/users/by/external_id/{user_id}/subscriptions"
-                android_sub_response = requests.post(android_sub_url, json=android_sub_payload, headers=headers)
-                # Subscribe the user to iOS push notifications
-                ios_sub_payload = {
-                    "subscription": {
-                        "type": "iOSPush",
-                        "enabled": True,
-                        "token": str(user_id)  # Using user's ID as token
-                    }
-                }
-                ios_sub_url = f"https://api.onesignal.com/apps/{APP_ID}/users/by/external_id/{user_id}/subscriptions"
-                ios_sub_response = requests.post(ios_sub_url, json=ios_sub_payload, headers=headers)
-        except Exception as e:
-            print(e)  # Handle errors, e.g., log them
-            pass
+
+        # Registering the user with OneSignal runs on the background worker,
+        # users that are already registered cost no external call.
+        enqueue_registration(user)
  
         user_serializer = UserSerializer(user)
  
@@ -296,7 +256,7 @@ class AppointmentViewSet(ModelViewSet):
     - todo_appointments: Get the list of appointments for a specific user on the current day.
     """
  
-    queryset = Appointment.objects.all()
+    queryset = AppointmentSerializer.setup_eager_loading(Appointment.objects.all())
     serializer_class = AppointmentSerializer
     permission_classes = [IsAuthenticated]
  
@@ -307,79 +267,35 @@ class AppointmentViewSet(ModelViewSet):
         Parameters:
         - request: The HTTP request object.
  
+        A pre-created Zoom meeting is claimed from the pool when one is available,
+        so the meeting details are returned right away. Otherwise the meeting is
+        created by a background job, like the confirmation emails and the push
+        notification. The client polls the returned jobs, or the appointment
+        itself, for the meeting details.
+
+        The booking claims the doctor's slot in the same transaction, see home.slots.
+
         Returns:
-        - If the appointment is created successfully, returns the serialized appointment data with HTTP status 201.
+        - If the appointment is created successfully, returns the serialized appointment data and its jobs with HTTP status 201.
         - If the appointment data is invalid, returns the validation errors with HTTP status 400.
+        - If the slot is booked already or not in the doctor's schedule, returns the error with HTTP status 409.
         """
         serializer = AppointmentSerializer(data=request.data)
         if serializer.is_valid():
-            # serializer.save()
-            appointment = serializer.save()
- 
-            # Calculate start time dynamically (Example: Start time is appointment date + appointment consult time)
-            start_time = datetime.combine(appointment.date, appointment.consult_time).isoformat()
- 
-            # Call create_meeting function from utils.py to create a Zoom meeting with appointment object
-            meeting_response = create_meeting(topic="Consultation", type=2, start_time=start_time, userId=appointment.user.email, appointment=appointment)
-            print(f"Meeting response: {meeting_response}")
-            if meeting_response:                
-                body_data=""
-                if meeting_response.join_url:
-                    body_data +=f"Booking successful. Here is the zoom meeting link: {meeting_response.join_url}\nMeeting ID: {meeting_response.meeting_id}\nPasscode: {meeting_response.password}"
-                   
-                    # If the meeting is created successfully, send confirmation email to the user and doctor
- 
-                    # prepare email data for the user
-                    user_email_data = {
-                    'subject' : "Appointment Confirmation",
-                    'body' : body_data, # here we can add the appointment details in the mail
-                    'to_email' : appointment.user.email  #add doctor's email
-                   
-                    }
-                    # Send confirmation email using send_email function from utils.py
-                    user_mail=Util.send_email(user_email_data)                    
-       
-                    #prepare email data for the doctor
-                    doctor_email_data = {
-                        'subject' : "New Appointment",
-                        'body' : body_data, # here we can add the appointment details in the mail
-                        'to_email' : appointment.doctor.user.email  #add doctor's email
-                    }
-                    
-                    doctor_mail=Util.send_email(doctor_email_data)
-                    
-                else:
-                    return Response({"error": "Zoom meeting details n"}, status=status.HTTP_400_BAD_REQUEST)
-           
-            #convert consult_time to string
-            consult_time_str = appointment.consult_time.strftime('%H:%M:%S')
-            appointment_date_str = appointment.date.strftime('%Y-%m-%d')
-            # call send_push_notification function from utils.py to send push notification to the user
-            
-            notification_id = send_push_notification(
-                [str(appointment.user.id)],
-                message_title="Appointment",
-                message_body="Your appointment has been scheduled successfully",
-                appointment_date=appointment_date_str,
-                consult_time=consult_time_str,
-                doctor_name=appointment.doctor.user.username,
-                zoom_link=meeting_response.join_url,
-                zoom_meeting_id=meeting_response.meeting_id,
-                zoom_passcode=meeting_response.password
-            )
-            # after sending the push notification, save the notification in the database
-            if notification_id:
-                notification = Notification.objects.create(
-                    user=appointment.user,
-                    appointment=appointment,
-                    message="Your appointment has been scheduled successfully. Please check your email for the Zoom meeting link.",
-                    notification_id=notification_id,
-                    Notification_type="push",  # Assuming it's a push notification
-                    title="Appointment",
-                    created_at=timezone.now(),
-                )                
-            # get the response with both the appointment and meeting details
-           
+            # Save the appointment and queue its side effects in one transaction,
+            # the worker picks the jobs up once the booking is committed.
+            try:
+                with transaction.atomic():
+                    appointment = serializer.save()
+                    claim_slot(appointment)
+                    meeting = claim_meeting(appointment)
+                    jobs = enqueue_appointment_jobs(appointment)
+                    if meeting is not None:
+                        enqueue_refill()
+            except SlotUnavailable as e:
+                return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+            # get the response with the appointment, without a pooled meeting it is filled in by the worker
             response_data ={
                 'appointment':{
                     'id':appointment.id,
@@ -394,10 +310,11 @@ class AppointmentViewSet(ModelViewSet):
                     'health_issue':appointment.health_issue
                 },
                 'meeting':{
-                    'meeting_id':meeting_response.meeting_id,
-                    'join_url':meeting_response.join_url,
-                    'passcode':meeting_response.password
-                }
+                    'meeting_id':meeting.meeting_id if meeting else None,
+                    'join_url':meeting.join_url if meeting else None,
+                    'passcode':meeting.password if meeting else None
+                },
+                'jobs':JobSerializer(jobs, many=True).data
             }
             return Response(response_data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -433,12 +350,6 @@ class AppointmentViewSet(ModelViewSet):
 
         # Filter appointments queryset
         appointments_queryset = self.get_queryset().filter(user=request.user, date__gte=today_date)
-        
-        print(f"Appointments queryset: {appointments_queryset.first()}")
-
-        # Filter Zoom objects associated with the filtered appointments
-        zooms_queryset = Zoom.objects.filter(appointment__in=appointments_queryset)
-        print(f"Zooms queryset: {zooms_queryset.first()}")
 
         serializer = AppointmentSerializer(appointments_queryset, many=True)
         return Response(serializer.data)
@@ -493,11 +404,28 @@ class AppointmentViewSet(ModelViewSet):
         - Returns the serialized data of the appointments for the user on the current day with HTTP status 200.
         """
         today = datetime.now().date()
-        today_appointments = Appointment.objects.filter(user=user_id, date=today)
+        today_appointments = self.get_queryset().filter(user=user_id, date=today)
         serializer = AppointmentSerializer(today_appointments, many=True)
         return Response(serializer.data)
 
 
+class TodayView(APIView):
+    """
+    Everything the home screen shows for today in one request: the
+    appointments, the medications to take and the to-do items of a user.
+
+    The agenda is cached per user and day and rebuilt after any of its rows
+    changes, see home.agenda. Only staff and doctors read the agenda of
+    another user.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, user_id):
+        if not can_view_records(request.user, user_id):
+            return Response({"error": "You can only view your own agenda"}, status=status.HTTP_403_FORBIDDEN)
+        return Response(get_agenda(user_id))
+
+
 class UserProfileViewSet(ModelViewSet):
     """
     A viewset for managing user profiles.
@@ -587,13 +515,27 @@ class DoctorViewSet(ModelViewSet):
     queryset = Doctor.objects.all()
     serializer_class = DoctorSerializer
 
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
-    search_fields = ['user__full_name','user__first_name','user__last_name','specialized', 'qualification']
-    ordering_fields = ['user__full_name','user__firs_name','user__last_name','specialized']
+    # `search` matches the names, specialization and qualification, see home.search
+    filter_backends = [DoctorSearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    ordering_fields = ['user__full_name','user__first_name','user__last_name','specialized']
     ordering = ['user__full_name','user__first_name','user__last_name','specialized']
 
     # Pagination
     pagination_class = LimitOffsetPagination
+    # The longest period of free slots listed at once
+    SLOT_RANGE_DAYS = 31
+
+    def get_queryset(self):
+        return DoctorSerializer.setup_eager_loading(super().get_queryset(), self.request.user)
+
+    # the directory and profiles carry the requesting user's favourite flag
+    @conditional_get('doctors', last_modified_field='last_updated_date', per_user=True)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get('doctors', last_modified_field='last_updated_date', per_user=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
     
     @action(detail=False, methods=['get'])
     def patient_count(self, request):
@@ -602,18 +544,19 @@ class DoctorViewSet(ModelViewSet):
             return Response({'error': 'Doctor ID is required.'}, status=status.HTTP_400_BAD_REQUEST)
         
         doctor = get_object_or_404(Doctor, id=doctor_id)
-        patient_count = doctor.appointment_set.filter(status='Completed').count()
+        patient_count = doctor.doctor_appointment.filter(status='Completed').count()
         return Response({'patient_count': patient_count}, status=status.HTTP_200_OK)
     
     @action(detail=False, methods=['get'])
+    @conditional_get('doctors', last_modified_field='last_updated_date', per_user=True)
     def doctor_specialized(self, request):
         specialized = request.query_params.get('specialization')
         if not specialized:
             return Response({'error': 'specialized param is required.'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Ensure Doctor queryset contains Doctor instances
-        doctors = Doctor.objects.filter(specialized=specialized)
-        serializer = DoctorSerializer(doctors, many=True)
+        doctors = self.get_queryset().filter(specialized=specialized)
+        serializer = self.get_serializer(doctors, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'])
@@ -638,28 +581,119 @@ class DoctorViewSet(ModelViewSet):
             except ValueError:
                 return Response({'error': 'Invalid date format. Please use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
            
-            appointments = doctor.appointment_set.filter(date=date)
+            appointments = doctor.doctor_appointment.filter(date=date)
         else:
             # If date parameter is not provided, retrieve all appointments for the doctor
-            appointments = doctor.appointment_set.all()
-       
+            appointments = doctor.doctor_appointment.all()
+
+        appointments = AppointmentSerializer.setup_eager_loading(appointments)
         serializer = AppointmentSerializer(appointments, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Suggest doctors by name as the user types.
+
+        Parameters:
+        - request: The HTTP request object, with the typed prefix `q` and an optional `limit`.
+
+        Returns:
+        - The doctors with a name word starting with `q`, by name, with HTTP status 200.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT)), MAX_AUTOCOMPLETE_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(autocomplete(request.query_params.get('q', ''), max(limit, 1)), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Count the doctors per specialization.
+
+        Parameters:
+        - request: The HTTP request object, with an optional `search` to count the matching doctors only.
+
+        Returns:
+        - The specializations with their doctor counts, most doctors first, with HTTP status 200.
+        """
+        query = request.query_params.get('search', '')
+        doctors = search_doctors(Doctor.objects.all(), query) if query.strip() else None
+        return Response({'specialized': specialization_facets(doctors)}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def slots(self, request, pk=None):
+        """
+        List the free slots of a doctor.
+
+        Parameters:
+        - request: The HTTP request object, with the optional `from` and `to` dates (YYYY-MM-DD).
+        - pk: The ID of the doctor.
+
+        Returns:
+        - The free slots from `from` (default today) to `to` (default six days later) with HTTP status 200.
+        - If a date is invalid or the period is longer than SLOT_RANGE_DAYS, returns the error with HTTP status 400.
+        """
+        doctor = get_object_or_404(Doctor, pk=pk)
+        today = timezone.localdate()
+        try:
+            start = datetime.strptime(request.query_params['from'], '%Y-%m-%d').date() if 'from' in request.query_params else today
+            end = datetime.strptime(request.query_params['to'], '%Y-%m-%d').date() if 'to' in request.query_params else start + timedelta(days=6)
+        except ValueError:
+            return Response({'error': 'Invalid date format. Please use YYYY-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start:
+            return Response({'error': '"to" must not be before "from".'}, status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days >= self.SLOT_RANGE_DAYS:
+            return Response({'error': f'The period can be {self.SLOT_RANGE_DAYS} days at most.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        slots = free_slots(doctor.id, max(start, today), end)
+        return Response({
+            'doctor': doctor.id,
+            'from': start,
+            'to': end,
+            'slots': DoctorSlotSerializer(slots, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get', 'put'])
+    def schedule(self, request, pk=None):
+        """
+        Retrieve or replace the weekly schedule of a doctor.
+
+        Parameters:
+        - request: The HTTP request object, a PUT sends the list of working periods.
+        - pk: The ID of the doctor.
+
+        A PUT replaces every period and regenerates the free slots, booked slots are kept.
+        Only the doctor or a staff user can change the schedule.
+
+        Returns:
+        - The working periods of the doctor with HTTP status 200.
+        - If the periods are invalid, returns the validation errors with HTTP status 400.
+        """
+        doctor = get_object_or_404(Doctor, pk=pk)
+        if request.method == 'PUT':
+            if not (request.user.is_authenticated and (request.user.is_staff or request.user.id == doctor.user_id)):
+                return Response({'error': 'You can only change your own schedule.'}, status=status.HTTP_403_FORBIDDEN)
+            serializer = DoctorScheduleSerializer(data=request.data, many=True)
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic():
+                doctor.schedules.all().delete()
+                DoctorSchedule.objects.bulk_create(
+                    DoctorSchedule(doctor=doctor, **period) for period in serializer.validated_data
+                )
+                rebuild_slots(doctor.id)
+        serializer = DoctorScheduleSerializer(doctor.schedules.all(), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get', 'post'])
     def favourite(self, request, pk=None):
         user = request.user
         if request.method == 'GET':
-            # Handle GET request for listing favourite doctors
-            favorite_doctors = Doctor.objects.filter(like_doctor_doctor__user=user, like_doctor_doctor__favourite='1').annotate(
-            favourite_order=Value(0, output_field=IntegerField())
-            )
-            # Get non-favorite doctors with annotation for ordering
-            non_favorite_doctors = Doctor.objects.exclude(like_doctor_doctor__user=user, like_doctor_doctor__favourite='1').annotate(
-                favourite_order=Value(1, output_field=IntegerField())
-            )
-            # Concatenate favorite and non-favorite doctors and order by the annotated field
-            all_doctors = favorite_doctors.union(non_favorite_doctors).order_by('favourite_order', '-last_updated_date')
+            # Handle GET request for listing doctors with the user's favourites first
+            all_doctors = self.get_queryset().annotate(
+                favourite_order=Case(When(user_favourite='1', then=Value(0)), default=Value(1), output_field=IntegerField())
+            ).order_by('favourite_order', '-last_updated_date')
             serializer = self.get_serializer(all_doctors, many=True)
             return Response(serializer.data)
        
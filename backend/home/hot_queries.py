@@ -0,0 +1,149 @@
+"""
+Registry of the hot read queries, checked by the explain_hot_queries command.
+
+Each entry builds the queryset an endpoint runs, with parameters taken from
+existing rows when there are any, so the plan matches what production sees.
+"""
+import re
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from home.pagination import KeysetCursorPagination
+from hospital_operations.emr.models import MedicalRecord
+from hospital_operations.pharmacy.models import Medication, Prescription
+from modules.two_factor_authentication.twofactorauth.models import Verify
+from patient.timeline import PAGE_SIZE, STREAMS, TYPES
+from users.models import Appointment, Vitals
+
+HOT_QUERIES = {}
+
+
+def hot_query(name):
+    """
+    Registers a function returning a queryset under `name`.
+    """
+    def register(func):
+        HOT_QUERIES[name] = func
+        return func
+    return register
+
+
+def sample_appointment():
+    return Appointment.objects.values('user_id', 'doctor_id', 'date', 'consult_time').first() or {
+        'user_id': 1, 'doctor_id': 1, 'date': timezone.localdate(), 'consult_time': '10:00',
+    }
+
+
+@hot_query('appointments.list')
+def appointments_list():
+    return Appointment.objects.filter(user_id=sample_appointment()['user_id'], date__gte=timezone.localdate())
+
+
+@hot_query('appointments.todo')
+def appointments_todo():
+    return Appointment.objects.filter(user_id=sample_appointment()['user_id'], date=timezone.localdate())
+
+
+@hot_query('appointments.doctor_appointments')
+def doctor_appointments():
+    appointment = sample_appointment()
+    return Appointment.objects.filter(doctor_id=appointment['doctor_id'], date=appointment['date'])
+
+
+@hot_query('appointments.update_feedback')
+def update_feedback():
+    return Appointment.objects.filter(**sample_appointment())
+
+
+@hot_query('doctors.patient_count')
+def patient_count():
+    return Appointment.objects.filter(doctor_id=sample_appointment()['doctor_id'], status='Completed')
+
+
+@hot_query('prescriptions.todo_medication')
+def todo_medication():
+    start_of_today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    user_id = Prescription.objects.values_list('user_id', flat=True).first() or 1
+    return Medication.objects.filter(prescription__user=user_id, frm__lt=start_of_today + timedelta(days=1), to__gte=start_of_today)
+
+
+@hot_query('prescriptions.medicationlist')
+def medicationlist():
+    user_id = Prescription.objects.values_list('user_id', flat=True).first() or 1
+    return Prescription.objects.filter(user=user_id).order_by('-id')[:1]
+
+
+@hot_query('medical_records.list')
+def medical_records():
+    record = MedicalRecord.objects.values('user_id', 'frmdate', 'todate').first() or {}
+    today = timezone.localdate()
+    return MedicalRecord.objects.filter(
+        user_id=record.get('user_id') or 1,
+        frmdate__gte=record.get('frmdate') or today - timedelta(days=30),
+        todate__lte=record.get('todate') or today,
+    ).order_by('-created_at', '-id')[:KeysetCursorPagination.page_size + 1]
+
+
+@hot_query('vitals.list')
+def vitals_list():
+    # a cursor page of VitalsViewSet for one patient
+    user_id = Vitals.objects.values_list('user_id', flat=True).first() or 1
+    return Vitals.objects.filter(user=user_id).order_by('-created_at', '-id')[:KeysetCursorPagination.page_size + 1]
+
+
+@hot_query('vitals.history')
+def vitals_history():
+    user_id = Vitals.objects.values_list('user_id', flat=True).first() or 1
+    return Vitals.objects.filter(user=user_id, date__gte=timezone.localdate() - timedelta(days=30))
+
+
+def timeline_stream(entry_type):
+    def query():
+        # a page below the newest entries of a patient, as the cursors ask for
+        stream = STREAMS[entry_type]
+        user_id = stream.model.objects.values_list('user_id', flat=True).first() or 1
+        return stream.rows(user_id, None, None, (timezone.now(), len(TYPES), 0), PAGE_SIZE + 1)
+    return query
+
+
+for entry_type in STREAMS:
+    hot_query(f'timeline.{entry_type}')(timeline_stream(entry_type))
+
+
+@hot_query('two_factor.verify')
+def verify_code():
+    verify = Verify.objects.values('email', 'code').first() or {'email': 'user@example.com', 'code': 123456}
+    return Verify.objects.filter(**verify)
+
+
+def explain(queryset):
+    """
+    Returns the EXPLAIN output of a queryset.
+
+    PostgreSQL reads a small or empty table whole whatever its indexes, so
+    sequential scans are turned off for the statement and a Seq Scan is left
+    only where no index serves the query.
+    """
+    connection = connections[queryset.db]
+    with transaction.atomic(using=queryset.db):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def sequential_scans(plan, vendor):
+    """
+    Returns the lines of an EXPLAIN output that read a whole table.
+    """
+    lines = plan.splitlines()
+    if vendor == 'postgresql':
+        return [line.strip() for line in lines if 'Seq Scan' in line]
+    if vendor == 'sqlite':
+        # "SCAN users_vitals" reads the table, "SCAN ... USING INDEX" only walks an index
+        return [line.strip() for line in lines if re.search(r'\bSCAN (TABLE )?\w+\s*$', line)]
+    if vendor == 'mysql':
+        return [line.strip() for line in lines if re.search(r'\bALL\b', line)]
+    return []
@@ -0,0 +1,135 @@
+"""
+Cached responses and conditional GET for rarely changing reference data.
+
+`conditional_get(scope)` wraps a GET method of a viewset. The first request
+of a URL runs the view and caches its data with a strong ETag (the hash of
+the rendered JSON) and a Last-Modified from the time the entry was built,
+or the newest `updated_at` of the viewset's rows when that is later. The
+rows alone would miss the changes that only invalidate the scope, like a
+new favourite or a renamed user. Later requests are answered from the cache without touching
+the serializers, and a request whose If-None-Match or If-Modified-Since
+still matches gets a 304 without a body.
+
+The URLs of a scope are cached under the scope's current version. The
+receivers in home.signals drop the version once a change to a model of the
+scope is committed, which orphans every cached URL of the scope at once.
+Responses that depend on the user, like the favourite flag of doctors, are
+cached per user.
+
+Signed URLs expire long before the entries do, so the entries hold
+placeholders for them and the URLs are signed each time a response is
+sent, see home.signed_urls. The ETag of such a response also covers its
+URLs and it has no Last-Modified, a client's copy is only current while
+its URLs are the ones being sent.
+"""
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from home.signed_urls import sign_deferred
+
+RESPONSE_CACHE_TTL = 24 * 60 * 60
+
+
+def version_key(scope):
+    return f'http_cache:{scope}'
+
+
+def scope_version(scope):
+    key = version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # the first request after an invalidation starts the new version
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_scope(scope):
+    cache.delete(version_key(scope))
+
+
+def response_key(scope, request, per_user):
+    user = request.user.pk if per_user and request.user.is_authenticated else '-'
+    path = hashlib.sha256(request.get_full_path().encode()).hexdigest()
+    return f'http_cache:{scope}:{scope_version(scope)}:{user}:{request.accepted_media_type}:{path}'
+
+
+def last_modified(view, field, kwargs):
+    """
+    Returns the newest `field` of the object or the rows of the view, as a timestamp.
+    """
+    queryset = view.get_queryset()
+    lookup = kwargs.get(view.lookup_url_kwarg or view.lookup_field)
+    if lookup is not None:
+        queryset = queryset.model._default_manager.filter(**{view.lookup_field: lookup})
+    value = queryset.aggregate(last=Max(field))['last']
+    return int(value.timestamp()) if value else None
+
+
+def build_entry(view, request, response, field, kwargs):
+    # plain JSON values, so the entry pickles and renders the same every time
+    content = JSONRenderer().render(response.data)
+    modified = last_modified(view, field, kwargs) if field else None
+    return {
+        'data': json.loads(content) if content else None,
+        'etag': '"%s"' % hashlib.sha256(content + request.accepted_media_type.encode()).hexdigest()[:40],
+        # the entry is built after the last change that invalidated the scope
+        'last_modified': max(modified or 0, int(time.time())) if field else None,
+    }
+
+
+def conditional_get(scope, last_modified_field='updated_at', per_user=False):
+    """
+    Caches the responses of a GET viewset method and answers conditional requests.
+
+    Parameters:
+    - scope: The name the cached responses are invalidated by.
+    - last_modified_field: The timestamp field of the viewset's model the Last-Modified is taken from.
+    - per_user: Whether the response depends on the requesting user.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            key = response_key(scope, request, per_user)
+            entry = cache.get(key)
+            if entry is None:
+                # the serializers leave placeholders for the signed URLs
+                self.defer_signing = True
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                entry = build_entry(self, request, response, last_modified_field, kwargs)
+                cache.set(key, entry, RESPONSE_CACHE_TTL)
+
+            data, urls = sign_deferred(entry['data'])
+            etag, modified = entry['etag'], entry['last_modified']
+            if urls:
+                # the URLs are signed again before they expire, without a change to the rows
+                signed = etag + ''.join(sorted(urls.values()))
+                etag, modified = '"%s"' % hashlib.sha256(signed.encode()).hexdigest()[:40], None
+
+            response = Response(data)
+            response['ETag'] = etag
+            if modified is not None:
+                response['Last-Modified'] = http_date(modified)
+            # clients keep the copy but revalidate it on every use
+            response['Cache-Control'] = 'private, no-cache' if per_user else 'no-cache'
+            if per_user:
+                patch_vary_headers(response, ['Authorization'])
+            # the response itself, or a 304 when the client's copy is current
+            return get_conditional_response(
+                request._request, etag=etag, last_modified=modified, response=response,
+            )
+        return wrapper
+    return decorator
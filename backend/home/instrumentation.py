@@ -0,0 +1,267 @@
+"""
+Per-request instrumentation, collected by home.middleware.RequestInstrumentationMiddleware.
+
+While a request is handled its RequestStats is the current one, every
+database query and every outbound call (OneSignal, Zoom, S3, SMTP) made on
+its behalf adds to it. Finished requests are folded into in-process
+histograms keyed by view name, which `render_prometheus` writes out in the
+Prometheus text format.
+"""
+import contextvars
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.core.mail.backends import smtp
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """
+    Database and outbound call totals of one request.
+
+    Attributes:
+        queries (int): Number of SQL statements run.
+        db_seconds (float): Time spent in the database.
+        statements (Counter): Number of runs per SQL statement, with placeholders for parameters.
+        outbound_seconds (dict): Time spent calling each external service.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+        self.outbound_seconds = defaultdict(float)
+
+    def track_query(self, execute, sql, params, many, context):
+        """
+        A connection.execute_wrapper that times every query.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def repeated_statements(self, threshold):
+        """
+        Returns the fingerprints of the statements run at least `threshold` times,
+        the usual signature of an N+1 query, most repeated first.
+        """
+        fingerprints = Counter()
+        for sql, count in self.statements.items():
+            fingerprints[fingerprint(sql)] += count
+        return [(sql, count) for sql, count in fingerprints.most_common() if count >= threshold]
+
+
+def start_request():
+    """
+    Makes a new RequestStats the current one and returns it with the token to reset it.
+    """
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record_outbound(service, seconds):
+    """
+    Adds the time of an outbound call to the current request, if there is one.
+    """
+    stats = _current.get()
+    if stats is not None:
+        stats.outbound_seconds[service] += seconds
+
+
+@contextmanager
+def outbound(service):
+    """
+    Times the block as an outbound call to `service`.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_outbound(service, time.perf_counter() - started)
+
+
+def fingerprint(sql):
+    """
+    Returns the SQL with literals replaced, so the same query with other parameters matches.
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(\.\d+)?\b', '?', sql)
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r'\(\s*\?(\s*,\s*\?)*\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def instrument_boto_client(client, service='s3'):
+    """
+    Records the time of every API call made by a botocore client as outbound time.
+
+    Registering is idempotent, the handlers are registered under unique ids.
+    """
+    def before_call(context, **kwargs):
+        # the first event of an API call that carries its context
+        context['instrumentation_started'] = time.perf_counter()
+
+    def after_call(context, **kwargs):
+        started = context.pop('instrumentation_started', None)
+        if started is not None:
+            record_outbound(service, time.perf_counter() - started)
+
+    events = client.meta.events
+    events.register('before-parameter-build', before_call, unique_id='instrumentation-before-call')
+    events.register('after-call', after_call, unique_id='instrumentation-after-call')
+    return client
+
+
+class EmailBackend(smtp.EmailBackend):
+    """
+    The SMTP email backend, with the time spent sending recorded as outbound time.
+    """
+
+    def send_messages(self, email_messages):
+        with outbound('smtp'):
+            return super().send_messages(email_messages)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts, with the sum and count of the observed values.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.buckets[index] += 1
+
+
+class ViewMetrics:
+    """
+    Request metrics of one view and method.
+    """
+
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.outbound_seconds = defaultdict(float)
+        self.statuses = Counter()
+        self.n_plus_one = 0
+
+
+_views = {}
+_views_lock = threading.Lock()
+
+
+def observe_request(view, method, status_code, seconds, stats, n_plus_one=False):
+    with _views_lock:
+        key = (view, method)
+        if key not in _views:
+            _views[key] = ViewMetrics()
+        metrics = _views[key]
+        metrics.duration.observe(seconds)
+        metrics.queries.observe(stats.queries)
+        metrics.db_seconds += stats.db_seconds
+        for service, service_seconds in stats.outbound_seconds.items():
+            metrics.outbound_seconds[service] += service_seconds
+        metrics.statuses[status_code] += 1
+        if n_plus_one:
+            metrics.n_plus_one += 1
+
+
+def reset_request_metrics():
+    with _views_lock:
+        _views.clear()
+
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**values):
+    return '{' + ','.join(f'{name}="{label_value(value)}"' for name, value in values.items()) + '}'
+
+
+def histogram_lines(name, bounds, buckets, count, total, **label_values):
+    lines = [
+        f'{name}_bucket{labels(**label_values, le=bound)} {bucket}'
+        for bound, bucket in zip(bounds, buckets)
+    ]
+    lines.append(f'{name}_bucket{labels(**label_values, le="+Inf")} {count}')
+    lines.append(f'{name}_sum{labels(**label_values)} {total}')
+    lines.append(f'{name}_count{labels(**label_values)} {count}')
+    return lines
+
+
+def render_prometheus(integration_metrics=()):
+    """
+    Returns the request metrics, and the outbound integration metrics passed in
+    (integrations.http.metrics_snapshot), in the Prometheus text exposition format.
+    """
+    duration, queries, db_seconds, outbound_seconds, requests, n_plus_one = [], [], [], [], [], []
+    with _views_lock:
+        for (view, method), metrics in sorted(_views.items()):
+            duration += histogram_lines(
+                'http_request_duration_seconds', DURATION_BUCKETS, metrics.duration.buckets,
+                metrics.duration.count, metrics.duration.sum, view=view, method=method,
+            )
+            queries += histogram_lines(
+                'http_request_db_queries', QUERY_BUCKETS, metrics.queries.buckets,
+                metrics.queries.count, metrics.queries.sum, view=view, method=method,
+            )
+            db_seconds.append(f'http_request_db_seconds_total{labels(view=view, method=method)} {metrics.db_seconds}')
+            for service, seconds in sorted(metrics.outbound_seconds.items()):
+                outbound_seconds.append(
+                    f'http_request_outbound_seconds_total{labels(view=view, method=method, service=service)} {seconds}'
+                )
+            for status_code, count in sorted(metrics.statuses.items()):
+                requests.append(f'http_requests_total{labels(view=view, method=method, status=status_code)} {count}')
+            n_plus_one.append(f'http_request_n_plus_one_total{labels(view=view, method=method)} {metrics.n_plus_one}')
+
+    integration_duration, integration_errors = [], []
+    for endpoint in integration_metrics:
+        label_values = {'service': endpoint['service'], 'method': endpoint['method'], 'endpoint': endpoint['endpoint']}
+        integration_duration += histogram_lines(
+            'integration_request_duration_seconds', list(endpoint['buckets']), list(endpoint['buckets'].values()),
+            endpoint['count'], endpoint['total_seconds'], **label_values,
+        )
+        integration_errors.append(f'integration_request_errors_total{labels(**label_values)} {endpoint["errors"]}')
+
+    families = [
+        ('http_request_duration_seconds', 'histogram', 'Request wall time by view.', duration),
+        ('http_request_db_queries', 'histogram', 'SQL statements per request by view.', queries),
+        ('http_request_db_seconds_total', 'counter', 'Time spent in the database by view.', db_seconds),
+        ('http_request_outbound_seconds_total', 'counter', 'Time spent calling external services by view.', outbound_seconds),
+        ('http_requests_total', 'counter', 'Requests by view and status code.', requests),
+        ('http_request_n_plus_one_total', 'counter', 'Requests that repeated a statement past the N+1 threshold.', n_plus_one),
+        ('integration_request_duration_seconds', 'histogram', 'Outbound integration call time.', integration_duration),
+        ('integration_request_errors_total', 'counter', 'Failed outbound integration calls.', integration_errors),
+    ]
+    lines = []
+    for name, metric_type, help_text, samples in families:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        lines += samples
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,44 @@
+from django.core.management import CommandError
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from home.hot_queries import HOT_QUERIES, explain, sequential_scans
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on the registered hot queries and fail if any of them scans a whole table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names",
+            nargs="*",
+            help="Only explain these queries, all of them by default.",
+        )
+        parser.add_argument(
+            "--show-plans",
+            action="store_true",
+            help="Print the full plan of every query.",
+        )
+
+    def handle(self, *args, **options):
+        names = options["names"] or sorted(HOT_QUERIES)
+        unknown = set(names) - set(HOT_QUERIES)
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(sorted(unknown))}")
+
+        failed = []
+        for name in names:
+            plan = explain(HOT_QUERIES[name]())
+            scans = sequential_scans(plan, connection.vendor)
+            if scans:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f"{name}: sequential scan"))
+                for line in scans:
+                    self.stdout.write(f"    {line}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{name}: ok"))
+            if options["show_plans"]:
+                self.stdout.write(plan)
+
+        if failed:
+            raise CommandError(f"{len(failed)} hot queries do a sequential scan: {', '.join(failed)}")
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from home.slots import generate_slots
+from users.models import DoctorSchedule
+
+
+class Command(BaseCommand):
+    help = "Generate the bookable slots of every doctor's weekly schedule ahead, run daily to roll the slots forward"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.DOCTOR_SLOT_HORIZON_DAYS,
+            help="Number of days ahead to generate, DOCTOR_SLOT_HORIZON_DAYS by default.",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        end = today + timedelta(days=options["days"])
+        doctors = DoctorSchedule.objects.values_list("doctor_id", flat=True).distinct()
+        total = 0
+        for doctor_id in doctors:
+            total += generate_slots(doctor_id, today, end)
+        self.stdout.write(self.style.SUCCESS(f"{total} slots in the schedules of {len(doctors)} doctors until {end}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home.thumbnails import enqueue_missing_derivatives
+
+
+class Command(BaseCommand):
+    help = "Queue the resized copies of the avatars and profile pictures that have none, run once after deploying them"
+
+    def handle(self, *args, **options):
+        count = enqueue_missing_derivatives()
+        self.stdout.write(self.style.SUCCESS(f"{count} pictures queued, run runjobs to write their copies"))
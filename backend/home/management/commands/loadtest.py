@@ -0,0 +1,202 @@
+import math
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urljoin
+
+import requests
+from django.core.management import CommandError
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from home import seed
+from users.models import Doctor, User
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def json_body(response):
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+class InProcessClient:
+    """
+    Calls the views in this process through the Django test client.
+
+    The timings leave out the web server, its workers and the network, so
+    they profile the views and count their queries rather than measure load.
+    """
+
+    def __init__(self):
+        self.client = Client(SERVER_NAME='localhost')
+
+    def request(self, method, path, data=None, token=None):
+        """
+        Returns the status, JSON body and query count of a call.
+        """
+        extra = {'HTTP_AUTHORIZATION': 'Token ' + token} if token else {}
+        if method == 'post':
+            extra['content_type'] = 'application/json'
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, data, **extra)
+        return response.status_code, json_body(response), len(queries)
+
+    def close(self):
+        # each worker thread opened its own connection
+        connection.close()
+
+
+class HttpClient:
+    """
+    Calls a running server over HTTP, one keep-alive session per patient.
+    The query counts are not known from outside the server.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def request(self, method, path, data=None, token=None):
+        headers = {'Authorization': 'Token ' + token} if token else {}
+        options = {'json': data} if method == 'post' else {'params': data}
+        response = self.session.request(method.upper(), urljoin(self.base_url, path), headers=headers, timeout=30, **options)
+        return response.status_code, json_body(response), None
+
+    def close(self):
+        self.session.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the main API flows (login, doctor slots, book appointment, today's appointments, vitals history) "
+        "against a seeded dataset and report latency percentiles and query counts per endpoint. Without "
+        "--base-url the views run in this process, a profile of the views rather than a load test"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=1,
+            help="The seed_data dataset to log in as, it also seeds the choice of users and slots.",
+        )
+        parser.add_argument(
+            "--sessions",
+            type=int,
+            default=50,
+            help="Number of patient sessions, each runs every flow once.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Number of sessions run at the same time, each on its own thread and database connection.",
+        )
+        parser.add_argument(
+            "--base-url",
+            help=(
+                "Send the requests over HTTP to a running server, e.g. http://localhost:8000/, instead of "
+                "calling the views in this process. The server must use the database the dataset was seeded in."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        patients = list(
+            User.objects.filter(username__startswith=seed.prefix(options["seed"]), patient_info__isnull=False)
+            .values_list('id', 'username')
+        )
+        doctors = list(Doctor.objects.filter(user__username__startswith=seed.prefix(options["seed"])).values_list('id', flat=True))
+        if not patients or not doctors:
+            raise CommandError(f"No dataset for seed {options['seed']}, run seed_data --seed {options['seed']} first")
+
+        rng = random.Random(options["seed"])
+        sessions = [(rng.choice(patients), rng.choice(doctors), rng.random()) for _ in range(options["sessions"])]
+        samples = defaultdict(list)
+        base_url = options["base_url"]
+        self.make_client = (lambda: HttpClient(base_url)) if base_url else InProcessClient
+
+        started = time.perf_counter()
+        if options["concurrency"] > 1:
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                results = list(executor.map(self.run_threaded_session, sessions))
+        else:
+            results = [self.run_session(session, self.make_client()) for session in sessions]
+        for session_samples in results:
+            for endpoint, sample in session_samples:
+                samples[endpoint].append(sample)
+        elapsed = time.perf_counter() - started
+
+        self.report(samples, elapsed)
+
+    def run_session(self, session, client):
+        """
+        Runs the flows of one patient and returns (endpoint, (status, ms, queries)) samples.
+        """
+        (user_id, username), doctor_id, pick = session
+        samples = []
+        token = None
+
+        def call(endpoint, method, path, data=None):
+            start = time.perf_counter()
+            status_code, body, queries = client.request(method, path, data, token)
+            samples.append((endpoint, (status_code, (time.perf_counter() - start) * 1000, queries)))
+            return status_code, body
+
+        status_code, body = call('login', 'post', reverse("login-list"), {"username": username, "password": seed.SEED_PASSWORD})
+        if status_code != 200:
+            return samples
+        token = body['token']
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        status_code, body = call('doctor slots', 'get', reverse("doctors-slots", kwargs={'pk': doctor_id}), {
+            'from': tomorrow.isoformat(), 'to': (tomorrow + timedelta(days=6)).isoformat(),
+        })
+        slots = body['slots'] if status_code == 200 else []
+        if slots:
+            # concurrent sessions can race for a slot, the loser gets a 409
+            slot = slots[int(pick * len(slots))]
+            call('book appointment', 'post', reverse("create_appointment"), {
+                "user": user_id,
+                "doctor": doctor_id,
+                "date": slot['date'],
+                "consult_time": slot['start_time'],
+            })
+        call('todo appointments', 'get', reverse("todo_appointments", kwargs={'user_id': user_id}))
+        call('vitals history', 'get', reverse("patient_profile:vitals-list"), {'user_id': user_id})
+        return samples
+
+    def run_threaded_session(self, session):
+        client = self.make_client()
+        try:
+            return self.run_session(session, client)
+        finally:
+            client.close()
+
+    def report(self, samples, elapsed):
+        total = sum(len(endpoint_samples) for endpoint_samples in samples.values())
+        self.stdout.write(f"{total} requests in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} req/s)")
+        self.stdout.write(f"{'endpoint':<20} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'max q':>6}")
+        for endpoint, endpoint_samples in samples.items():
+            timings = [ms for _, ms, _ in endpoint_samples]
+            queries = [count for _, _, count in endpoint_samples if count is not None]
+            errors = sum(1 for status_code, _, _ in endpoint_samples if status_code >= 400)
+            query_columns = f"{sum(queries) / len(queries):>8.1f} {max(queries):>6}" if queries else f"{'-':>8} {'-':>6}"
+            self.stdout.write(
+                f"{endpoint:<20} {len(endpoint_samples):>6} {errors:>6} "
+                f"{percentile(timings, 50):>8.1f} {percentile(timings, 95):>8.1f} {percentile(timings, 99):>8.1f} "
+                f"{query_columns}"
+            )
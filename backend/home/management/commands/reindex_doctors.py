@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home.search import reindex_doctors
+
+
+class Command(BaseCommand):
+    help = "Rebuild the doctor search documents, after bulk imports that bypass the model signals"
+
+    def handle(self, *args, **options):
+        count = reindex_doctors()
+        self.stdout.write(self.style.SUCCESS(f"{count} doctor search documents rebuilt"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from patient.doses import generate_doses, schedule_reminders
+
+
+class Command(BaseCommand):
+    help = "Expand the medication doses ahead and queue the reminders of the coming buckets, run every few minutes"
+
+    def handle(self, *args, **options):
+        doses = generate_doses()
+        jobs = schedule_reminders()
+        self.stdout.write(self.style.SUCCESS(f"{doses} doses expanded, reminders queued for {len(jobs)} buckets"))
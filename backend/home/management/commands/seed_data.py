@@ -0,0 +1,43 @@
+from django.core.management import CommandError
+from django.core.management.base import BaseCommand
+
+from home import seed
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic dataset of patients, doctors, clinical records and inventory for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=1,
+            help="Random seed, the same seed and scale always generate the same data.",
+        )
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1.0,
+            help=f"Volume multiplier, scale 1 is {seed.VOLUMES['patients']} patients and {seed.VOLUMES['doctors']} doctors.",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Delete the existing dataset of this seed first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["scale"] <= 0:
+            raise CommandError("--scale must be positive")
+        if options["replace"]:
+            seed.clear(options["seed"])
+        try:
+            counts = seed.generate(seed=options["seed"], scale=options["scale"])
+        except ValueError as e:
+            raise CommandError(f"{e}, use --replace to generate it again")
+
+        for name, count in counts.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded users are {seed.prefix(options['seed'])}patient-NNNNN with the password {seed.SEED_PASSWORD}"
+        ))
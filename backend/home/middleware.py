@@ -0,0 +1,83 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from home.instrumentation import end_request, observe_request, start_request
+
+logger = logging.getLogger(__name__)
+
+
+def view_name(request):
+    """
+    Returns the URL name of the matched view, or its dotted path when it has no name.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or f'{match.func.__module__}.{match.func.__qualname__}'
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Records the wall time, database queries and time, and outbound call time
+    of every request.
+
+    Each request is logged as one JSON line on this module's logger at INFO and
+    added to the histograms served by the metrics endpoint. A request that runs
+    the same statement settings.REQUEST_N_PLUS_ONE_THRESHOLD times or more is
+    logged at WARNING with the fingerprints of the repeated statements.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats, token = start_request()
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats.track_query))
+                response = self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            seconds = time.perf_counter() - started
+            end_request(token)
+            self.record(request, status_code, seconds, stats)
+
+    def record(self, request, status_code, seconds, stats):
+        view = view_name(request)
+        threshold = settings.REQUEST_N_PLUS_ONE_THRESHOLD
+        repeated = stats.repeated_statements(threshold) if threshold else []
+        observe_request(view, request.method, status_code, seconds, stats, n_plus_one=bool(repeated))
+
+        entry = {
+            'event': 'request',
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': status_code,
+            'duration_ms': round(seconds * 1000, 2),
+            'db_queries': stats.queries,
+            'db_ms': round(stats.db_seconds * 1000, 2),
+            'outbound_ms': {service: round(value * 1000, 2) for service, value in stats.outbound_seconds.items()},
+        }
+        logger.info(json.dumps(entry))
+        if repeated:
+            logger.warning(json.dumps({
+                'event': 'n_plus_one',
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'db_queries': stats.queries,
+                'statements': [{'sql': sql, 'count': count} for sql, count in repeated],
+            }))
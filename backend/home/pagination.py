@@ -0,0 +1,32 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    The project wide pagination, an opaque cursor over a stable ordering.
+
+    Each page is one indexed range query on the ordering, so its cost does not
+    grow with the page depth the way an offset does. The ordering is taken from
+    `cursor_ordering` on the view, otherwise `(-created_at, -id)` when the model
+    has a `created_at` column and `-pk` when it does not. Every row needs a
+    value in the first field, a cursor cannot point at a null: the EMR and
+    inventory models declare `created_at` nullable, but `auto_now_add` fills it
+    on every insert and their older rows were backfilled by migration.
+    Per-user lists need a `(user, created_at, id)` index to read a page off it.
+
+    Query parameters:
+        cursor: The next or previous cursor returned by the previous page.
+        page_size: The number of rows per page, up to `max_page_size`.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return tuple(ordering)
+        field_names = {field.name for field in queryset.model._meta.get_fields()}
+        if 'created_at' in field_names:
+            return ('-created_at', '-id')
+        return ('-pk',)
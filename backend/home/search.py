@@ -0,0 +1,246 @@
+"""
+Doctor search, autocomplete and specialization facets.
+
+Every doctor has a DoctorSearchDocument holding its names, specialization
+and qualification folded to lowercase ASCII. The receivers in home.signals
+rebuild it in the transaction that saves the doctor or its user. A search
+matches when every term of the query is a substring of the document.
+
+On PostgreSQL the substring and prefix matches are LIKEs served by the
+pg_trgm indexes of migration users 0032. Other databases (SQLite in
+development and tests) cannot index infix matches, so the documents are
+loaded into an NgramIndex held per process: trigram postings narrow the
+candidates and a substring check confirms them. The index is rebuilt when
+the number of documents or their last update changes, checked with one
+aggregate query per search.
+
+The specialization facet counts of all doctors are cached for FACETS_TTL,
+and deleted once a change to a document is committed.
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+from rest_framework.filters import BaseFilterBackend
+
+from users.models import Doctor, DoctorSearchDocument
+
+FACETS_KEY = 'doctor_search:facets'
+FACETS_TTL = 60 * 60
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 20
+# User fields copied into the document
+USER_FIELDS = ('full_name', 'name', 'first_name', 'last_name', 'username')
+DOCTOR_FIELDS = ('user', 'specialized', 'qualification')
+SPECIALIZED_LABELS = dict(Doctor.SPECIALIZED_CHOICES)
+
+
+def fold(text):
+    """
+    Lowercases text, strips accents and turns every run of other characters into one space.
+    """
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip()
+
+
+def display_name(user):
+    if user is None:
+        return ''
+    full_name = ' '.join(part for part in (user.first_name, user.last_name) if part)
+    return user.full_name or user.name or full_name or user.username
+
+
+def document_values(doctor):
+    """
+    Returns the field values of the search document of a doctor.
+    """
+    user = doctor.user
+    parts = [getattr(user, field, None) for field in USER_FIELDS] if user else []
+    parts += [doctor.specialized, SPECIALIZED_LABELS.get(doctor.specialized), doctor.qualification]
+    # distinct parts, in order
+    folded = list(dict.fromkeys(part for part in map(fold, parts) if part))
+    return {
+        'name': fold(display_name(user))[:255],
+        'specialized': doctor.specialized,
+        'document': ' '.join(folded),
+    }
+
+
+def index_doctor(doctor):
+    """
+    Rebuilds the search document of a doctor.
+    """
+    DoctorSearchDocument.objects.update_or_create(doctor=doctor, defaults=document_values(doctor))
+    transaction.on_commit(invalidate_facets)
+
+
+def reindex_doctors(doctors=None):
+    """
+    Rebuilds the search documents of the doctors, every doctor by default.
+
+    Returns:
+        int: The number of documents written.
+    """
+    doctors = Doctor.objects.all() if doctors is None else doctors
+    documents = [
+        DoctorSearchDocument(doctor=doctor, **document_values(doctor))
+        for doctor in doctors.select_related('user')
+    ]
+    with transaction.atomic():
+        DoctorSearchDocument.objects.filter(doctor__in=doctors.values('id')).delete()
+        DoctorSearchDocument.objects.bulk_create(documents, batch_size=1000)
+    transaction.on_commit(invalidate_facets)
+    return len(documents)
+
+
+def invalidate_facets():
+    cache.delete(FACETS_KEY)
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NgramIndex:
+    """
+    An in-memory trigram index of the search documents.
+
+    Attributes:
+        documents (dict): The document of each doctor ID.
+        names (dict): The folded name of each doctor ID.
+        postings (dict): The doctor IDs of each trigram of the documents.
+        words (list): Sorted (word, doctor ID) pairs of the names, for prefix lookups.
+    """
+
+    def __init__(self, rows):
+        self.documents = {}
+        self.names = {}
+        self.postings = defaultdict(set)
+        words = set()
+        for doctor_id, name, document in rows:
+            self.documents[doctor_id] = document
+            self.names[doctor_id] = name
+            for gram in trigrams(document):
+                self.postings[gram].add(doctor_id)
+            words.update((word, doctor_id) for word in name.split())
+        self.words = sorted(words)
+
+    def search(self, terms):
+        """
+        Returns the IDs of the doctors whose document contains every term.
+        """
+        candidates = None
+        for term in terms:
+            for gram in trigrams(term):
+                postings = self.postings.get(gram, set())
+                candidates = set(postings) if candidates is None else candidates & postings
+        if candidates is None:
+            candidates = self.documents.keys()
+        return {doctor_id for doctor_id in candidates if all(term in self.documents[doctor_id] for term in terms)}
+
+    def complete(self, prefix, limit):
+        """
+        Returns the IDs of the first doctors by name with a name word starting with the prefix.
+        """
+        first = prefix.split()[0]
+        matches = set()
+        index = bisect_left(self.words, (first,))
+        while index < len(self.words) and self.words[index][0].startswith(first):
+            doctor_id = self.words[index][1]
+            name = self.names[doctor_id]
+            if name.startswith(prefix) or f' {prefix}' in name:
+                matches.add(doctor_id)
+            index += 1
+        return sorted(matches, key=lambda doctor_id: (self.names[doctor_id], doctor_id))[:limit]
+
+
+_index = None
+_index_stamp = None
+_index_lock = threading.Lock()
+
+
+def ngram_index():
+    """
+    Returns the in-memory index, rebuilt when the documents changed.
+    """
+    global _index, _index_stamp
+    stamp = DoctorSearchDocument.objects.aggregate(count=Count('pk'), updated=Max('updated_at'))
+    with _index_lock:
+        if _index is None or stamp != _index_stamp:
+            _index = NgramIndex(DoctorSearchDocument.objects.values_list('doctor_id', 'name', 'document'))
+            _index_stamp = stamp
+        return _index
+
+
+def uses_trigram_index():
+    return connection.vendor == 'postgresql'
+
+
+def search_doctors(queryset, query):
+    """
+    Narrows a Doctor queryset to the doctors matching every term of the query.
+    """
+    terms = fold(query).split()
+    if not terms:
+        return queryset
+    if uses_trigram_index():
+        for term in terms:
+            queryset = queryset.filter(search_document__document__contains=term)
+        return queryset
+    return queryset.filter(id__in=ngram_index().search(terms))
+
+
+def autocomplete(prefix, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Returns the doctors with a name word starting with the prefix, by name.
+    """
+    prefix = fold(prefix)
+    if not prefix:
+        return []
+    documents = DoctorSearchDocument.objects.order_by('name', 'doctor_id')
+    if uses_trigram_index():
+        documents = documents.filter(Q(name__startswith=prefix) | Q(name__contains=f' {prefix}'))[:limit]
+    else:
+        ids = ngram_index().complete(prefix, limit)
+        documents = documents.filter(doctor_id__in=ids)
+    return [
+        {'id': document.doctor_id, 'name': document.name, 'specialized': document.specialized}
+        for document in documents
+    ]
+
+
+def facet_counts(documents):
+    counts = documents.values('specialized').annotate(count=Count('pk')).order_by('-count', 'specialized')
+    return [
+        {'value': row['specialized'], 'label': SPECIALIZED_LABELS.get(row['specialized'], row['specialized']), 'count': row['count']}
+        for row in counts
+    ]
+
+
+def specialization_facets(doctors=None):
+    """
+    Returns the number of doctors per specialization, of all doctors or of a
+    Doctor queryset. The counts of all doctors are cached.
+    """
+    if doctors is not None:
+        return facet_counts(DoctorSearchDocument.objects.filter(doctor__in=doctors.values('id')))
+    facets = cache.get(FACETS_KEY)
+    if facets is None:
+        facets = facet_counts(DoctorSearchDocument.objects.all())
+        cache.set(FACETS_KEY, facets, FACETS_TTL)
+    return facets
+
+
+class DoctorSearchFilter(BaseFilterBackend):
+    """
+    Filters doctors with the `search` query parameter through the search documents.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        return search_doctors(queryset, request.query_params.get(self.search_param, ''))
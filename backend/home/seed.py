@@ -0,0 +1,283 @@
+"""
+Synthetic dataset for load tests and query plan checks.
+
+`generate(seed, scale)` writes patients with their appointments, vitals,
+prescriptions with their upcoming doses and medical records, doctors with
+their schedules and slots, and inventory stock ledgers.
+Every value is drawn from one random.Random(seed), so the same seed and
+scale always produce the same rows, and rows are written with bulk_create
+in batches. Seeded users are named `seed<seed>-...` and share one password,
+so `clear(seed)` removes a dataset and the load driver can log in as them.
+"""
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from hospital_operations.emr.models import MedicalRecord, TestResult
+from hospital_operations.pharmacy.models import Medication, Prescription
+from modules.django_inventory_management.inventory_management.models import Category, Product, Stock, Supplier
+from home.search import reindex_doctors
+from home.slots import generate_slots
+from patient.doses import generate_doses
+from users.models import Appointment, Doctor, DoctorSchedule, DoctorSlot, PatientInfo, User, UserProfile, Vitals
+
+SEED_PASSWORD = 'loadtest@123'
+BATCH_SIZE = 1000
+
+# Rows per unit of scale
+VOLUMES = {
+    'doctors': 20,
+    'patients': 200,
+    'suppliers': 5,
+    'categories': 10,
+    'products': 200,
+}
+# Rows per patient, or per parent row
+APPOINTMENTS_PER_PATIENT = 5
+VITALS_PER_PATIENT = 30
+PRESCRIPTIONS_PER_PATIENT = 2
+MEDICATIONS_PER_PRESCRIPTION = 3
+RECORDS_PER_PATIENT = 2
+TEST_RESULTS_PER_RECORD = 2
+STOCK_ENTRIES_PER_PRODUCT = 10
+
+FIRST_NAMES = ['Amina', 'Chinedu', 'Fatima', 'Kwame', 'Ngozi', 'Tunde', 'Zainab', 'Kofi', 'Aisha', 'Emeka', 'Halima', 'Yaw']
+LAST_NAMES = ['Okafor', 'Mensah', 'Bello', 'Adeyemi', 'Owusu', 'Ibrahim', 'Nwosu', 'Boateng', 'Abubakar', 'Eze']
+DIAGNOSES = ['Hypertension', 'Type 2 diabetes', 'Malaria', 'Asthma', 'Migraine', 'Anaemia', 'Upper respiratory infection']
+MEDICINES = ['Amlodipine', 'Metformin', 'Artemether', 'Salbutamol', 'Paracetamol', 'Ferrous sulphate', 'Amoxicillin']
+TESTS = [
+    ('Haemoglobin', 'g/dL', '12-16'),
+    ('Fasting glucose', 'mg/dL', '70-100'),
+    ('Cholesterol', 'mg/dL', '< 200'),
+    ('Malaria parasite', '', 'Negative'),
+]
+# Half hour consultation slots from 9:00 to 16:30, Monday to Friday
+SLOTS = [time(hour, minute) for hour in range(9, 17) for minute in (0, 30)]
+WORKING_WEEKDAYS = range(5)
+SLOT_DAYS_AHEAD = 14
+
+
+def prefix(seed):
+    return f'seed{seed}-'
+
+
+def scaled(name, scale):
+    return max(int(VOLUMES[name] * scale), 1)
+
+
+def insert(model, rows):
+    model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def clear(seed):
+    """
+    Deletes the dataset of a seed, related rows go with the users and suppliers.
+    """
+    with transaction.atomic():
+        User.objects.filter(username__startswith=prefix(seed)).delete()
+        Supplier.objects.filter(name__startswith=prefix(seed)).delete()
+        Category.objects.filter(name__startswith=prefix(seed)).delete()
+
+
+@transaction.atomic
+def generate(seed=1, scale=1.0):
+    """
+    Writes a synthetic dataset.
+
+    Rows are created with bulk_create, which does not return primary keys on
+    every backend, so parents are read back in insertion order to link their
+    children.
+
+    Returns:
+        dict: The number of rows created per model.
+    """
+    rng = random.Random(seed)
+    name_prefix = prefix(seed)
+    if User.objects.filter(username__startswith=name_prefix).exists():
+        raise ValueError(f"A dataset for seed {seed} already exists")
+    counts = {}
+    today = timezone.localdate()
+    password = make_password(SEED_PASSWORD)
+
+    def user_row(username):
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        return User(
+            username=username, email=f'{username}@example.com', password=password,
+            first_name=first_name, last_name=last_name, name=f'{first_name} {last_name}',
+            gender=rng.choice(['Male', 'Female']), phone_number=f'+234{rng.randrange(10 ** 9, 10 ** 10)}',
+        )
+
+    doctor_names = [f'{name_prefix}doctor-{i:04d}' for i in range(scaled('doctors', scale))]
+    patient_names = [f'{name_prefix}patient-{i:05d}' for i in range(scaled('patients', scale))]
+    counts['users'] = insert(User, [user_row(username) for username in doctor_names + patient_names])
+    users = User.objects.filter(username__startswith=name_prefix).order_by('id')
+    doctor_users = list(users.filter(username__in=doctor_names))
+    patient_users = list(users.filter(username__in=patient_names))
+    insert(UserProfile, [UserProfile(user=user, user_type=UserProfile.UserType.DOCTOR) for user in doctor_users]
+           + [UserProfile(user=user, user_type=UserProfile.UserType.PATIENT) for user in patient_users])
+
+    counts['doctors'] = insert(Doctor, [
+        Doctor(
+            user=user, age=rng.randint(28, 65), specialized=rng.choice(Doctor.SPECIALIZED_CHOICES)[0],
+            qualification='MBBS', experience=rng.randint(1, 30), working_days='Mon-Fri', working_hours='09:00-17:00',
+        )
+        for user in doctor_users
+    ])
+    doctors = list(Doctor.objects.filter(user__in=doctor_users).order_by('id'))
+    # bulk_create skips the signals that keep the search documents
+    reindex_doctors(Doctor.objects.filter(user__in=doctor_users))
+
+    counts['patients'] = insert(PatientInfo, [
+        PatientInfo(
+            user=user, age=rng.randint(18, 80), age_range=rng.choice(PatientInfo.AGE_CHOICES)[0],
+            health_today=rng.choice(PatientInfo.HEALTH_CHOICES)[0], height=rng.randint(150, 195),
+            weight=rng.randint(50, 110), blood_group=rng.choice(['A+', 'B+', 'O+', 'AB+', 'O-']),
+        )
+        for user in patient_users
+    ])
+    patients = {patient.user_id: patient for patient in PatientInfo.objects.filter(user__in=patient_users)}
+
+    # Appointments from 60 days ago to 14 days ahead, one per doctor and slot
+    booked = set()
+    appointments = []
+    for user in patient_users:
+        for _ in range(APPOINTMENTS_PER_PATIENT):
+            while True:
+                doctor, slot = rng.choice(doctors), rng.choice(SLOTS)
+                day = today + timedelta(days=rng.randint(-60, 14))
+                if (doctor.id, day, slot) not in booked:
+                    break
+            booked.add((doctor.id, day, slot))
+            appointments.append(Appointment(
+                user=user, doctor=doctor, date=day, consult_time=slot,
+                status='Completed' if day < today else 'Scheduled',
+                health_issue=rng.choice(DIAGNOSES),
+                ratings=rng.randint(1, 5) if day < today else None,
+            ))
+    counts['appointments'] = insert(Appointment, appointments)
+
+    # Weekly schedules, with the upcoming appointments holding their slots
+    counts['schedules'] = insert(DoctorSchedule, [
+        DoctorSchedule(doctor=doctor, weekday=weekday, start_time=SLOTS[0], end_time=time(17, 0))
+        for doctor in doctors for weekday in WORKING_WEEKDAYS
+    ])
+    upcoming = Appointment.objects.filter(user__in=patient_users, date__gte=today)
+    insert(DoctorSlot, [
+        DoctorSlot(
+            doctor_id=appointment.doctor_id, date=appointment.date, start_time=appointment.consult_time,
+            end_time=(datetime.combine(appointment.date, appointment.consult_time) + timedelta(minutes=30)).time(),
+            appointment=appointment,
+        )
+        for appointment in upcoming
+    ])
+    counts['slots'] = sum(generate_slots(doctor.id, today, today + timedelta(days=SLOT_DAYS_AHEAD)) for doctor in doctors)
+
+    # One reading a day, drifting around a baseline per patient
+    vitals = []
+    for user in patient_users:
+        weight = Decimal(rng.randint(50, 110))
+        for days_ago in range(VITALS_PER_PATIENT):
+            vitals.append(Vitals(
+                user=user, patient=patients[user.id], date=today - timedelta(days=days_ago),
+                heart_rate=rng.randint(55, 100), pulse=rng.randint(55, 100),
+                blood_status=rng.choice(['normal', 'normal', 'normal', 'high', 'low']),
+                blood_count=rng.randint(4000, 11000),
+                glucose_level=Decimal(rng.randint(7000, 14000)) / 100,
+                weight=weight + Decimal(rng.randint(-150, 150)) / 100,
+                temperature=Decimal(rng.randint(3610, 3750)) / 100,
+            ))
+    counts['vitals'] = insert(Vitals, vitals)
+
+    counts['prescriptions'] = insert(Prescription, [
+        Prescription(
+            user=user, doctor=rng.choice(doctors),
+            issue_date=today - timedelta(days=rng.randint(0, 30)), notes="Take after meals",
+        )
+        for user in patient_users for _ in range(PRESCRIPTIONS_PER_PATIENT)
+    ])
+    medications = []
+    for prescription in Prescription.objects.filter(user__in=patient_users).order_by('id'):
+        start = timezone.make_aware(datetime.combine(prescription.issue_date, time(8, 0)))
+        for _ in range(MEDICATIONS_PER_PRESCRIPTION):
+            days = rng.choice([5, 7, 14, 30])
+            medications.append(Medication(
+                prescription=prescription, item=rng.choice(MEDICINES), dosage=f'{rng.choice([250, 500, 1000])}mg',
+                quantity=days * 2, duration=f'{days} days', frm=start, to=start + timedelta(days=days),
+                time=rng.choice(['morning', 'evening', 'morning,evening']),
+            ))
+    counts['medications'] = insert(Medication, medications)
+    counts['doses'] = generate_doses(Medication.objects.filter(prescription__user__in=patient_users))
+
+    records = []
+    for user in patient_users:
+        for _ in range(RECORDS_PER_PATIENT):
+            frmdate = today - timedelta(days=rng.randint(7, 180))
+            records.append(MedicalRecord(
+                user=user, patient=patients[user.id], doctor=rng.choice(doctors), date=frmdate,
+                frmdate=frmdate, todate=frmdate + timedelta(days=rng.randint(1, 7)),
+                diagnosis=rng.choice(DIAGNOSES), symptoms="Fatigue, headache", condition="Stable", status="Closed",
+            ))
+    counts['medical_records'] = insert(MedicalRecord, records)
+    test_results = []
+    for record in MedicalRecord.objects.filter(user__in=patient_users).order_by('id'):
+        for test_name, units, reference_ranges in rng.sample(TESTS, TEST_RESULTS_PER_RECORD):
+            test_results.append(TestResult(
+                user_id=record.user_id, medical_record=record, test_name=test_name, units=units,
+                reference_ranges=reference_ranges, result=str(rng.randint(5, 200)),
+            ))
+    counts['test_results'] = insert(TestResult, test_results)
+
+    counts.update(generate_inventory(rng, name_prefix, scale))
+    return counts
+
+
+def generate_inventory(rng, name_prefix, scale):
+    """
+    Writes suppliers, categories and products with a stock ledger each.
+
+    bulk_create skips Stock.save, so each product is created with the on_hand
+    its ledger adds up to.
+    """
+    counts = {}
+    counts['suppliers'] = insert(Supplier, [
+        Supplier(name=f'{name_prefix}supplier-{i:03d}', address=f'{rng.randint(1, 200)} Marina Road, Lagos')
+        for i in range(scaled('suppliers', scale))
+    ])
+    suppliers = list(Supplier.objects.filter(name__startswith=name_prefix).order_by('id'))
+    counts['categories'] = insert(Category, [
+        Category(name=f'{name_prefix}category-{i:03d}') for i in range(scaled('categories', scale))
+    ])
+    categories = list(Category.objects.filter(name__startswith=name_prefix).order_by('id'))
+
+    ledgers = []
+    for _ in range(scaled('products', scale)):
+        # opening stock-in, then movements that never take the level below zero
+        level = Decimal(rng.randint(100, 500))
+        ledger = [(level, 1)]
+        for _ in range(STOCK_ENTRIES_PER_PRODUCT - 1):
+            quantity = Decimal(rng.randint(1, 50))
+            stock_type = 2 if quantity <= level and rng.random() < 0.6 else 1
+            level += quantity if stock_type == 1 else -quantity
+            ledger.append((quantity, stock_type))
+        ledgers.append((level, ledger))
+
+    counts['products'] = insert(Product, [
+        Product(
+            code=f'{name_prefix}P{i:05d}', name=f'{rng.choice(MEDICINES)} {rng.choice([250, 500])}mg',
+            category=rng.choice(categories), supplier=rng.choice(suppliers),
+            price=Decimal(rng.randint(100, 10000)) / 100, on_hand=level,
+        )
+        for i, (level, _) in enumerate(ledgers)
+    ])
+    products = Product.objects.filter(supplier__in=suppliers).order_by('id')
+    counts['stock'] = insert(Stock, [
+        Stock(product=product, quantity=quantity, type=stock_type)
+        for product, (_, ledger) in zip(products, ledgers)
+        for quantity, stock_type in ledger
+    ])
+    return counts
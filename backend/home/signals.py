@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from home.agenda import invalidate_agenda
+from home.api.v1.serializers import UserSerializer
+from home.http_cache import invalidate_scope
+from home.instrumentation import record_outbound
+from home.search import DOCTOR_FIELDS, USER_FIELDS, index_doctor, invalidate_facets
+from hospital_operations.pharmacy.models import Medication, Prescription
+from integrations.signals import call_finished
+from meeting.zoom.models import Zoom
+from modules.django_inventory_management.inventory_management.models import Category, Supplier
+from modules.django_privacy_policy.privacy_policy.models import PrivacyPolicy
+from modules.django_terms_and_conditions.terms_and_conditions.models import TermAndCondition
+from patient.doses import rebuild_doses
+from users.models import Appointment, Doctor, LikeDoctor, ToDoList, User
+
+# The cached response scopes of home.http_cache each model is shown in
+RESPONSE_SCOPES = {
+    PrivacyPolicy: 'privacy-policy',
+    TermAndCondition: 'terms-and-conditions',
+    Supplier: 'inventory-suppliers',
+    Category: 'inventory-categories',
+    Doctor: 'doctors',
+    LikeDoctor: 'doctors',
+}
+# The medication fields the doses are expanded from
+DOSE_FIELDS = ('prescription', 'frm', 'to', 'time', 'duration')
+# The user fields shown on doctor profiles
+PROFILE_USER_FIELDS = set(UserSerializer.Meta.fields) - {'id'}
+
+
+def invalidate_on_commit(user_id):
+    # after the commit, so a concurrent read cannot cache the rows from before it
+    transaction.on_commit(lambda: invalidate_agenda(user_id))
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+def appointment_changed(sender, instance, **kwargs):
+    invalidate_on_commit(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Medication)
+def medication_changed(sender, instance, **kwargs):
+    if instance.prescription_id:
+        user_id = Prescription.objects.filter(id=instance.prescription_id).values_list('user_id', flat=True).first()
+        invalidate_on_commit(user_id)
+
+
+@receiver([post_save, post_delete], sender=ToDoList)
+def todo_changed(sender, instance, **kwargs):
+    invalidate_on_commit(instance.created_by_id)
+
+
+@receiver(post_save, sender=Zoom)
+def meeting_changed(sender, instance, **kwargs):
+    # the meeting details are part of the appointment shown on the agenda
+    if instance.appointment_id:
+        user_id = Appointment.objects.filter(id=instance.appointment_id).values_list('user_id', flat=True).first()
+        invalidate_on_commit(user_id)
+
+
+def touches(update_fields, fields):
+    # saves of other fields only, like last_login, change nothing shown
+    return update_fields is None or bool(set(update_fields) & set(fields))
+
+
+def invalidate_responses_on_commit(scope):
+    transaction.on_commit(lambda: invalidate_scope(scope))
+
+
+def response_data_changed(sender, **kwargs):
+    invalidate_responses_on_commit(RESPONSE_SCOPES[sender])
+
+
+for model in RESPONSE_SCOPES:
+    post_save.connect(response_data_changed, sender=model, dispatch_uid=f'response_data_saved_{model.__name__}')
+    post_delete.connect(response_data_changed, sender=model, dispatch_uid=f'response_data_deleted_{model.__name__}')
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_saved(sender, instance, update_fields=None, **kwargs):
+    if touches(update_fields, DOCTOR_FIELDS):
+        index_doctor(instance)
+
+
+@receiver(post_delete, sender=Doctor)
+def doctor_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_facets)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    indexed = touches(update_fields, USER_FIELDS)
+    shown = touches(update_fields, PROFILE_USER_FIELDS)
+    if created or not (indexed or shown):
+        return
+    doctor = Doctor.objects.filter(user=instance).first()
+    if doctor is None:
+        return
+    if indexed:
+        doctor.user = instance
+        index_doctor(doctor)
+    if shown:
+        invalidate_responses_on_commit('doctors')
+
+
+@receiver(post_save, sender=Medication)
+def medication_saved(sender, instance, update_fields=None, **kwargs):
+    if touches(update_fields, DOSE_FIELDS):
+        rebuild_doses(instance)
+
+
+@receiver(call_finished)
+def integration_call_finished(sender, service, seconds, **kwargs):
+    # the time of the call counts towards the current request
+    record_outbound(service, seconds)
@@ -0,0 +1,152 @@
+"""
+Presigned S3 URLs for uploaded files.
+
+One boto3 client is shared by the process, and each URL is cached until
+shortly before it expires, so serializing a list of files signs each key
+at most once per expiry period.
+
+Responses cached longer than a URL stays valid hold `deferred_url`
+placeholders instead of URLs, and `sign_deferred` signs them each time the
+response is sent.
+"""
+import hashlib
+import threading
+from urllib.parse import unquote, urlparse
+
+import boto3
+from django.conf import settings
+from django.core.cache import cache
+
+from home.instrumentation import instrument_boto_client
+
+# Seconds a signed URL stays valid
+SIGNED_URL_EXPIRY = 60 * 60
+# Cached URLs are dropped this many seconds before they expire
+REFRESH_MARGIN = 5 * 60
+# The only key of the placeholder of a URL signed when it is sent
+DEFERRED_URL = '$signed_key'
+DEFAULT_BUCKET = 'loopafrica-44703'
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Returns the process-wide S3 client, boto3 clients are thread safe.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = instrument_boto_client(boto3.client(
+                's3',
+                region_name=settings.AWS_STORAGE_REGION or None,
+                config=boto3.session.Config(signature_version='s3v4'),
+            ))
+        return _client
+
+
+def storage_bucket():
+    return settings.AWS_STORAGE_BUCKET_NAME or DEFAULT_BUCKET
+
+
+def object_key(url):
+    """
+    Returns the S3 object key of a file URL.
+    """
+    return unquote(urlparse(url).path[1:])  # Remove the leading slash
+
+
+def url_cache_key(bucket, key, expires_in):
+    return 'signed_url:' + hashlib.sha1(f'{bucket}/{key}:{expires_in}'.encode('utf-8')).hexdigest()
+
+
+def presign(bucket, key, expires_in):
+    return get_s3_client().generate_presigned_url(
+        'get_object', Params={'Bucket': bucket, 'Key': key},
+        ExpiresIn=expires_in, HttpMethod='GET'
+    )
+
+
+def sign_key(key, bucket=None, expires_in=SIGNED_URL_EXPIRY):
+    """
+    Returns a presigned GET URL for an object key, from the cache when possible.
+    """
+    bucket = bucket or storage_bucket()
+    cache_key = url_cache_key(bucket, key, expires_in)
+    url = cache.get(cache_key)
+    if url is None:
+        url = presign(bucket, key, expires_in)
+        cache.set(cache_key, url, max(expires_in - REFRESH_MARGIN, 0))
+    return url
+
+
+def sign_keys(keys, bucket=None, expires_in=SIGNED_URL_EXPIRY):
+    """
+    Returns presigned GET URLs for object keys by key, read from the cache in one call.
+    """
+    bucket = bucket or storage_bucket()
+    cache_keys = {key: url_cache_key(bucket, key, expires_in) for key in set(keys)}
+    cached = cache.get_many(list(cache_keys.values()))
+    urls, signed = {}, {}
+    for key, cache_key in cache_keys.items():
+        if cache_key in cached:
+            urls[key] = cached[cache_key]
+        else:
+            urls[key] = signed[cache_key] = presign(bucket, key, expires_in)
+    if signed:
+        cache.set_many(signed, max(expires_in - REFRESH_MARGIN, 0))
+    return urls
+
+
+def deferred_url(key):
+    """
+    Returns a placeholder for the signed URL of an object key, for data cached
+    longer than a signed URL stays valid. `sign_deferred` replaces it.
+    """
+    return {DEFERRED_URL: key}
+
+
+def sign_deferred(data):
+    """
+    Replaces the placeholders of `deferred_url` in JSON data by signed URLs.
+
+    Returns:
+        tuple: A copy of the data with the URLs, and the URLs by object key.
+    """
+    keys = []
+
+    def collect(value):
+        if isinstance(value, dict):
+            if set(value) == {DEFERRED_URL}:
+                keys.append(value[DEFERRED_URL])
+            else:
+                for item in value.values():
+                    collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+
+    def replace(value):
+        if isinstance(value, dict):
+            if set(value) == {DEFERRED_URL}:
+                return urls[value[DEFERRED_URL]]
+            return {name: replace(item) for name, item in value.items()}
+        if isinstance(value, list):
+            return [replace(item) for item in value]
+        return value
+
+    collect(data)
+    if not keys:
+        return data, {}
+    urls = sign_keys(keys)
+    return replace(data), urls
+
+
+def signed_url(file):
+    """
+    Returns a presigned GET URL for a FileField value, or None if it is empty.
+    """
+    if not file:
+        return None
+    return sign_key(object_key(file.url))
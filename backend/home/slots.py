@@ -0,0 +1,99 @@
+"""
+Doctor availability and conflict-free booking.
+
+The weekly DoctorSchedule of a doctor is materialized into DoctorSlot rows
+settings.DOCTOR_SLOT_HORIZON_DAYS ahead, by `rebuild_slots` when the
+schedule changes and by the generate_slots command every day. Free slots
+are read from a partial index on the unbooked rows.
+
+A booking claims its slot with a conditional UPDATE on the free row, inside
+the booking transaction. Of two bookings racing for a slot one updates the
+row and the other finds it taken, the database serializes them on the row
+lock, so there is no window between checking and claiming. Doctors who have
+not set up a schedule yet keep booking at any time, their slot row is
+inserted on demand and the unique (doctor, date, start_time) constraint
+stops a second booking.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import DoctorSchedule, DoctorSlot
+
+DEFAULT_SLOT_MINUTES = 30
+
+
+class SlotUnavailable(Exception):
+    """
+    Raised when the slot of a booking is taken or outside the doctor's schedule.
+    """
+
+
+def generate_slots(doctor_id, start, end):
+    """
+    Creates the slots of a doctor's weekly schedule from start to end, both
+    included. Slots that already exist are kept as they are.
+
+    Returns:
+        int: The number of slots in the schedule for the period.
+    """
+    periods = list(DoctorSchedule.objects.filter(doctor_id=doctor_id))
+    slots = []
+    day = start
+    while day <= end:
+        for period in periods:
+            if period.weekday == day.weekday():
+                slots += [
+                    DoctorSlot(doctor_id=doctor_id, date=day, start_time=slot_start, end_time=slot_end)
+                    for slot_start, slot_end in period.slot_times()
+                ]
+        day += timedelta(days=1)
+    DoctorSlot.objects.bulk_create(slots, ignore_conflicts=True)
+    return len(slots)
+
+
+def rebuild_slots(doctor_id):
+    """
+    Replaces the free future slots of a doctor after a schedule change,
+    booked slots are kept.
+    """
+    today = timezone.localdate()
+    with transaction.atomic():
+        DoctorSlot.objects.filter(doctor_id=doctor_id, date__gte=today, appointment__isnull=True).delete()
+        return generate_slots(doctor_id, today, today + timedelta(days=settings.DOCTOR_SLOT_HORIZON_DAYS))
+
+
+def free_slots(doctor_id, start, end):
+    """
+    Returns the free slots of a doctor from start to end, without the ones
+    that already began.
+    """
+    now = timezone.localtime()
+    return (
+        DoctorSlot.objects.filter(doctor_id=doctor_id, date__gte=start, date__lte=end, appointment__isnull=True)
+        .exclude(date=now.date(), start_time__lte=now.time())
+        .order_by('date', 'start_time')
+    )
+
+
+def claim_slot(appointment):
+    """
+    Books the slot of the appointment, must run in the booking transaction.
+    An appointment without a doctor, date or time holds no slot.
+
+    Raises:
+        SlotUnavailable: If the slot is booked already or is not in the doctor's schedule.
+    """
+    if not (appointment.doctor_id and appointment.date and appointment.consult_time):
+        return
+    slot = {'doctor_id': appointment.doctor_id, 'date': appointment.date, 'start_time': appointment.consult_time}
+
+    if not DoctorSchedule.objects.filter(doctor_id=appointment.doctor_id).exists():
+        end_time = (datetime.combine(appointment.date, appointment.consult_time) + timedelta(minutes=DEFAULT_SLOT_MINUTES)).time()
+        DoctorSlot.objects.get_or_create(**slot, defaults={'end_time': end_time})
+
+    claimed = DoctorSlot.objects.filter(**slot, appointment__isnull=True).update(appointment=appointment)
+    if not claimed:
+        raise SlotUnavailable("This slot is not available, please choose another time.")
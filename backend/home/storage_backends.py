@@ -1,7 +1,16 @@
 from django.conf import settings
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from home.instrumentation import instrument_boto_client
+
 
 class MediaStorage(S3Boto3Storage):
     location = settings.AWS_MEDIA_LOCATION
     file_overwrite = False
+
+    @property
+    def connection(self):
+        # the resource is created per thread, its calls count as outbound S3 time
+        connection = super().connection
+        instrument_boto_client(connection.meta.client)
+        return connection
@@ -0,0 +1,123 @@
+from datetime import datetime
+
+from django.utils import timezone
+
+from jobs.queue import enqueue
+from users.models import Appointment
+from meeting.zoom.models import Zoom
+from meeting.zoom.utils import create_meeting, update_meeting
+from modules.two_factor_authentication.twofactorauth.utils import Util
+from modules.django_push_notifications.push_notifications.models import Notification
+from home.api.v1.utils import appointment_push_data, send_push
+
+
+def enqueue_appointment_jobs(appointment):
+    """
+    Queues the side effects of a new booking.
+
+    The Zoom job runs first; the emails and the push notification need the
+    meeting link, so it queues them once the meeting exists.
+
+    Returns:
+        list: The queued jobs.
+    """
+    return [
+        enqueue(
+            create_appointment_meeting,
+            {'appointment_id': appointment.id},
+            key=f"appointment:{appointment.id}:zoom",
+            user=appointment.user,
+        )
+    ]
+
+
+def create_appointment_meeting(appointment_id):
+    """
+    Creates the Zoom meeting for an appointment and queues the notifications.
+
+    A meeting claimed from the pool already exists and is only rescheduled.
+    """
+    appointment = Appointment.objects.select_related('user', 'doctor__user').get(id=appointment_id)
+    meeting = Zoom.objects.filter(appointment=appointment).first()
+    # Start time is appointment date + appointment consult time
+    start_time = datetime.combine(appointment.date, appointment.consult_time).isoformat()
+    if meeting is not None and meeting.status == Zoom.Status.CLAIMED:
+        # the meeting came from the pool, move it to the appointment time
+        update_meeting(meeting.meeting_id, topic="Consultation", type=2, start_time=start_time)
+        Zoom.objects.filter(id=meeting.id).update(status=Zoom.Status.SCHEDULED, updated_at=timezone.now())
+    elif meeting is None:
+        meeting = create_meeting(topic="Consultation", type=2, start_time=start_time, userId=appointment.user.email, appointment=appointment)
+        if not isinstance(meeting, Zoom) or not meeting.join_url:
+            raise RuntimeError(f"Zoom meeting could not be created for appointment {appointment_id}: {meeting!r}")
+
+    for recipient in ('user', 'doctor'):
+        enqueue(
+            send_appointment_email,
+            {'appointment_id': appointment.id, 'recipient': recipient},
+            key=f"appointment:{appointment.id}:email:{recipient}",
+            user=appointment.user,
+        )
+    enqueue(
+        send_appointment_push,
+        {'appointment_id': appointment.id},
+        key=f"appointment:{appointment.id}:push",
+        user=appointment.user,
+    )
+    return {'meeting_id': meeting.meeting_id, 'join_url': meeting.join_url, 'passcode': meeting.password}
+
+
+def send_appointment_email(appointment_id, recipient):
+    """
+    Sends the booking confirmation to the patient or the doctor.
+    """
+    appointment = Appointment.objects.select_related('user', 'doctor__user').get(id=appointment_id)
+    meeting = Zoom.objects.filter(appointment=appointment).first()
+    body_data = f"Booking successful. Here is the zoom meeting link: {meeting.join_url}\nMeeting ID: {meeting.meeting_id}\nPasscode: {meeting.password}"
+    if recipient == 'doctor':
+        email_data = {
+            'subject': "New Appointment",
+            'body': body_data,
+            'to_email': appointment.doctor.user.email,
+        }
+    else:
+        email_data = {
+            'subject': "Appointment Confirmation",
+            'body': body_data,
+            'to_email': appointment.user.email,
+        }
+    Util.send_email(email_data)
+    return {'to_email': email_data['to_email']}
+
+
+def send_appointment_push(appointment_id):
+    """
+    Sends the booking push notification and records it as a Notification.
+    """
+    appointment = Appointment.objects.select_related('user', 'doctor__user').get(id=appointment_id)
+    notification = Notification.objects.filter(appointment=appointment, title="Appointment").first()
+    if notification:
+        return {'notification_id': notification.notification_id}
+
+    meeting = Zoom.objects.filter(appointment=appointment).first()
+    # errors propagate, the job is retried with backoff instead of ending without a notification
+    notification_ids = send_push([str(appointment.user.id)], "Appointment", appointment_push_data(
+        message_body="Your appointment has been scheduled successfully",
+        appointment_date=appointment.date.strftime('%Y-%m-%d'),
+        consult_time=appointment.consult_time.strftime('%H:%M:%S'),
+        doctor_name=appointment.doctor.user.username,
+        zoom_link=meeting.join_url,
+        zoom_meeting_id=meeting.meeting_id,
+        zoom_passcode=meeting.password,
+    ))
+    notification_id = notification_ids[0] if notification_ids else None
+    if notification_id:
+        Notification.objects.create(
+            user=appointment.user,
+            appointment=appointment,
+            message="Your appointment has been scheduled successfully. Please check your email for the Zoom meeting link.",
+            notification_id=notification_id,
+            Notification_type="push",
+            title="Appointment",
+            created_at=timezone.now(),
+        )
+    return {'notification_id': notification_id}
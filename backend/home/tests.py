@@ -1,3 +1,995 @@
-from django.test import TestCase
+import posixpath
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import urlparse
 
-# Create your tests here.
+import boto3
+import requests
+from botocore.stub import Stubber
+from PIL import Image
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import Client, TestCase, override_settings
+from django.urls import ResolverMatch, reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+
+from users.models import User, Doctor, DoctorSearchDocument, DoctorSlot, Appointment, LikeDoctor, ToDoList, Vitals
+from hospital_operations.pharmacy.models import Medication, Prescription
+from modules.django_inventory_management.inventory_management.models import Category, Product
+from modules.django_inventory_management.inventory_management.viewsets import CategoryViewSet
+from modules.django_privacy_policy.privacy_policy.models import PrivacyPolicy
+from modules.django_privacy_policy.privacy_policy.viewsets import PrivacyPolicyViewSet
+from meeting.zoom.models import Zoom
+from modules.django_push_notifications.push_notifications.models import Notification, OneSignalSubscription
+from modules.django_push_notifications.push_notifications.tasks import register_onesignal_user
+from jobs.models import Job
+from jobs.queue import run_pending
+from integrations.http import get_client
+from home import signed_urls, thumbnails
+from home.api.v1.serializers import UserSerializer
+from home import hot_queries
+from home.hot_queries import HOT_QUERIES, sequential_scans
+from home import search, seed
+from home import instrumentation
+from home.middleware import view_name
+from home.management.commands.loadtest import percentile
+from home.api.v1.utils import send_push_notification
+
+
+class AppointmentCreateTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.token = Token.objects.create(user=self.user)
+        doctor_user = User.objects.create_user(username="doctor", email="doctor@example.com", password="pass@123")
+        self.doctor = Doctor.objects.create(user=doctor_user, specialized="general_physician")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def fake_meeting(self, topic, type, start_time, userId, appointment):
+        return Zoom.objects.create(appointment=appointment, meeting_id="123", join_url="https://zoom.us/j/123", password="pw")
+
+    def book(self):
+        data = {
+            "user": self.user.id,
+            "doctor": self.doctor.id,
+            "date": date(2030, 1, 1).isoformat(),
+            "consult_time": time(10, 30).isoformat(),
+        }
+        return self.client.post(reverse("create_appointment"), data, format='json')
+
+    @mock.patch("home.tasks.create_meeting")
+    def test_create_returns_before_side_effects(self, create_meeting):
+        response = self.book()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        create_meeting.assert_not_called()
+        self.assertIsNone(response.data['meeting']['join_url'])
+        job = Job.objects.get(id=response.data['jobs'][0]['id'])
+        self.assertEqual(job.status, Job.Status.PENDING)
+
+        poll = self.client.get(reverse("jobs-detail", kwargs={'pk': job.id}))
+        self.assertEqual(poll.status_code, status.HTTP_200_OK)
+        self.assertEqual(poll.data['status'], Job.Status.PENDING)
+
+    @mock.patch("home.tasks.send_push", return_value=["notification-1"])
+    @mock.patch("home.tasks.Util.send_email")
+    @mock.patch("home.tasks.create_meeting")
+    def test_worker_runs_pipeline(self, create_meeting, send_email, send_push):
+        create_meeting.side_effect = self.fake_meeting
+        response = self.book()
+        appointment = Appointment.objects.get(id=response.data['appointment']['id'])
+
+        self.assertEqual(run_pending(), 4)
+        self.assertEqual(create_meeting.call_count, 1)
+        self.assertEqual(send_email.call_count, 2)
+        self.assertEqual(send_push.call_count, 1)
+        self.assertTrue(Notification.objects.filter(appointment=appointment, notification_id="notification-1").exists())
+        self.assertFalse(Job.objects.exclude(status=Job.Status.SUCCEEDED).exists())
+
+        # the patient polling the jobs does not see what they returned
+        polled = self.client.get(reverse("jobs-list")).data['results']
+        self.assertEqual(len(polled), 4)
+        self.assertFalse(any('result' in job for job in polled))
+
+    @override_settings(ZOOM_POOL_SIZE=1)
+    @mock.patch("meeting.zoom.pool.post_meeting", return_value={'id': 456, 'join_url': "https://zoom.us/j/456"})
+    @mock.patch("home.tasks.send_push", return_value=["notification-1"])
+    @mock.patch("home.tasks.Util.send_email")
+    @mock.patch("home.tasks.update_meeting")
+    @mock.patch("home.tasks.create_meeting")
+    def test_pooled_meeting_is_returned_with_booking(self, create_meeting, update_meeting, send_email, send_push, post_meeting):
+        pooled = Zoom.objects.create(status=Zoom.Status.POOLED, meeting_id="123", join_url="https://zoom.us/j/123", password="pw")
+        response = self.book()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['meeting']['join_url'], pooled.join_url)
+
+        run_pending()
+        create_meeting.assert_not_called()
+        update_meeting.assert_called_once_with("123", topic="Consultation", type=2, start_time="2030-01-01T10:30:00")
+        pooled.refresh_from_db()
+        self.assertEqual(pooled.status, Zoom.Status.SCHEDULED)
+        self.assertEqual(send_email.call_count, 2)
+        # the refill job replaced the claimed meeting
+        self.assertEqual(Zoom.objects.filter(status=Zoom.Status.POOLED).count(), 1)
+
+    @mock.patch("home.tasks.send_push", side_effect=requests.exceptions.ConnectTimeout("timed out"))
+    @mock.patch("home.tasks.Util.send_email")
+    @mock.patch("home.tasks.create_meeting")
+    def test_failed_push_is_retried(self, create_meeting, send_email, send_push):
+        create_meeting.side_effect = self.fake_meeting
+        self.book()
+        run_pending()
+        job = Job.objects.get(name="home.tasks.send_appointment_push")
+        self.assertEqual(job.status, Job.Status.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertFalse(Notification.objects.exists())
+
+    @mock.patch("home.tasks.Util.send_email")
+    @mock.patch("home.tasks.create_meeting")
+    def test_failed_subscription_lookup_is_retried(self, create_meeting, send_email):
+        create_meeting.side_effect = self.fake_meeting
+        self.book()
+        onesignal = get_client('onesignal')
+        with mock.patch.object(onesignal, 'get', side_effect=requests.exceptions.ConnectTimeout("timed out")), \
+                mock.patch.object(onesignal, 'post') as post:
+            run_pending()
+        post.assert_not_called()
+        job = Job.objects.get(name="home.tasks.send_appointment_push")
+        self.assertEqual(job.status, Job.Status.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertFalse(OneSignalSubscription.objects.exists())
+
+    @mock.patch("home.tasks.create_meeting", return_value=None)
+    def test_failed_meeting_is_retried(self, create_meeting):
+        response = self.book()
+        run_pending()
+        job = Job.objects.get(id=response.data['jobs'][0]['id'])
+        self.assertEqual(job.status, Job.Status.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(Job.objects.count(), 1)
+
+
+def json_response(status_code, data):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = requests.compat.json.dumps(data).encode()
+    return response
+
+
+class SendPushNotificationTestCase(TestCase):
+    def lookup(self, url, **kwargs):
+        external_id = url.rsplit('/', 1)[-1]
+        if external_id == "404":
+            return json_response(404, {})
+        return json_response(200, {'subscriptions': [{'id': f"sub-{external_id}"}]})
+
+    def send(self, ids):
+        return send_push_notification(ids, "title", "body", "10:00:00", "2030-01-01", "doc", "link", "1", "pw")
+
+    def test_cached_recipients_cost_one_send_call(self):
+        OneSignalSubscription.objects.create(external_id="1", subscription_ids=["sub-1"], fetched_at=timezone.now())
+        OneSignalSubscription.objects.create(external_id="2", subscription_ids=["sub-old"], fetched_at=timezone.now() - timedelta(days=2))
+        onesignal = get_client('onesignal')
+        with mock.patch.object(onesignal, 'get', side_effect=self.lookup) as get, \
+                mock.patch.object(onesignal, 'post', return_value=json_response(200, {'id': "n-1"})) as post:
+            self.assertEqual(self.send([1, 2, 3, "404"]), "n-1")
+            self.assertEqual(get.call_count, 3)
+            self.assertEqual(post.call_count, 1)
+            payload = post.call_args.kwargs['json']
+            self.assertEqual(payload['include_external_user_ids'], ["1", "2", "3"])
+            self.assertEqual(payload['include_player_ids'], ["sub-1", "sub-2", "sub-3"])
+
+            self.send([1, 2, 3, "404"])
+            self.assertEqual(get.call_count, 3)
+            self.assertEqual(post.call_count, 2)
+        self.assertEqual(OneSignalSubscription.objects.get(external_id="404").subscription_ids, [])
+
+
+    @mock.patch("home.api.v1.utils.MAX_RECIPIENTS_PER_SEND", 3)
+    def test_batches_count_subscriptions(self):
+        for external_id, subscription_ids in (("1", ["a", "b"]), ("2", ["c", "d"]), ("3", ["e"])):
+            OneSignalSubscription.objects.create(external_id=external_id, subscription_ids=subscription_ids, fetched_at=timezone.now())
+        onesignal = get_client('onesignal')
+        with mock.patch.object(onesignal, 'post', return_value=json_response(200, {'id': "n-1"})) as post:
+            self.send([1, 2, 3])
+        payloads = [call.kwargs['json'] for call in post.call_args_list]
+        self.assertEqual([payload['include_external_user_ids'] for payload in payloads], [["1"], ["2", "3"]])
+        self.assertEqual([payload['include_player_ids'] for payload in payloads], [["a", "b"], ["c", "d", "e"]])
+
+    def test_failed_lookup_fails_the_send(self):
+        def lookup(url, **kwargs):
+            if url.endswith("/2"):
+                return json_response(503, {})
+            return self.lookup(url, **kwargs)
+
+        onesignal = get_client('onesignal')
+        with mock.patch.object(onesignal, 'get', side_effect=lookup), mock.patch.object(onesignal, 'post') as post:
+            with self.assertRaises(requests.HTTPError):
+                self.send([1, 2])
+        post.assert_not_called()
+        # the successful lookup is kept for the retry
+        self.assertEqual(list(OneSignalSubscription.objects.values_list('external_id', flat=True)), ["1"])
+
+class AppointmentQueryCountTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.doctors = []
+        for index in range(10):
+            doctor_user = User.objects.create_user(username=f"doctor{index}", email=f"doctor{index}@example.com", password="pass@123", name=f"Doctor {index}")
+            self.doctors.append(Doctor.objects.create(user=doctor_user, specialized="general_physician"))
+
+    def book(self, count, doctor=None):
+        today = timezone.now().date()
+        for index in range(count):
+            appointment = Appointment.objects.create(
+                user=self.user, doctor=doctor or self.doctors[index], date=today, consult_time=time(9 + index % 8, 0),
+            )
+            Zoom.objects.create(appointment=appointment, meeting_id=str(appointment.id), join_url=f"https://zoom.us/j/{appointment.id}")
+
+    def assert_constant_queries(self, url, doctor=None, expected=3):
+        for count in (1, 9):
+            self.book(count, doctor)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data), Appointment.objects.count())
+            self.assertTrue(all(row['doctor_name'] is not None and row['zoom'] for row in response.data))
+
+    def test_list(self):
+        self.assert_constant_queries(reverse("list_appointments"))
+
+    def test_todo_appointments(self):
+        self.assert_constant_queries(reverse("todo_appointments", kwargs={'user_id': self.user.id}))
+
+    def test_doctor_appointments(self):
+        doctor = self.doctors[0]
+        self.assert_constant_queries(reverse("doctors-doctor-appointments", kwargs={'pk': doctor.id}), doctor=doctor, expected=4)
+
+
+class DoctorFavouriteTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass@123")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.doctors = []
+
+    def add_doctors(self, count):
+        for _ in range(count):
+            index = len(self.doctors)
+            doctor_user = User.objects.create_user(username=f"doctor{index}", email=f"doctor{index}@example.com", password="pass@123")
+            self.doctors.append(Doctor.objects.create(user=doctor_user, specialized="general_physician"))
+
+    def test_favourite_is_per_user(self):
+        self.add_doctors(3)
+        LikeDoctor.objects.create(user=self.other, doctor=self.doctors[0], favourite='1')
+        LikeDoctor.objects.create(user=self.user, doctor=self.doctors[1], favourite='1')
+        response = self.client.get(reverse("doctors-list"))
+        favourites = {row['id']: row['favourite'] for row in response.data['results']}
+        self.assertEqual(favourites, {self.doctors[0].id: None, self.doctors[1].id: '1', self.doctors[2].id: None})
+
+    def test_directory_queries_do_not_grow_with_page_size(self):
+        for count in (2, 8):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.add_doctors(count)
+                LikeDoctor.objects.create(user=self.user, doctor=self.doctors[-1], favourite='1')
+            # token lookup, count, page and the Last-Modified of the cached response
+            with self.assertNumQueries(4):
+                response = self.client.get(reverse("doctors-list"), {'limit': 20})
+            self.assertEqual(len(response.data['results']), len(self.doctors))
+            with self.assertNumQueries(3):
+                self.client.get(reverse("doctors-doctor-specialized"), {'specialization': "general_physician"})
+
+    def test_favourites_come_first(self):
+        self.add_doctors(4)
+        LikeDoctor.objects.create(user=self.user, doctor=self.doctors[2], favourite='1')
+        LikeDoctor.objects.create(user=self.other, doctor=self.doctors[3], favourite='1')
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("doctors-favourite"))
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(response.data[0]['id'], self.doctors[2].id)
+        self.assertEqual([row['favourite'] for row in response.data[1:]], [None] * 3)
+
+
+class SignedUrlTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        signed_urls._client = None
+        self.addCleanup(setattr, signed_urls, '_client', None)
+
+    @mock.patch.dict("os.environ", {'AWS_ACCESS_KEY_ID': "key", 'AWS_SECRET_ACCESS_KEY': "secret"})
+    @mock.patch("home.signed_urls.boto3.client", wraps=boto3.client)
+    def test_one_client_and_cached_urls(self, client):
+        first = signed_urls.sign_key("media/avatar/one.png")
+        self.assertIn("X-Amz-Expires=3600", first)
+        self.assertEqual(signed_urls.sign_key("media/avatar/one.png"), first)
+        self.assertNotEqual(signed_urls.sign_key("media/avatar/two.png"), first)
+        self.assertEqual(client.call_count, 1)
+
+    @mock.patch("home.signed_urls.get_s3_client")
+    def test_cached_url_expires_before_the_signature(self, get_s3_client):
+        get_s3_client.return_value.generate_presigned_url.side_effect = ["https://signed/1", "https://signed/2"]
+        with mock.patch("home.signed_urls.cache.set") as cache_set:
+            signed_urls.sign_key("media/avatar/one.png")
+        self.assertEqual(cache_set.call_args.args[2], signed_urls.SIGNED_URL_EXPIRY - signed_urls.REFRESH_MARGIN)
+        self.assertEqual(signed_urls.sign_key("media/avatar/one.png"), "https://signed/2")
+
+    def test_empty_file(self):
+        self.assertIsNone(signed_urls.signed_url(None))
+
+
+class ImageDerivativeTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        client = mock.patch("home.signed_urls.get_s3_client").start()
+        self.addCleanup(mock.patch.stopall)
+        client.return_value.generate_presigned_url.side_effect = lambda method, Params, **kwargs: f"https://signed/{Params['Key']}"
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def photo(self, name="me.jpg"):
+        # a landscape camera picture stored rotated, with its orientation and GPS in EXIF
+        image = Image.new('RGB', (1200, 600), (200, 30, 30))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x8825] = {1: 'N'}
+        out = BytesIO()
+        image.save(out, 'JPEG', exif=exif)
+        return SimpleUploadedFile(name, out.getvalue(), content_type='image/jpeg')
+
+    def upload(self, name="me.jpg"):
+        return self.client.put(
+            reverse("update-profile-pic", kwargs={'pk': self.user.id}), {'profile_picture': self.photo(name)}, format='multipart',
+        )
+
+    def test_upload_queues_the_copies(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['profile_picture_sizes'])
+        self.assertEqual(Job.objects.filter(name="home.thumbnails.generate_derivatives").count(), 1)
+
+        run_pending()
+        self.user.refresh_from_db()
+        entry = self.user.image_derivatives['profile_picture']
+        self.assertEqual(entry['source'], self.user.profile_picture.name)
+        self.assertEqual(set(entry['sizes']), set(thumbnails.DERIVATIVE_SIZES))
+        small = entry['sizes']['small']
+        self.assertEqual(posixpath.dirname(small['webp']), posixpath.dirname(self.user.profile_picture.name))
+        for name in small.values():
+            with self.user.profile_picture.storage.open(name) as f:
+                copy = Image.open(f)
+                copy.load()
+            # turned upright, without the EXIF data
+            self.assertEqual(copy.size, (48, 96))
+            self.assertEqual(dict(copy.getexif()), {})
+
+        sizes = UserSerializer(self.user).data['profile_picture_sizes']
+        self.assertEqual(set(sizes), {'small', 'medium'})
+        self.assertEqual(sizes['small']['jpeg'], "https://signed/mediafiles/" + small['jpeg'])
+
+    def test_cached_doctor_responses_sign_urls_when_sent(self):
+        doctor = Doctor.objects.create(user=self.user, specialized="general_physician")
+        self.upload()
+        run_pending()
+        url = reverse("doctors-detail", kwargs={'pk': doctor.id})
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            response = self.client.get(url)
+        self.assertTrue(response.data['user']['profile_picture_sizes']['small']['webp'].startswith("https://signed/mediafiles/"))
+        entry, = [call.args[1] for call in cache_set.call_args_list if ':doctors:' in call.args[0]]
+        placeholder = entry['data']['user']['profile_picture_sizes']['small']['webp']
+        self.assertEqual(set(placeholder), {signed_urls.DEFERRED_URL})
+        self.assertNotIn("https://signed/", str(entry))
+
+        # the URLs expired, the cached response is sent with new ones
+        signed_urls.get_s3_client.return_value.generate_presigned_url.side_effect = (
+            lambda method, Params, **kwargs: f"https://resigned/{Params['Key']}"
+        )
+        keys = [value[signed_urls.DEFERRED_URL] for formats in entry['data']['user']['profile_picture_sizes'].values() for value in formats.values()]
+        cache.delete_many([signed_urls.url_cache_key(signed_urls.storage_bucket(), key, signed_urls.SIGNED_URL_EXPIRY) for key in keys])
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        self.assertTrue(again.data['user']['profile_picture_sizes']['small']['webp'].startswith("https://resigned/"))
+        self.assertNotIn('Last-Modified', again)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=again['ETag']).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_replaced_picture(self):
+        self.upload("first.jpg")
+        run_pending()
+        self.user.refresh_from_db()
+        first = self.user.image_derivatives['profile_picture']['sizes']
+        self.upload("second.jpg")
+        self.user.refresh_from_db()
+        # the copies of the first picture are not shown for the second
+        self.assertIsNone(thumbnails.derivative_urls(self.user, 'profile_picture'))
+        self.assertEqual(
+            thumbnails.generate_derivatives(self.user.id, 'profile_picture', "images/profile_pic/first.jpg"),
+            {'skipped': 'replaced'},
+        )
+
+        run_pending()
+        self.user.refresh_from_db()
+        storage = self.user.profile_picture.storage
+        self.assertFalse(storage.exists(first['small']['webp']))
+        self.assertTrue(storage.exists(self.user.image_derivatives['profile_picture']['sizes']['small']['webp']))
+
+    def test_backfill_command(self):
+        self.user.avatar.save("old.png", ContentFile(self.photo().read()))
+        out = StringIO()
+        call_command("generate_thumbnails", stdout=out)
+        self.assertIn("1 pictures queued", out.getvalue())
+        run_pending()
+        self.user.refresh_from_db()
+        self.assertIn('avatar', self.user.image_derivatives)
+        call_command("generate_thumbnails", stdout=out)
+        self.assertEqual(Job.objects.filter(name="home.thumbnails.generate_derivatives").count(), 1)
+
+
+class ExplainHotQueriesTestCase(TestCase):
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        call_command("explain_hot_queries", "--show-plans", stdout=out)
+        self.assertEqual(out.getvalue().count(": ok"), len(HOT_QUERIES))
+
+    def test_sequential_scan_fails(self):
+        with mock.patch.dict(HOT_QUERIES, {'appointments.by_health_issue': lambda: Appointment.objects.filter(health_issue="flu")}):
+            with self.assertRaises(CommandError):
+                call_command("explain_hot_queries", "appointments.by_health_issue", stdout=StringIO())
+
+    def test_sequential_scans(self):
+        self.assertEqual(sequential_scans("2 0 0 SCAN users_vitals", 'sqlite'), ["2 0 0 SCAN users_vitals"])
+        self.assertEqual(sequential_scans("3 0 0 SEARCH users_vitals USING INDEX vitals_user_date_idx (user_id=?)", 'sqlite'), [])
+        self.assertEqual(sequential_scans("Seq Scan on users_vitals  (cost=0.00..1.01 rows=1 width=4)", 'postgresql'), ["Seq Scan on users_vitals  (cost=0.00..1.01 rows=1 width=4)"])
+
+    def test_postgresql_plans(self):
+        plan = (
+            "Limit  (cost=0.15..8.17 rows=1 width=40)\n"
+            "  ->  Index Scan using vitals_user_date_idx on users_vitals  (cost=0.15..8.17 rows=1 width=40)\n"
+            "        Index Cond: (user_id = 1)"
+        )
+        self.assertEqual(sequential_scans(plan, 'postgresql'), [])
+        plan = (
+            "Sort  (cost=10000000001.02..10000000001.03 rows=1 width=40)\n"
+            "  ->  Seq Scan on users_appointment  (cost=10000000000.00..10000000001.01 rows=1 width=40)\n"
+            "        Filter: ((health_issue)::text = 'flu'::text)"
+        )
+        self.assertEqual(sequential_scans(plan, 'postgresql'), [plan.splitlines()[1].strip()])
+
+    def test_postgresql_explains_without_sequential_scans(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'), mock.patch.object(connection, 'cursor') as cursor, \
+                mock.patch.object(QuerySet, 'explain', return_value="Index Scan using vitals_user_date_idx on users_vitals") as explain:
+            self.assertEqual(hot_queries.explain(Vitals.objects.all()), "Index Scan using vitals_user_date_idx on users_vitals")
+        # inside the savepoint the test case runs in
+        cursor.return_value.__enter__.return_value.execute.assert_any_call('SET LOCAL enable_seqscan = off')
+        explain.assert_called_once()
+
+
+class SeedDataTestCase(TestCase):
+    def test_seed_is_reproducible(self):
+        counts = seed.generate(seed=7, scale=0.05)
+        self.assertEqual(counts['patients'], 10)
+        self.assertEqual(counts['vitals'], 10 * seed.VITALS_PER_PATIENT)
+        self.assertEqual(Appointment.objects.filter(user__username__startswith="seed7-").count(), counts['appointments'])
+        first = list(Appointment.objects.order_by('id').values_list('user__username', 'doctor__user__username', 'date', 'consult_time'))
+
+        seed.clear(7)
+        self.assertFalse(User.objects.filter(username__startswith="seed7-").exists())
+        seed.generate(seed=7, scale=0.05)
+        self.assertEqual(list(Appointment.objects.order_by('id').values_list('user__username', 'doctor__user__username', 'date', 'consult_time')), first)
+
+    def test_products_start_with_their_ledger(self):
+        seed.generate(seed=7, scale=0.05)
+        for product in Product.objects.filter(code__startswith="seed7-"):
+            self.assertEqual(product.on_hand, product.ledger_stock())
+            self.assertGreaterEqual(product.on_hand, 0)
+
+    def test_existing_seed_needs_replace(self):
+        call_command("seed_data", "--seed", "7", "--scale", "0.05", stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("seed_data", "--seed", "7", "--scale", "0.05", stdout=StringIO())
+        call_command("seed_data", "--seed", "7", "--scale", "0.05", "--replace", stdout=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith="seed7-").count(), 11)
+
+
+class LoadTestCommandTestCase(TestCase):
+    def test_reports_every_flow(self):
+        seed.generate(seed=3, scale=0.05)
+        out = StringIO()
+        call_command("loadtest", "--seed", "3", "--sessions", "2", stdout=out)
+        report = out.getvalue()
+        for endpoint in ["login", "doctor slots", "book appointment", "todo appointments", "vitals history"]:
+            self.assertRegex(report, rf"{endpoint} +2 +0 ")
+
+    def test_requires_a_dataset(self):
+        with self.assertRaises(CommandError):
+            call_command("loadtest", "--seed", "99", stdout=StringIO())
+
+    def test_http_mode(self):
+        seed.generate(seed=3, scale=0.05)
+        client = Client()
+
+        def forward(method, url, headers=None, params=None, json=None, timeout=None):
+            # the server side of the HTTP session, through the test client
+            extra = {'HTTP_AUTHORIZATION': headers['Authorization']} if headers else {}
+            path = urlparse(url).path
+            if method == 'POST':
+                served = client.post(path, json, content_type='application/json', **extra)
+            else:
+                served = client.get(path, params, **extra)
+            response = requests.Response()
+            response.status_code = served.status_code
+            response._content = served.content
+            return response
+
+        out = StringIO()
+        with mock.patch("home.management.commands.loadtest.requests.Session.request", side_effect=forward) as request:
+            call_command("loadtest", "--seed", "3", "--sessions", "2", "--base-url", "http://api.example.com/", stdout=out)
+        self.assertEqual(request.call_args_list[0].args[1], "http://api.example.com/api/v1/login/")
+        # the query counts are not known from outside the server
+        self.assertRegex(out.getvalue(), r"vitals history +2 +0 .* +- +-\n")
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([5], 95), 5)
+
+
+class RequestInstrumentationTestCase(APITestCase):
+    def setUp(self):
+        instrumentation.reset_request_metrics()
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+
+    def metrics(self, **extra):
+        self.client.credentials(**extra)
+        return self.client.get(reverse("metrics"))
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_requests_are_exposed_as_metrics(self):
+        with self.assertLogs("home.middleware", level="INFO") as logs:
+            self.assertEqual(self.client.get(reverse("list_appointments")).status_code, status.HTTP_200_OK)
+        self.assertIn('"view": "list_appointments"', logs.output[0])
+        self.assertIn('"db_queries": ', logs.output[0])
+
+        self.assertEqual(self.metrics().status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.metrics(HTTP_AUTHORIZATION="Bearer scrape-secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('http_requests_total{view="list_appointments",method="GET",status="200"} 1', body)
+        self.assertIn('http_request_duration_seconds_count{view="list_appointments",method="GET"} 1', body)
+        self.assertIn('# TYPE integration_request_duration_seconds histogram', body)
+
+    @override_settings(REQUEST_N_PLUS_ONE_THRESHOLD=2)
+    def test_repeated_statements_are_flagged(self):
+        doctor_user = User.objects.create_user(username="doctor", email="doctor@example.com", password="pass@123")
+        doctor = Doctor.objects.create(user=doctor_user)
+        for day in range(1, 4):
+            Appointment.objects.create(user=self.user, doctor=doctor, date=timezone.localdate() + timedelta(days=day))
+        # without eager loading every appointment reads its doctor's user again
+        with mock.patch("home.api.v1.viewsets.AppointmentViewSet.get_queryset", return_value=Appointment.objects.all()):
+            with self.assertLogs("home.middleware", level="WARNING") as logs:
+                self.client.get(reverse("list_appointments"))
+        self.assertIn('"event": "n_plus_one"', logs.output[0])
+        self.assertIn('FROM \\"users_user\\" WHERE \\"users_user\\".\\"id\\" = ?', logs.output[0])
+
+    def test_outbound_time_is_added_to_the_request(self):
+        stats, token = instrumentation.start_request()
+        try:
+            onesignal = get_client('onesignal')
+            with mock.patch.object(onesignal.session, 'request', return_value=json_response(200, {})):
+                onesignal.get("https://onesignal.com/api/v1/apps")
+            s3 = instrumentation.instrument_boto_client(boto3.client('s3', region_name='us-east-1', aws_access_key_id='key', aws_secret_access_key='secret'))
+            with Stubber(s3) as stubber:
+                stubber.add_response('head_object', {'ContentLength': 1}, {'Bucket': 'bucket', 'Key': 'key'})
+                s3.head_object(Bucket='bucket', Key='key')
+        finally:
+            instrumentation.end_request(token)
+        self.assertEqual(set(stats.outbound_seconds), {'onesignal', 's3'})
+
+    def test_view_name_without_url_name(self):
+        request = APIRequestFactory().get("/")
+        request.resolver_match = ResolverMatch(send_push_notification, (), {})
+        self.assertEqual(view_name(request), "home.api.v1.utils.send_push_notification")
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            instrumentation.fingerprint('SELECT "id" FROM "t" WHERE "id" IN (%s, %s) AND "n" = 5 AND "s" = \'x\' LIMIT 21'),
+            'SELECT "id" FROM "t" WHERE "id" IN (...) AND "n" = ? AND "s" = ? LIMIT ?',
+        )
+
+
+class TodayAgendaTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        doctor_user = User.objects.create_user(username="doctor", email="doctor@example.com", password="pass@123", name="Dr Who")
+        self.doctor = Doctor.objects.create(user=doctor_user, specialized="general_physician")
+        today = timezone.localdate()
+        Appointment.objects.create(user=self.user, doctor=self.doctor, date=today, consult_time=time(10, 0))
+        Appointment.objects.create(user=self.user, doctor=self.doctor, date=today + timedelta(days=1), consult_time=time(10, 0))
+        prescription = Prescription.objects.create(user=self.user, doctor=self.doctor, issue_date=today)
+        now = timezone.now()
+        self.medication = Medication.objects.create(prescription=prescription, item="Metformin", frm=now - timedelta(days=1), to=now + timedelta(days=5))
+        Medication.objects.create(prescription=prescription, item="Finished", frm=now - timedelta(days=10), to=now - timedelta(days=2))
+        ToDoList.objects.create(title="Walk", created_by=self.user)
+        self.url = reverse("today", kwargs={'user_id': self.user.id})
+
+    def test_other_agendas_are_for_staff_and_doctors(self):
+        other = User.objects.create_user(username="other", email="other@example.com", password="pass@123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=other).key)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(reverse("today", kwargs={'user_id': other.id})).status_code, status.HTTP_200_OK)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.doctor.user).key)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['appointments']), 1)
+
+    def test_one_round_trip_cached(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['date'], timezone.localdate().isoformat())
+        self.assertEqual(len(response.data['appointments']), 1)
+        self.assertEqual(response.data['appointments'][0]['doctor_name'], "Dr Who")
+        self.assertEqual([row['item'] for row in response.data['medications']], ["Metformin"])
+        self.assertEqual([row['title'] for row in response.data['todos']], ["Walk"])
+        # only the token lookup once the agenda is cached
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).data, response.data)
+
+    def test_saves_invalidate_the_agenda(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            ToDoList.objects.create(title="Stretch", created_by=self.user)
+        self.assertEqual(len(self.client.get(self.url).data['todos']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.medication.to = timezone.now() - timedelta(days=1)
+            self.medication.save()
+        self.assertEqual(self.client.get(self.url).data['medications'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(user=self.user, doctor=self.doctor, date=timezone.localdate(), consult_time=time(9, 0))
+        self.assertEqual([row['consult_time'] for row in self.client.get(self.url).data['appointments']], ["09:00:00", "10:00:00"])
+
+    def test_other_users_writes_keep_the_cache(self):
+        self.client.get(self.url)
+        other = User.objects.create_user(username="other", email="other@example.com", password="pass@123")
+        with self.captureOnCommitCallbacks(execute=True):
+            ToDoList.objects.create(title="Other", created_by=other)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+
+class DoctorSlotTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.token = Token.objects.create(user=self.user)
+        doctor_user = User.objects.create_user(username="doctor", email="doctor@example.com", password="pass@123")
+        self.doctor = Doctor.objects.create(user=doctor_user, specialized="general_physician")
+        self.doctor_token = Token.objects.create(user=doctor_user)
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+
+    def set_schedule(self, periods, token=None):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + (token or self.doctor_token).key)
+        return self.client.put(reverse("doctors-schedule", kwargs={'pk': self.doctor.id}), periods, format='json')
+
+    def slots(self, **params):
+        return self.client.get(reverse("doctors-slots", kwargs={'pk': self.doctor.id}), params)
+
+    @mock.patch("home.tasks.create_meeting")
+    def book(self, day, consult_time, create_meeting):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        data = {"user": self.user.id, "doctor": self.doctor.id, "date": day.isoformat(), "consult_time": consult_time.isoformat()}
+        return self.client.post(reverse("create_appointment"), data, format='json')
+
+    def test_schedule_generates_free_slots(self):
+        response = self.set_schedule([{"weekday": 0, "start_time": "09:00", "end_time": "11:00", "slot_minutes": 30}])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+        response = self.slots(**{'from': self.monday.isoformat(), 'to': (self.monday + timedelta(days=6)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(slot['date'], slot['start_time']) for slot in response.data['slots']],
+            [(self.monday.isoformat(), start) for start in ("09:00:00", "09:30:00", "10:00:00", "10:30:00")],
+        )
+
+    def test_booking_claims_its_slot(self):
+        self.set_schedule([{"weekday": 0, "start_time": "09:00", "end_time": "10:00"}])
+        response = self.book(self.monday, time(9, 30))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        slot = DoctorSlot.objects.get(doctor=self.doctor, date=self.monday, start_time=time(9, 30))
+        self.assertEqual(slot.appointment_id, response.data['appointment']['id'])
+
+        response = self.slots(**{'from': self.monday.isoformat(), 'to': self.monday.isoformat()})
+        self.assertEqual([slot['start_time'] for slot in response.data['slots']], ["09:00:00"])
+
+        response = self.book(self.monday, time(9, 30))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_booking_outside_schedule_conflicts(self):
+        self.set_schedule([{"weekday": 0, "start_time": "09:00", "end_time": "10:00"}])
+        response = self.book(self.monday + timedelta(days=1), time(9, 0))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_doctor_without_schedule_cannot_be_double_booked(self):
+        self.assertEqual(self.book(self.monday, time(14, 0)).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.book(self.monday, time(14, 0)).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.book(self.monday, time(14, 30)).status_code, status.HTTP_201_CREATED)
+
+    def test_schedule_change_keeps_booked_slots(self):
+        self.set_schedule([{"weekday": 0, "start_time": "09:00", "end_time": "10:00"}])
+        booked = self.book(self.monday, time(9, 0)).data['appointment']['id']
+        self.set_schedule([{"weekday": 0, "start_time": "14:00", "end_time": "15:00"}])
+        self.assertTrue(DoctorSlot.objects.filter(appointment=booked, start_time=time(9, 0)).exists())
+        response = self.slots(**{'from': self.monday.isoformat(), 'to': self.monday.isoformat()})
+        self.assertEqual([slot['start_time'] for slot in response.data['slots']], ["14:00:00", "14:30:00"])
+
+    def test_only_the_doctor_changes_the_schedule(self):
+        response = self.set_schedule([{"weekday": 0, "start_time": "09:00", "end_time": "10:00"}], token=self.token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.set_schedule([{"weekday": 0, "start_time": "10:00", "end_time": "09:00"}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_slot_range_is_bounded(self):
+        self.assertEqual(self.slots(**{'from': 'monday'}).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.slots(**{'from': self.monday.isoformat(), 'to': (self.monday + timedelta(days=40)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_generate_slots_rolls_forward(self):
+        self.set_schedule([{"weekday": day, "start_time": "09:00", "end_time": "10:00"} for day in range(7)])
+        DoctorSlot.objects.all().delete()
+        call_command("generate_slots", "--days", "6", stdout=StringIO())
+        self.assertEqual(DoctorSlot.objects.count(), 7 * 2)
+
+
+class DoctorSearchTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.okafor = self.add_doctor("okafor", "Chinedu Okafor", "general_physician", "MBBS")
+        self.mensah = self.add_doctor("mensah", "Ama Mensah", "mental_health", "MD Psychiatry")
+        self.adebayo = self.add_doctor("adebayo", "Adébáyọ̀ Okonkwo", "general_physician", "MBChB")
+
+    def add_doctor(self, username, full_name, specialized, qualification):
+        user = User.objects.create_user(username=username, email=f"{username}@example.com", password="pass@123", full_name=full_name)
+        return Doctor.objects.create(user=user, specialized=specialized, qualification=qualification)
+
+    def search(self, query):
+        response = self.client.get(reverse("doctors-list"), {'search': query, 'limit': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {row['id'] for row in response.data['results']}
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search("oka"), {self.okafor.id})
+        self.assertEqual(self.search("general"), {self.okafor.id, self.adebayo.id})
+        self.assertEqual(self.search("General Physician oko"), {self.adebayo.id})
+        self.assertEqual(self.search("psychiatry"), {self.mensah.id})
+        self.assertEqual(self.search("nobody"), set())
+
+    def test_accents_and_case_are_folded(self):
+        self.assertEqual(self.search("ADEBAYO"), {self.adebayo.id})
+        self.assertEqual(self.search("adébáyọ̀"), {self.adebayo.id})
+
+    def test_ordering_by_first_name(self):
+        response = self.client.get(reverse("doctors-list"), {'ordering': 'user__first_name', 'limit': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_autocomplete_matches_name_prefixes(self):
+        response = self.client.get(reverse("doctors-autocomplete"), {'q': 'ok'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data], [self.adebayo.id, self.okafor.id])
+        self.assertEqual(response.data[0]['name'], "adebayo okonkwo")
+        response = self.client.get(reverse("doctors-autocomplete"), {'q': 'ama m'})
+        self.assertEqual([row['id'] for row in response.data], [self.mensah.id])
+        self.assertEqual(self.client.get(reverse("doctors-autocomplete"), {'q': 'enah'}).data, [])
+
+    def test_facets_are_cached_until_a_doctor_changes(self):
+        response = self.client.get(reverse("doctors-facets"))
+        self.assertEqual(response.data['specialized'], [
+            {'value': 'general_physician', 'label': 'General Physician', 'count': 2},
+            {'value': 'mental_health', 'label': 'Mental Health', 'count': 1},
+        ])
+        with self.assertNumQueries(0):
+            self.client.get(reverse("doctors-facets"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.okafor.specialized = "mental_health"
+            self.okafor.save()
+        counts = {row['value']: row['count'] for row in self.client.get(reverse("doctors-facets")).data['specialized']}
+        self.assertEqual(counts, {'general_physician': 1, 'mental_health': 2})
+
+        response = self.client.get(reverse("doctors-facets"), {'search': 'okonkwo'})
+        self.assertEqual(response.data['specialized'], [{'value': 'general_physician', 'label': 'General Physician', 'count': 1}])
+
+    def test_user_changes_update_the_document(self):
+        user = self.okafor.user
+        user.full_name = "Chinedu Eze"
+        user.save()
+        self.assertEqual(self.search("eze"), {self.okafor.id})
+        self.assertEqual(self.client.get(reverse("doctors-autocomplete"), {'q': 'chinedu'}).data[0]['name'], "chinedu eze")
+
+        document = DoctorSearchDocument.objects.get(doctor=self.okafor)
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+        self.assertEqual(DoctorSearchDocument.objects.get(doctor=self.okafor).updated_at, document.updated_at)
+
+    def test_ngram_index(self):
+        index = search.NgramIndex([(1, "ama mensah", "ama mensah mental health"), (2, "kofi amankwah", "kofi amankwah pt")])
+        self.assertEqual(index.search(["ama"]), {1, 2})
+        self.assertEqual(index.search(["ama", "health"]), {1})
+        self.assertEqual(index.search(["pt"]), {2})
+        self.assertEqual(index.complete("am", 10), [1, 2])
+        self.assertEqual(index.complete("am", 1), [1])
+        self.assertEqual(index.complete("amank", 10), [2])
+
+
+class ResponseCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username="admin", email="admin@example.com", password="pass@123", is_staff=True)
+        self.policy = PrivacyPolicy.objects.create(body="We keep your data safe.", author=self.admin)
+        self.factory = APIRequestFactory()
+
+    def get_policy(self, **headers):
+        # the module URLs are mounted by modules.urls, the view is called directly
+        return PrivacyPolicyViewSet.as_view({'get': 'list'})(self.factory.get("/modules/privacy-policy/", **headers))
+
+    def test_etag_answers_not_modified(self):
+        response = self.get_policy()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['body'], "We keep your data safe.")
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.get_policy(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+    def test_if_modified_since(self):
+        response = self.get_policy()
+        response = self.get_policy(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_saves_invalidate_the_cached_response(self):
+        etag = self.get_policy()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.policy.body = "We keep your data safer."
+            self.policy.save()
+        response = self.get_policy(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['body'], "We keep your data safer.")
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_is_cached_until_saved(self):
+        category = Category.objects.create(name="Analgesics")
+        view = CategoryViewSet.as_view({'get': 'retrieve'})
+
+        def get(**headers):
+            request = self.factory.get(f"/modules/inventory-management/category/{category.id}/", **headers)
+            force_authenticate(request, user=self.admin)
+            return view(request, pk=category.id)
+
+        etag = get()['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(get(HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.filter(id=category.id).update(name="Pain relief")
+            category.save()
+        self.assertEqual(get(HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_doctor_profiles_are_cached_per_user(self):
+        doctor_user = User.objects.create_user(username="doctor", email="doctor@example.com", password="pass@123", full_name="Dr Who")
+        doctor = Doctor.objects.create(user=doctor_user, specialized="general_physician")
+        patient = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        LikeDoctor.objects.create(user=patient, doctor=doctor, favourite='1')
+        url = reverse("doctors-detail", kwargs={'pk': doctor.id})
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=patient).key)
+        response = self.client.get(url)
+        self.assertEqual(response.data['favourite'], '1')
+        self.assertIn('Authorization', response['Vary'])
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.admin).key)
+        self.assertIsNone(self.client.get(url).data['favourite'])
+
+        etag = response['ETag']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + patient.auth_token.key)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor_user.full_name = "Dr Jones"
+            doctor_user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['full_name'], "Dr Jones")
+
+    def test_scope_changes_move_last_modified(self):
+        doctor = Doctor.objects.create(
+            user=User.objects.create_user(username="doctor", email="doctor@example.com", password="pass@123"),
+            specialized="general_physician",
+        )
+        patient = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        url = reverse("doctors-detail", kwargs={'pk': doctor.id})
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=patient).key)
+        with mock.patch("home.http_cache.time") as clock:
+            clock.time.return_value = int(timezone.now().timestamp())
+            modified = self.client.get(url)['Last-Modified']
+            # a new favourite changes no doctor row
+            with self.captureOnCommitCallbacks(execute=True):
+                LikeDoctor.objects.create(user=patient, doctor=doctor, favourite='1')
+            clock.time.return_value += 60
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['favourite'], '1')
+        self.assertNotEqual(response['Last-Modified'], modified)
+
+
+class LoginTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+
+    def login(self):
+        return self.client.post(reverse("login-list"), {"username": "patient", "password": "pass@123"}, format='json')
+
+    def onesignal_post(self, url, **kwargs):
+        if url.endswith("/subscriptions"):
+            subscription_type = kwargs['json']['subscription']['type']
+            return json_response(201, {'subscription': {'id': f"sub-{subscription_type}"}})
+        return json_response(201, {})
+
+    def test_login_queues_registration_once(self):
+        onesignal = get_client('onesignal')
+        with mock.patch.object(onesignal, 'get', return_value=json_response(404, {})) as get, \
+                mock.patch.object(onesignal, 'post', side_effect=self.onesignal_post) as post:
+            response = self.login()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn("token", response.data)
+            self.login()
+            self.assertEqual(get.call_count, 0)
+            self.assertEqual(Job.objects.count(), 1)
+
+            run_pending()
+            self.assertEqual(get.call_count, 1)
+            self.assertEqual(post.call_count, 3)
+
+            self.login()
+            self.assertEqual(get.call_count + post.call_count, 4)
+        subscription = OneSignalSubscription.objects.get(external_id=str(self.user.id))
+        self.assertTrue(subscription.registered)
+        self.assertEqual(subscription.subscription_ids, ["sub-AndroidPush", "sub-iOSPush"])
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_retry_adds_the_missing_subscription(self):
+        # an earlier attempt created the user and the Android subscription, then failed
+        existing = {'id': "onesignal-1", 'subscriptions': [{'id': "sub-AndroidPush", 'type': "AndroidPush"}]}
+        onesignal = get_client('onesignal')
+        with mock.patch.object(onesignal, 'get', return_value=json_response(200, existing)), \
+                mock.patch.object(onesignal, 'post', side_effect=self.onesignal_post) as post:
+            self.assertEqual(register_onesignal_user(self.user.id), {'registered': True, 'created': False})
+        self.assertEqual([call.kwargs['json']['subscription']['type'] for call in post.call_args_list], ["iOSPush"])
+        subscription = OneSignalSubscription.objects.get(external_id=str(self.user.id))
+        self.assertTrue(subscription.registered)
+        self.assertEqual(subscription.subscription_ids, ["sub-AndroidPush", "sub-iOSPush"])
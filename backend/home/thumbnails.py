@@ -0,0 +1,179 @@
+"""
+Resized copies of avatars and profile pictures.
+
+Pictures are stored as uploaded, often several megabytes straight from a
+phone camera, and every list that shows a face downloaded the original.
+After an upload `enqueue_derivatives` queues a job that writes the picture
+at each of DERIVATIVE_SIZES, as WebP and as JPEG, next to the original:
+`images/profile_pic/7/me.jpg` gets `me_96.webp`, `me_96.jpg` and so on.
+The EXIF orientation is applied to the pixels and the EXIF data, with the
+camera and location details, is left out of the copies.
+
+The names of the copies are kept in `User.image_derivatives` with the name
+of the picture they were made from, so the serializers sign the URL of a
+size without asking the storage, and show no sizes for a picture whose
+copies are not written yet. A job for a picture that was replaced in the
+meantime does nothing, and the copies of the previous picture are removed
+once the new ones are recorded.
+"""
+import hashlib
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from home.http_cache import invalidate_scope
+from home.signed_urls import object_key, sign_key
+from jobs.queue import enqueue
+from users.models import Doctor, User
+
+# The longest side of each size, in pixels
+DERIVATIVE_SIZES = {
+    'small': 96,
+    'medium': 320,
+    'large': 800,
+}
+# Pillow format, file extension and encoder options of each format
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+IMAGE_FIELDS = ('avatar', 'profile_picture')
+
+
+def derivative_name(name, size, image_format):
+    """
+    Returns the storage name of a copy, next to the original.
+    """
+    root, _ = posixpath.splitext(name)
+    return f'{root}_{DERIVATIVE_SIZES[size]}.{DERIVATIVE_FORMATS[image_format][1]}'
+
+
+def enqueue_derivatives(user, field):
+    """
+    Queues the job writing the copies of the current picture in `field`.
+
+    Returns:
+        Job: The queued job, None when the field is empty.
+    """
+    name = getattr(user, field).name
+    if not name:
+        return None
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:12]
+    return enqueue(
+        generate_derivatives,
+        {'user_id': user.id, 'field': field, 'name': name},
+        key=f"thumbnails:{user.id}:{field}:{digest}",
+        user=user,
+    )
+
+
+def enqueue_missing_derivatives():
+    """
+    Queues the jobs of the pictures without copies, for pictures uploaded
+    before the copies were made.
+
+    Returns:
+        int: The number of queued jobs.
+    """
+    count = 0
+    users = User.objects.filter(Q(avatar__gt='') | Q(profile_picture__gt=''))
+    for user in users.only('id', *IMAGE_FIELDS, 'image_derivatives').iterator():
+        for field in IMAGE_FIELDS:
+            entry = user.image_derivatives.get(field) or {}
+            if getattr(user, field) and entry.get('source') != getattr(user, field).name:
+                enqueue_derivatives(user, field)
+                count += 1
+    return count
+
+
+def load_image(file):
+    with file.storage.open(file.name, 'rb') as f:
+        image = Image.open(f)
+        # JPEGs are decoded at a fraction of their size when that still covers the largest copy
+        image.draft('RGB', (max(DERIVATIVE_SIZES.values()),) * 2)
+        image.load()
+    return ImageOps.exif_transpose(image)
+
+
+def encode(image, size, image_format):
+    """
+    Returns the bytes of a copy of `image` fitting in `size` pixels, without EXIF data.
+    """
+    pillow_format, _, options = DERIVATIVE_FORMATS[image_format]
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.LANCZOS)
+    has_alpha = copy.mode in ('RGBA', 'LA') or (copy.mode == 'P' and 'transparency' in copy.info)
+    if image_format == 'jpeg' and has_alpha:
+        background = Image.new('RGB', copy.size, (255, 255, 255))
+        background.paste(copy.convert('RGBA'), mask=copy.convert('RGBA').getchannel('A'))
+        copy = background
+    elif copy.mode not in ('RGB', 'RGBA'):
+        copy = copy.convert('RGBA' if has_alpha else 'RGB')
+    out = BytesIO()
+    # only the colour profile is carried over, info would pass the EXIF data on
+    copy.save(out, pillow_format, icc_profile=image.info.get('icc_profile'), **options)
+    return out.getvalue()
+
+
+def generate_derivatives(user_id, field, name):
+    """
+    Writes the copies of the picture `name` in `field` of a user and records them.
+    """
+    user = User.objects.filter(id=user_id).first()
+    if user is None or getattr(user, field).name != name:
+        return {'skipped': 'replaced'}
+    file = getattr(user, field)
+    storage = file.storage
+    image = load_image(file)
+    sizes = {}
+    for size, pixels in DERIVATIVE_SIZES.items():
+        sizes[size] = {}
+        for image_format in DERIVATIVE_FORMATS:
+            target = derivative_name(name, size, image_format)
+            # a retried job overwrites its copies instead of getting suffixed names
+            storage.delete(target)
+            sizes[size][image_format] = storage.save(target, ContentFile(encode(image, pixels, image_format)))
+
+    written = [copy for formats in sizes.values() for copy in formats.values()]
+    with transaction.atomic():
+        current = User.objects.select_for_update().filter(id=user_id, **{field: name}).first()
+        if current is not None:
+            previous = current.image_derivatives.get(field)
+            derivatives = {**current.image_derivatives, field: {'source': name, 'sizes': sizes}}
+            User.objects.filter(id=user_id).update(image_derivatives=derivatives)
+            if Doctor.objects.filter(user_id=user_id).exists():
+                # the directory shows the sizes, the update sends no post_save
+                transaction.on_commit(lambda: invalidate_scope('doctors'))
+    if current is None:
+        # replaced while the copies were written
+        stale = written
+    else:
+        old = [copy for formats in (previous or {}).get('sizes', {}).values() for copy in formats.values()]
+        stale = [copy for copy in old if copy not in written]
+    for copy in stale:
+        storage.delete(copy)
+    return {'field': field, 'name': name, 'derivatives': 0 if current is None else len(written)}
+
+
+def derivative_urls(user, field, sizes=None, sign=sign_key):
+    """
+    Returns the signed URLs of the copies of the picture in `field` by size
+    and format, all sizes by default. `sign` turns an object key into the
+    URL, `deferred_url` leaves the signing to the cached response.
+
+    Returns:
+        dict: The URLs, None while the copies of the current picture are not written.
+    """
+    file = getattr(user, field)
+    entry = (user.image_derivatives or {}).get(field)
+    if not file or not entry or entry.get('source') != file.name:
+        return None
+    return {
+        size: {image_format: sign(object_key(file.storage.url(copy))) for image_format, copy in formats.items()}
+        for size, formats in entry['sizes'].items()
+        if sizes is None or size in sizes
+    }
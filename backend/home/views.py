@@ -1,4 +1,12 @@
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission, IsAdminUser
+from rest_framework.views import APIView
+
+from home.instrumentation import render_prometheus
+from integrations.http import metrics_snapshot
 
 
 def home(request):
@@ -18,3 +26,28 @@ def home(request):
     ]
     context = {"packages": packages}
     return render(request, "home/index.html", context)
+
+
+class HasMetricsToken(BasePermission):
+    """
+    Allows requests with `Authorization: Bearer <settings.METRICS_TOKEN>`.
+    """
+
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(token) and constant_time_compare(header, f'Bearer {token}')
+
+
+class MetricsView(APIView):
+    """
+    Serves the request and outbound integration metrics of this process in the
+    Prometheus text format, for the scraper holding the metrics token or staff users.
+    """
+    permission_classes = [HasMetricsToken | IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            render_prometheus(metrics_snapshot()),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emr', '0017_rename_test_reults_signed_testresult_test_results_signed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['created_at', 'id'], name='medrec_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testresult',
+            index=models.Index(fields=['created_at', 'id'], name='testresult_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emr', '0018_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['user', 'frmdate', 'todate'], name='medrec_user_range_idx'),
+        ),
+    ]
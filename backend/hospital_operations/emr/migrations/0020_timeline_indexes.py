@@ -0,0 +1,21 @@
+# Generated by Django 3.2.23 on 2026-10-18 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emr', '0019_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['user', 'date', 'id'], name='medrec_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testresult',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='testresult_user_created_idx'),
+        ),
+    ]
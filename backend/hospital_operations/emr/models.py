@@ -8,6 +8,7 @@ from modules.django_inventory_management.inventory_management.models import *
 from users.models import PatientInfo, Doctor, User
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
 import os
 from datetime import datetime
 
@@ -81,6 +82,14 @@ class MedicalRecord(Base):
     status = models.CharField(max_length=255, null=True, blank=True)
     #records = models.FileField(upload_to=get_upload_medRec, null=True, blank=True)    
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='medrec_created_id_idx'),
+            models.Index(fields=['user', 'frmdate', 'todate'], name='medrec_user_range_idx'),
+            models.Index(fields=['user', 'date', 'id'], name='medrec_user_date_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='medrec_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.patient.user.username} - {self.date}"
 
@@ -108,5 +117,51 @@ class TestResult(Base):
     test_results = models.FileField(upload_to=get_upload_medRec, null=True, blank=True)
     test_results_signed = models.CharField(max_length=10000, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='testresult_created_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='testresult_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.test_name} - {self.result}"
+
+
+class TestResultUpload(models.Model):
+    """
+    Represents a test result file being uploaded straight to S3 in parts,
+    see patient.uploads.
+
+    Attributes:
+        user (User): The user uploading the file.
+        name (str): The file name in the media storage, the TestResult file once completed.
+        upload_id (str): The ID of the S3 multipart upload.
+        filename (str): The name of the file on the user's device.
+        content_type (str): The media type of the file.
+        size (int): The size of the file in bytes.
+        part_size (int): The size in bytes of every part but the last.
+        status (str): The current state of the upload.
+        test_result (TestResult): The test result created once the upload completed.
+        created_at (datetime): The date and time when the upload was started.
+        completed_at (datetime): The date and time when the upload was completed or aborted.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        COMPLETED = 'completed', _('Completed')
+        ABORTED = 'aborted', _('Aborted')
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='test_result_uploads')
+    name = models.CharField(max_length=1024)
+    upload_id = models.CharField(max_length=1024)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    part_size = models.BigIntegerField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    test_result = models.OneToOneField(TestResult, on_delete=models.SET_NULL, related_name='upload', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
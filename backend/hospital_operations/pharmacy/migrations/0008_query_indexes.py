@@ -0,0 +1,21 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0007_auto_20240305_2255'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(fields=['prescription', 'frm', 'to'], name='medication_presc_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['user', '-id'], name='prescription_user_id_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.23 on 2026-10-18 15:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pharmacy', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medication',
+            name='doses_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='MedicationDose',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_at', models.DateTimeField()),
+                ('reminded_at', models.DateTimeField(blank=True, null=True)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='doses', to='pharmacy.medication')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='medication_doses', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='medicationdose',
+            index=models.Index(fields=['user', 'due_at'], name='medication_dose_user_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicationdose',
+            index=models.Index(condition=models.Q(('reminded_at__isnull', True)), fields=['due_at'], name='medication_dose_pending_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='medicationdose',
+            constraint=models.UniqueConstraint(fields=('medication', 'due_at'), name='medication_dose_unique'),
+        ),
+    ]
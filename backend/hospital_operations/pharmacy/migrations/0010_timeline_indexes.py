@@ -0,0 +1,17 @@
+# Generated by Django 3.2.23 on 2026-10-18 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0009_medication_doses'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['user', 'issue_date', 'id'], name='prescription_user_issued_idx'),
+        ),
+    ]
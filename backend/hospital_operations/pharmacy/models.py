@@ -48,6 +48,12 @@ class Prescription(models.Model):
     last_updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='updated_prescriptions')
     last_updated_at = models.DateTimeField(auto_now=True, editable=False, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='prescription_user_id_idx'),
+            models.Index(fields=['user', 'issue_date', 'id'], name='prescription_user_issued_idx'),
+        ]
+
     def __str__(self):
         return f"Prescription for {self.user.name} by {self.doctor.name}"
 
@@ -64,6 +70,7 @@ class Medication(Base):
         frm (datetime): The start date and time of the medication.
         to (datetime): The end date and time of the medication.
         time (str): The time of day the medication should be taken.
+        doses_until (datetime): The time the doses of the medication are expanded until.
     """
 
     prescription = models.ForeignKey(Prescription, on_delete=models.CASCADE, null=True, blank=True)
@@ -74,9 +81,44 @@ class Medication(Base):
     frm = models.DateTimeField(null=True, blank=True)
     to = models.DateTimeField(null=True, blank=True)
     time = models.CharField(max_length=100, null=True, blank=True)    
+    doses_until = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['prescription', 'frm', 'to'], name='medication_presc_range_idx'),
+        ]
 
     def __str__(self):
         return f"Medication for {self.prescription.user.name}: {self.item.name}"
+
+class MedicationDose(models.Model):
+    """
+    Represents a dose of a medication due at a point in time, expanded from
+    the medication's schedule by patient.doses.
+
+    Attributes:
+        medication (Medication): The medication the dose is of.
+        user (User): The patient taking the dose, copied from the prescription.
+        due_at (datetime): The date and time the dose should be taken.
+        reminded_at (datetime): The date and time the reminder of the dose was sent.
+    """
+
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='doses')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='medication_doses')
+    due_at = models.DateTimeField()
+    reminded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['medication', 'due_at'], name='medication_dose_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'due_at'], name='medication_dose_user_due_idx'),
+            models.Index(fields=['due_at'], name='medication_dose_pending_idx', condition=models.Q(reminded_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.medication.item} due at {self.due_at}"
     
 class Dispense(Base):
     """
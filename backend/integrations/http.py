@@ -0,0 +1,286 @@
+"""
+Shared HTTP client for the third party integrations (OneSignal, Zoom, Epic).
+
+Each service gets one pooled keep-alive session with default timeouts,
+bounded retries with jittered exponential backoff and a circuit breaker.
+Every attempt is recorded in an in-process metrics registry keyed by
+service, method and endpoint, and sent as the call_finished signal.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+from integrations.signals import call_finished
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeout in seconds, used when the caller does not pass one
+DEFAULT_TIMEOUT = (3.05, 10)
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SERVICES = {
+    'onesignal': {'retries': 2, 'pool_size': 20},
+    'zoom': {'retries': 2, 'pool_size': 10},
+    'epic': {'retries': 2, 'pool_size': 5},
+}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of calling a service whose circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calling a service after `failure_threshold` consecutive failures.
+
+    After `reset_timeout` seconds one trial call is let through. A success
+    closes the breaker again, a failure keeps it open for another period.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'half-open':
+                # let a single trial call through and hold the others back
+                self.opened_at = time.monotonic()
+                return True
+            return state == 'closed'
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class EndpointMetrics:
+    """
+    Latency histogram and error counters for one service endpoint.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, seconds, error):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        if error:
+            self.errors += 1
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def record(service, method, endpoint, seconds, error):
+    call_finished.send(sender=IntegrationClient, service=service, method=method, endpoint=endpoint, seconds=seconds, error=error)
+    with _metrics_lock:
+        key = (service, method, endpoint)
+        if key not in _metrics:
+            _metrics[key] = EndpointMetrics()
+        _metrics[key].observe(seconds, error)
+
+
+def metrics_snapshot():
+    """
+    Returns the recorded metrics as a list of dicts, one per endpoint.
+    """
+    with _metrics_lock:
+        return [
+            {
+                'service': service,
+                'method': method,
+                'endpoint': endpoint,
+                'count': metrics.count,
+                'errors': metrics.errors,
+                'total_seconds': metrics.total_seconds,
+                'avg_seconds': metrics.total_seconds / metrics.count if metrics.count else 0.0,
+                'max_seconds': metrics.max_seconds,
+                'buckets': dict(zip(LATENCY_BUCKETS, metrics.buckets)),
+            }
+            for (service, method, endpoint), metrics in sorted(_metrics.items())
+        ]
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def connect_failed(error):
+    """
+    Returns whether a request failed while connecting, before any of it was
+    sent. A connection dropped later, like "Connection aborted", may have
+    reached the server.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # refused connections and failed DNS lookups, urllib3 raises them as NewConnectionError
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, ConnectTimeoutError)
+
+
+def endpoint_label(url):
+    """
+    Returns the URL path with ids replaced, so metrics stay low cardinality.
+    """
+    path = urlparse(url).path
+    return re.sub(r'/(\d+|[0-9a-fA-F-]{32,36})(?=/|$)', '/{id}', path) or '/'
+
+
+class IntegrationClient:
+    """
+    A pooled HTTP client for a single third party service.
+
+    Attributes:
+        name (str): The service name used in metrics and logs.
+        timeout (tuple): Default (connect, read) timeout.
+        retries (int): How many times a failed call is retried.
+        backoff (float): Base delay in seconds between retries.
+        max_backoff (float): Upper bound for a single retry delay.
+        breaker (CircuitBreaker): The circuit breaker guarding the service.
+    """
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT, retries=2, backoff=0.5, max_backoff=5.0,
+                 pool_size=10, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, method, url, endpoint=None, idempotent=None, **kwargs):
+        """
+        Sends a request and returns the `requests.Response`.
+
+        Failures to connect are always retried because the request never
+        reached the server. Other errors, like timeouts, dropped connections
+        and 5xx responses, are only retried for idempotent methods, or when
+        `idempotent=True` is passed.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The absolute URL.
+            endpoint (str): Metrics label. Defaults to the URL path with ids replaced.
+            idempotent (bool): Overrides whether the call is safe to repeat.
+            **kwargs: Passed to `requests.Session.request`.
+
+        Raises:
+            CircuitOpenError: If the service circuit breaker is open.
+            requests.RequestException: If the last attempt failed.
+        """
+        method = method.upper()
+        endpoint = endpoint or endpoint_label(url)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', self.timeout)
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                record(self.name, method, endpoint, 0.0, True)
+                raise CircuitOpenError(f"{self.name} circuit breaker is open")
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                record(self.name, method, endpoint, time.monotonic() - started, True)
+                self.breaker.record_failure()
+                if attempt < self.retries and (idempotent or connect_failed(e)):
+                    logger.warning("%s %s %s failed (%s), retrying", self.name, method, endpoint, e)
+                    time.sleep(self.retry_delay(attempt))
+                    attempt += 1
+                    continue
+                raise
+
+            failed = response.status_code >= 500
+            record(self.name, method, endpoint, time.monotonic() - started, failed or response.status_code == 429)
+            if failed:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if response.status_code in RETRY_STATUSES and attempt < self.retries and (idempotent or response.status_code == 429):
+                logger.warning("%s %s %s returned %s, retrying", self.name, method, endpoint, response.status_code)
+                time.sleep(self.retry_delay(attempt, response))
+                attempt += 1
+                continue
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """
+    Returns the process-wide client for a service listed in SERVICES.
+    """
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = IntegrationClient(name, **SERVICES.get(name, {}))
+        return _clients[name]
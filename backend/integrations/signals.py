@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent after every attempt of an outbound call, with the service name, method,
+# endpoint label, duration in seconds and whether it failed. The request
+# instrumentation in home subscribes to it.
+call_finished = Signal()
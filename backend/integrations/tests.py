@@ -0,0 +1,71 @@
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from integrations.http import IntegrationClient, CircuitOpenError, metrics_snapshot, reset_metrics, endpoint_label
+
+
+def fake_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return response
+
+
+class IntegrationClientTestCase(SimpleTestCase):
+    def setUp(self):
+        reset_metrics()
+        self.client = IntegrationClient('test', retries=2, backoff=0, failure_threshold=3, reset_timeout=60)
+
+    def test_get_is_retried_on_503(self):
+        with mock.patch.object(self.client.session, 'request', side_effect=[fake_response(503), fake_response(200)]) as request:
+            response = self.client.get('https://example.com/items/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(request.call_args.kwargs['timeout'], self.client.timeout)
+
+    def test_post_is_not_retried_on_503(self):
+        with mock.patch.object(self.client.session, 'request', return_value=fake_response(503)) as request:
+            response = self.client.post('https://example.com/items')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(request.call_count, 1)
+
+    def test_connect_failure_is_retried_then_raised(self):
+        refused = requests.exceptions.ConnectionError(MaxRetryError(None, '/items', NewConnectionError(None, "refused")))
+        with mock.patch.object(self.client.session, 'request', side_effect=refused) as request:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.client.post('https://example.com/items')
+        self.assertEqual(request.call_count, 3)
+
+    def test_post_is_not_retried_after_connection_aborted(self):
+        # the body may have reached the server, a repeat could create a second meeting
+        aborted = requests.exceptions.ConnectionError(ProtocolError("Connection aborted.", ConnectionResetError()))
+        with mock.patch.object(self.client.session, 'request', side_effect=aborted) as request:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.client.post('https://example.com/items')
+        self.assertEqual(request.call_count, 1)
+        with mock.patch.object(self.client.session, 'request', side_effect=[aborted, fake_response(200)]) as request:
+            self.assertEqual(self.client.get('https://example.com/items/1').status_code, 200)
+        self.assertEqual(request.call_count, 2)
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        with mock.patch.object(self.client.session, 'request', return_value=fake_response(500)) as request:
+            for _ in range(3):
+                self.client.post('https://example.com/items')
+            with self.assertRaises(CircuitOpenError):
+                self.client.post('https://example.com/items')
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(self.client.breaker.state, 'open')
+
+    def test_metrics_are_recorded_per_endpoint(self):
+        with mock.patch.object(self.client.session, 'request', return_value=fake_response(200)):
+            self.client.get('https://example.com/users/12/subscriptions')
+            self.client.get('https://example.com/users/13/subscriptions')
+        [metrics] = metrics_snapshot()
+        self.assertEqual(metrics['endpoint'], '/users/{id}/subscriptions')
+        self.assertEqual(metrics['count'], 2)
+        self.assertEqual(metrics['errors'], 0)
+
+    def test_endpoint_label_replaces_uuids(self):
+        self.assertEqual(endpoint_label('https://x/notifications/9c1f1f0e-3b7a-4bb4-8f0e-1d2c3b4a5f60?app_id=1'), '/notifications/{id}')
@@ -0,0 +1,17 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from integrations.http import get_client, metrics_snapshot, SERVICES
+
+
+class IntegrationMetricsView(APIView):
+    """
+    Returns per-endpoint latency and error metrics of the outbound integrations
+    recorded by this process, with the state of each circuit breaker.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        breakers = {name: get_client(name).breaker.state for name in SERVICES}
+        return Response({'breakers': breakers, 'endpoints': metrics_snapshot()})
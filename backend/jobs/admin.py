@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'worker', 'updated_at',)
+    list_filter = ('status', 'name',)
+    search_fields = ('name', 'key',)
+
+
+admin.site.register(Job, JobAdmin)
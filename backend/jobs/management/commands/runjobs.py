@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import run_pending, worker_name
+
+
+class Command(BaseCommand):
+    help = "Run background jobs stored in the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run the jobs that are currently due and exit.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when no job is due.",
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        self.stdout.write(f"Worker {worker} started")
+        while True:
+            count = run_pending(worker=worker)
+            if count:
+                self.stdout.write(f"Ran {count} job(s)")
+            if options["once"]:
+                break
+            if not count:
+                time.sleep(options["interval"])
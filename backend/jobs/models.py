@@ -0,0 +1,59 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from users.models import User
+
+
+class Job(models.Model):
+    """
+    Represents a unit of background work persisted in the database.
+
+    Jobs are picked up by the `runjobs` management command, so no external
+    broker is needed. A failed job is retried with backoff until it runs out
+    of attempts.
+
+    Attributes:
+        name (str): Dotted path of the callable that performs the work.
+        kwargs (dict): JSON-serializable keyword arguments for the callable.
+        key (str): Optional idempotency key. Enqueueing the same key twice returns the existing job.
+        status (str): The current state of the job.
+        attempts (int): How many times the job has been started.
+        max_attempts (int): How many times the job may be started before it is marked as failed.
+        run_at (DateTime): The earliest time the job may run.
+        locked_at (DateTime): When a worker claimed the job.
+        worker (str): Identifier of the worker that claimed the job.
+        result (dict): The JSON value returned by the callable.
+        last_error (str): The traceback of the last failed attempt.
+        user (User): The user allowed to poll the job state.
+        created_at (DateTime): The date and time when the job was created.
+        updated_at (DateTime): The date and time when the job was last updated.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        RUNNING = 'running', _('Running')
+        SUCCEEDED = 'succeeded', _('Succeeded')
+        FAILED = 'failed', _('Failed')
+
+    name = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=255, null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='jobs', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
@@ -0,0 +1,148 @@
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Retry delays grow exponentially from RETRY_BASE_DELAY up to RETRY_MAX_DELAY seconds.
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 60 * 60
+# A running job whose worker has been silent for this long is handed to another worker.
+STALE_LOCK_TIMEOUT = timedelta(minutes=15)
+
+
+def task_name(func):
+    """
+    Returns the dotted path the worker uses to import the callable.
+    """
+    return f"{func.__module__}.{func.__name__}"
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(func, kwargs=None, key=None, user=None, run_at=None, max_attempts=5):
+    """
+    Persists a job that calls `func(**kwargs)` on the background worker.
+
+    Args:
+        func (callable): A module level function. Its return value must be JSON-serializable.
+        kwargs (dict): Keyword arguments for the callable.
+        key (str): Idempotency key. If a job with this key exists it is returned; a
+            failed one is first given a fresh set of attempts.
+        user (User): The user allowed to poll the job state.
+        run_at (datetime): The earliest time the job may run. Defaults to now.
+        max_attempts (int): How many times the job may be started.
+
+    Returns:
+        Job: The created or existing job.
+    """
+    fields = {
+        'name': task_name(func),
+        'kwargs': kwargs or {},
+        'user': user,
+        'run_at': run_at or timezone.now(),
+        'max_attempts': max_attempts,
+    }
+    if key:
+        job, created = Job.objects.get_or_create(key=key, defaults=fields)
+        if not created and job.status == Job.Status.FAILED:
+            Job.objects.filter(id=job.id, status=Job.Status.FAILED).update(
+                status=Job.Status.PENDING, attempts=0, run_at=fields['run_at'],
+            )
+            job.refresh_from_db()
+        return job
+    return Job.objects.create(**fields)
+
+
+def retry_delay(attempts):
+    """
+    Returns the backoff before the next attempt, with full jitter.
+    """
+    ceiling = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=random.uniform(RETRY_BASE_DELAY / 2, ceiling))
+
+
+def requeue_stale():
+    """
+    Returns jobs left running by a crashed worker to the pending state.
+    """
+    cutoff = timezone.now() - STALE_LOCK_TIMEOUT
+    return Job.objects.filter(status=Job.Status.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.Status.PENDING, locked_at=None, worker=None,
+    )
+
+
+def claim_next(worker=None):
+    """
+    Atomically claims the next due job.
+
+    The claim is a conditional UPDATE on the pending state, so two workers
+    racing for the same row cannot both win it.
+
+    Returns:
+        Job: The claimed job, or None if nothing is due.
+    """
+    worker = worker or worker_name()
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.Status.PENDING, run_at__lte=now).order_by('run_at', 'id')
+    for job_id in due.values_list('id', flat=True)[:10]:
+        claimed = Job.objects.filter(id=job_id, status=Job.Status.PENDING).update(
+            status=Job.Status.RUNNING, locked_at=now, worker=worker, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """
+    Runs a claimed job and records the outcome.
+
+    On failure the job is rescheduled with backoff, or marked as failed once
+    it has used all of its attempts.
+    """
+    try:
+        result = import_string(job.name)(**job.kwargs)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s", job.id, job.name, job.attempts)
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.Status.FAILED
+        else:
+            job.status = Job.Status.PENDING
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+    else:
+        job.status = Job.Status.SUCCEEDED
+        job.result = result
+    job.locked_at = None
+    job.save(update_fields=['status', 'result', 'last_error', 'run_at', 'locked_at', 'updated_at'])
+    return job
+
+
+def run_pending(limit=None, worker=None):
+    """
+    Runs due jobs until none are left or `limit` jobs have run.
+
+    Returns:
+        int: The number of jobs that ran.
+    """
+    requeue_stale()
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next(worker)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
@@ -0,0 +1,10 @@
+from rest_framework import serializers
+
+from jobs.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    # the result stays on the server, a booking's email job records the doctor's address
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at', 'updated_at']
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import enqueue, run_pending, claim_next
+
+
+def succeed(value):
+    return {'value': value}
+
+
+def explode():
+    raise ValueError("boom")
+
+
+class JobQueueTestCase(TestCase):
+    def test_enqueue_with_key_is_idempotent(self):
+        first = enqueue(succeed, {'value': 1}, key="same")
+        second = enqueue(succeed, {'value': 2}, key="same")
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_run_pending_records_result(self):
+        job = enqueue(succeed, {'value': 3})
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(job.result, {'value': 3})
+        self.assertEqual(job.attempts, 1)
+
+    def test_failed_job_is_rescheduled_then_failed(self):
+        job = enqueue(explode, max_attempts=2)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.PENDING)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn("boom", job.last_error)
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_job_is_claimed_once(self):
+        job = enqueue(succeed, {'value': 4})
+        self.assertEqual(claim_next("a").id, job.id)
+        self.assertIsNone(claim_next("b"))
+
+    def test_stale_running_job_is_requeued(self):
+        job = enqueue(succeed, {'value': 5})
+        Job.objects.filter(id=job.id).update(status=Job.Status.RUNNING, locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+
+    def test_enqueue_revives_failed_job_with_same_key(self):
+        job = enqueue(explode, key="retry-me", max_attempts=1)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+
+        revived = enqueue(explode, key="retry-me", max_attempts=1)
+        self.assertEqual(revived.id, job.id)
+        self.assertEqual(revived.status, Job.Status.PENDING)
+        self.assertEqual(revived.attempts, 0)
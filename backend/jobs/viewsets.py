@@ -0,0 +1,17 @@
+from rest_framework.viewsets import ReadOnlyModelViewSet
+from rest_framework.permissions import IsAuthenticated
+
+from jobs.models import Job
+from jobs.serializers import JobSerializer
+
+
+class JobViewSet(ReadOnlyModelViewSet):
+    """
+    A read-only viewset the client polls for the state of its background jobs.
+    """
+
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user).order_by('-id')
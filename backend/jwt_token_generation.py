@@ -1,7 +1,7 @@
 from datetime import datetime
 from datetime import timezone
 from datetime import timedelta
-import requests
+from integrations.http import get_client
 import jwt
 import os
 import uuid
@@ -47,5 +47,5 @@ payload = {
     "client_assertion_type": "urn:ietf:params:oauth:client-assertion-type:jwt-bearer",
     "client_assertion": token
 }
-r = requests.post('https://fhir.epic.com/interconnect-fhir-oauth/oauth2/token', data=payload, timeout=10)
+r = get_client('epic').post('https://fhir.epic.com/interconnect-fhir-oauth/oauth2/token', data=payload, timeout=10, endpoint="oauth2/token")
 print(r.status_code, f"\n------{r}\n-------",  f"\n<---Token\n-->{r.content}") # is everything 200 OK?
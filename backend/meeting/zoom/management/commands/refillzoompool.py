@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from meeting.zoom.pool import refill_pool
+
+
+class Command(BaseCommand):
+    help = "Reclaim expired pooled Zoom meetings and top the pool up to ZOOM_POOL_SIZE"
+
+    def handle(self, *args, **options):
+        result = refill_pool()
+        self.stdout.write(f"Created {result['created']} meeting(s), reclaimed {result['reclaimed']}")
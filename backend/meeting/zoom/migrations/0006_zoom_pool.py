@@ -0,0 +1,22 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zoom', '0005_alter_zoomtoken_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zoom',
+            name='status',
+            field=models.CharField(choices=[('pooled', 'Pooled'), ('claimed', 'Claimed'), ('scheduled', 'Scheduled')], default='scheduled', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='zoom',
+            index=models.Index(fields=['status', 'created_at'], name='zoom_status_created_idx'),
+        ),
+    ]
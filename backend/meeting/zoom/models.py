@@ -14,6 +14,8 @@ class Zoom(models.Model):
  
     Attributes:
         appointment (Appointment): The appointment associated with the Zoom meeting.
+        status (str): Whether the meeting is waiting in the pool, claimed by an appointment
+            but not yet rescheduled on Zoom, or scheduled for its appointment.
         meeting_id (str): The ID of the Zoom meeting.
         password (str): The password for the Zoom meeting.
         created_at (DateTime): The date and time when the Zoom meeting was created.
@@ -21,8 +23,14 @@ class Zoom(models.Model):
         created_by (User): The user who created the Zoom meeting.
         updated_by (User): The user who last updated the Zoom meeting.
     """
+
+    class Status(models.TextChoices):
+        POOLED = 'pooled', _('Pooled')
+        CLAIMED = 'claimed', _('Claimed')
+        SCHEDULED = 'scheduled', _('Scheduled')
  
     appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='zoom_appointment', null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.SCHEDULED)
     meeting_id = models.CharField(max_length=255, null=True, blank=True)
     join_url = models.CharField(max_length=255, null=True, blank=True)
     password = models.CharField(max_length=255, null=True, blank=True)
@@ -30,8 +38,15 @@ class Zoom(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='zoom_created_by', null=True, blank=True)
     updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='zoom_updated_by', null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='zoom_status_created_idx'),
+        ]
  
     def __str__(self):
+        if self.appointment is None:
+            return f"Pooled Zoom meeting {self.meeting_id}"
         return f"Zoom meeting for {self.appointment.user.username} with {self.appointment.doctor.user.username}"
 
 class ZoomToken(models.Model):
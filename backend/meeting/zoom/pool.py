@@ -0,0 +1,123 @@
+"""
+Pool of pre-created Zoom meetings.
+
+Creating a meeting is the slowest step of a booking, so up to
+settings.ZOOM_POOL_SIZE meetings are created ahead of time. A booking
+claims one and a background job moves it to the appointment time. Every
+meeting is hosted by the account user, so a single pool serves all doctors.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import enqueue
+from meeting.zoom.models import Zoom
+from meeting.zoom.utils import delete_meeting, post_meeting
+
+logger = logging.getLogger(__name__)
+
+REFILL_KEY = "zoom:pool:refill"
+
+
+def expiry_cutoff():
+    """
+    Pooled meetings created before this time are no longer handed out.
+    """
+    return timezone.now() - timedelta(days=settings.ZOOM_POOL_MAX_AGE_DAYS)
+
+
+def claim_meeting(appointment):
+    """
+    Hands a pooled meeting to the appointment.
+
+    The claim is a conditional UPDATE on the pooled state, so two bookings
+    racing for the same meeting cannot both win it.
+
+    Returns:
+        Zoom: The claimed meeting, or None if the pool is empty or disabled.
+    """
+    if not settings.ZOOM_POOL_SIZE:
+        return None
+    pooled = Zoom.objects.filter(status=Zoom.Status.POOLED, created_at__gt=expiry_cutoff()).order_by('created_at', 'id')
+    for meeting_id in pooled.values_list('id', flat=True)[:10]:
+        claimed = Zoom.objects.filter(id=meeting_id, status=Zoom.Status.POOLED).update(
+            status=Zoom.Status.CLAIMED, appointment=appointment, updated_at=timezone.now(),
+        )
+        if claimed:
+            return Zoom.objects.get(id=meeting_id)
+    return None
+
+
+def provision_meeting():
+    """
+    Creates a meeting on Zoom and adds it to the pool.
+    """
+    # the start time is a placeholder, it is replaced when the meeting is claimed
+    start_time = (timezone.now() + timedelta(days=1)).replace(microsecond=0, tzinfo=None).isoformat()
+    zoom_data = post_meeting(topic="Consultation", type=2, start_time=start_time, userId="me")
+    return Zoom.objects.create(
+        status=Zoom.Status.POOLED,
+        meeting_id=zoom_data.get('id'),
+        join_url=zoom_data.get('join_url'),
+        password=zoom_data.get('password'),
+    )
+
+
+def reclaim_expired():
+    """
+    Removes pooled meetings that were never claimed and deletes them on Zoom.
+
+    Returns:
+        int: The number of meetings removed from the pool.
+    """
+    count = 0
+    expired = Zoom.objects.filter(status=Zoom.Status.POOLED, created_at__lte=expiry_cutoff())
+    for meeting in expired:
+        # deleting the row first takes the meeting out of the pool even if Zoom is down
+        deleted, _ = Zoom.objects.filter(id=meeting.id, status=Zoom.Status.POOLED).delete()
+        if not deleted:
+            continue
+        count += 1
+        try:
+            delete_meeting(meeting.meeting_id)
+        except Exception:
+            logger.warning("Could not delete expired pooled Zoom meeting %s", meeting.meeting_id, exc_info=True)
+    return count
+
+
+def refill_pool():
+    """
+    Reclaims expired meetings and tops the pool up to settings.ZOOM_POOL_SIZE.
+    """
+    reclaimed = reclaim_expired()
+    available = Zoom.objects.filter(status=Zoom.Status.POOLED).count()
+    created = 0
+    for _ in range(max(settings.ZOOM_POOL_SIZE - available, 0)):
+        provision_meeting()
+        created += 1
+    return {'created': created, 'reclaimed': reclaimed}
+
+
+def enqueue_refill():
+    """
+    Queues a pool refill, shared by every booking while one is waiting or running.
+
+    The refill job has one idempotency key, so concurrent bookings get the
+    same row from the unique index. Once it has run, the conditional UPDATE
+    back to pending lets exactly one of them queue it again.
+
+    Returns:
+        Job: The refill job, or None if the pool is disabled.
+    """
+    if not settings.ZOOM_POOL_SIZE:
+        return None
+    job = enqueue(refill_pool, key=REFILL_KEY)
+    if job.status == Job.Status.SUCCEEDED:
+        Job.objects.filter(id=job.id, status=Job.Status.SUCCEEDED).update(
+            status=Job.Status.PENDING, attempts=0, run_at=timezone.now(),
+        )
+        job.refresh_from_db()
+    return job
@@ -0,0 +1,148 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from integrations.http import get_client
+from meeting.zoom.models import Zoom, ZoomToken
+from users.models import User, Doctor, Appointment
+from jobs.models import Job
+from jobs.queue import run_pending
+from meeting.zoom.pool import claim_meeting, enqueue_refill, refill_pool
+from meeting.zoom.tokens import ZoomTokenManager
+from meeting.zoom.utils import ZoomAPIError, call_zoom_api
+
+
+def json_response(status_code, data=None):
+    response = mock.Mock(status_code=status_code)
+    response.json.return_value = data or {}
+    return response
+
+
+class ZoomTokenManagerTestCase(TestCase):
+    def setUp(self):
+        self.manager = ZoomTokenManager()
+
+    @mock.patch("meeting.zoom.tokens.generate_token")
+    def test_valid_token_is_served_from_memory(self, generate_token):
+        self.manager.token, self.manager.expiry = "cached", timezone.now() + timedelta(hours=1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.manager.get_token(), "cached")
+        generate_token.assert_not_called()
+
+    @mock.patch("meeting.zoom.tokens.generate_token")
+    def test_stored_token_is_adopted(self, generate_token):
+        ZoomToken.objects.create(token="stored", expiry=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.manager.get_token(), "stored")
+        generate_token.assert_not_called()
+
+    def test_concurrent_callers_share_one_refresh(self):
+        calls = []
+
+        def slow_generate_token():
+            calls.append(1)
+            time.sleep(0.05)
+            return "fresh", timezone.now() + timedelta(hours=1)
+
+        tokens = []
+        with mock.patch("meeting.zoom.tokens.generate_token", side_effect=slow_generate_token), \
+                mock.patch.object(ZoomTokenManager, "load_stored", return_value=False):
+            threads = [threading.Thread(target=lambda: tokens.append(self.manager.get_token())) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(tokens, ["fresh"] * 8)
+
+    def test_token_near_expiry_is_refreshed_in_background(self):
+        self.manager.token, self.manager.expiry = "old", timezone.now() + timedelta(minutes=1)
+        with mock.patch("meeting.zoom.tokens.generate_token", return_value=("new", timezone.now() + timedelta(hours=1))) as generate_token, \
+                mock.patch("meeting.zoom.tokens.connection"):
+            self.assertEqual(self.manager.get_token(), "old")
+            for _ in range(100):
+                if not self.manager.refreshing:
+                    break
+                time.sleep(0.01)
+        generate_token.assert_called_once()
+        self.assertEqual(self.manager.get_token(), "new")
+
+
+class CallZoomApiTestCase(TestCase):
+    meeting = {'id': 123, 'join_url': "https://zoom.us/j/123", 'password': "pw"}
+
+    def setUp(self):
+        patcher = mock.patch("meeting.zoom.utils.token_manager")
+        self.token_manager = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.token_manager.get_token.side_effect = ["stale", "fresh"]
+
+    @mock.patch.object(get_client('zoom'), 'post')
+    def test_rejected_token_is_replaced_once(self, post):
+        post.side_effect = [json_response(401), json_response(201, self.meeting)]
+        meeting = call_zoom_api("Consultation", 2, "2030-01-01T10:30:00", "patient@example.com", None)
+        self.assertIsInstance(meeting, Zoom)
+        self.assertEqual(meeting.join_url, self.meeting['join_url'])
+        self.token_manager.invalidate.assert_called_once_with("stale")
+        self.assertEqual(post.call_args.kwargs['headers']['Authorization'], "Bearer fresh")
+
+    @mock.patch.object(get_client('zoom'), 'post')
+    def test_retries_are_capped(self, post):
+        post.return_value = json_response(401)
+        with self.assertRaises(ZoomAPIError):
+            call_zoom_api("Consultation", 2, "2030-01-01T10:30:00", "patient@example.com", None)
+        self.assertEqual(post.call_count, 2)
+        self.assertFalse(Zoom.objects.exists())
+
+
+@override_settings(ZOOM_POOL_SIZE=3, ZOOM_POOL_MAX_AGE_DAYS=14)
+class ZoomPoolTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        doctor_user = User.objects.create_user(username="doctor", email="doctor@example.com", password="pass@123")
+        doctor = Doctor.objects.create(user=doctor_user, specialized="general_physician")
+        self.appointment = Appointment.objects.create(user=user, doctor=doctor, date="2030-01-01", consult_time="10:30")
+
+    def pooled(self, meeting_id, age=timedelta(0)):
+        meeting = Zoom.objects.create(status=Zoom.Status.POOLED, meeting_id=meeting_id, join_url=f"https://zoom.us/j/{meeting_id}")
+        Zoom.objects.filter(id=meeting.id).update(created_at=timezone.now() - age)
+        return meeting
+
+    def test_claim_takes_oldest_unexpired_meeting(self):
+        self.pooled("expired", age=timedelta(days=15))
+        self.pooled("older", age=timedelta(days=2))
+        self.pooled("newer", age=timedelta(days=1))
+        meeting = claim_meeting(self.appointment)
+        self.assertEqual(meeting.meeting_id, "older")
+        self.assertEqual(meeting.status, Zoom.Status.CLAIMED)
+        self.assertEqual(meeting.appointment, self.appointment)
+
+    def test_claim_on_empty_or_disabled_pool(self):
+        self.assertIsNone(claim_meeting(self.appointment))
+        self.pooled("1")
+        with override_settings(ZOOM_POOL_SIZE=0):
+            self.assertIsNone(claim_meeting(self.appointment))
+
+    @mock.patch("meeting.zoom.pool.delete_meeting")
+    @mock.patch("meeting.zoom.pool.post_meeting")
+    def test_refill_reclaims_and_tops_up(self, post_meeting, delete_meeting):
+        post_meeting.side_effect = [{'id': n, 'join_url': f"https://zoom.us/j/{n}"} for n in (10, 11)]
+        self.pooled("expired", age=timedelta(days=15))
+        self.pooled("fresh")
+        self.assertEqual(refill_pool(), {'created': 2, 'reclaimed': 1})
+        delete_meeting.assert_called_once_with("expired")
+        self.assertEqual(Zoom.objects.filter(status=Zoom.Status.POOLED).count(), 3)
+
+    @mock.patch("meeting.zoom.pool.post_meeting", return_value={'id': 10, 'join_url': "https://zoom.us/j/10"})
+    def test_refill_is_queued_once(self, post_meeting):
+        job = enqueue_refill()
+        self.assertEqual(enqueue_refill().id, job.id)
+        self.assertEqual(Job.objects.count(), 1)
+
+        run_pending()
+        # a finished refill is queued again by the next booking
+        self.assertEqual(enqueue_refill().status, Job.Status.PENDING)
+        self.assertEqual(Job.objects.count(), 1)
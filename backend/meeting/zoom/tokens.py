@@ -0,0 +1,134 @@
+import base64
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from integrations.http import get_client
+from meeting.zoom.models import ZoomToken
+
+logger = logging.getLogger(__name__)
+
+client_id = os.environ.get('ZOOM_CLIENT_ID')
+client_secret = os.environ.get('ZOOM_CLIENT_SECRET')
+account_id = os.environ.get('ZOOM_ACCOUNT_ID')
+
+# Tokens are refreshed in the background once they are this close to expiry
+REFRESH_MARGIN = timedelta(minutes=5)
+
+
+class ZoomTokenError(Exception):
+    """
+    Raised when Zoom does not issue an access token.
+    """
+
+
+def generate_token():
+    """
+    Requests a new account credentials token from Zoom and stores it.
+
+    Returns:
+        tuple: The access token and its expiry.
+
+    Raises:
+        ZoomTokenError: If Zoom rejects the request.
+    """
+    auth = f'{client_id}:{client_secret}'
+    # encode the client_id and client_secret to base64
+    encoded_auth = base64.b64encode(auth.encode('utf-8')).decode('utf-8')
+    headers = {
+        'Authorization': f'Basic {encoded_auth}'
+    }
+    params = {
+        "grant_type": "account_credentials",
+        "account_id": account_id
+    }
+    response = get_client('zoom').post('https://zoom.us/oauth/token', headers=headers, params=params, endpoint="oauth/token")
+    if response.status_code != 200:
+        raise ZoomTokenError(f"Zoom token request failed with status {response.status_code}")
+    token_data = response.json()
+    current_token = token_data.get('access_token')
+    token_expiry = timezone.now() + timedelta(seconds=token_data.get('expires_in', 3600))
+    ZoomToken.objects.update_or_create(defaults={'token': current_token, 'client_id': client_id, 'client_secret': client_secret, 'account_id': account_id, "expiry": token_expiry})
+    return current_token, token_expiry
+
+
+class ZoomTokenManager:
+    """
+    Keeps the Zoom access token in memory.
+
+    A token close to expiry is still handed out while one background thread
+    fetches its successor. When there is no usable token, callers wait on a
+    lock so concurrent bookings trigger a single refresh.
+    """
+
+    def __init__(self):
+        self.token = None
+        self.expiry = None
+        self.lock = threading.Lock()
+        self.refreshing = False
+
+    def is_usable(self, margin=timedelta(0)):
+        return self.token is not None and timezone.now() + margin < self.expiry
+
+    def load_stored(self):
+        """
+        Adopts the stored token if another process refreshed it recently.
+        """
+        stored = ZoomToken.objects.exclude(token__isnull=True).exclude(expiry__isnull=True).order_by('-expiry').first()
+        if stored and stored.expiry > timezone.now() + REFRESH_MARGIN:
+            self.token, self.expiry = stored.token, stored.expiry
+            return True
+        return False
+
+    def refresh(self):
+        self.token, self.expiry = generate_token()
+
+    def get_token(self):
+        """
+        Returns a valid access token, refreshing it when needed.
+        """
+        if self.is_usable(REFRESH_MARGIN):
+            return self.token
+        if self.is_usable():
+            token = self.token
+            self.refresh_in_background()
+            return token
+        with self.lock:
+            # another thread may have refreshed while this one waited
+            if not self.is_usable() and not self.load_stored():
+                self.refresh()
+            return self.token
+
+    def invalidate(self, token):
+        """
+        Drops a token that Zoom rejected, unless it was already replaced.
+        """
+        with self.lock:
+            if self.token == token:
+                self.token = None
+                self.expiry = None
+
+    def refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            with self.lock:
+                if not self.is_usable(REFRESH_MARGIN):
+                    self.refresh()
+        except Exception:
+            logger.exception("Background Zoom token refresh failed")
+        finally:
+            self.refreshing = False
+            connection.close()
+
+
+token_manager = ZoomTokenManager()
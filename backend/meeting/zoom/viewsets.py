@@ -9,7 +9,7 @@ from rest_framework import status, filters
 from rest_framework.mixins import UpdateModelMixin
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-from meeting.zoom.utils import create_meeting, generate_token
+from meeting.zoom.utils import create_meeting
 from users.models import User
 from rest_framework.decorators import action
 from rest_framework.views import APIView
@@ -26,18 +26,10 @@ class ZoomMeetingViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = ZoomMeetingSerializer
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # Initialize token
-        self.token = generate_token()
-
     def create(self, request, *args, **kwargs):
-        # Call generate_token to get the access token
-        if isinstance(self.token, Exception):
-            return Response({"error": "Failed to generate token"}, status=500)        
-        
-        resp = create_meeting(request.data['topic'], request.data['type'], request.data['start_time'], self.request.user)
+        meeting = create_meeting(request.data['topic'], request.data['type'], request.data['start_time'], self.request.user.email)
+        if isinstance(meeting, Exception):
+            return Response({"error": "Failed to create meeting"}, status=500)
 
-        return Response({"message": "Meeting created successfully", "data":resp.json()}, status=201 ) 
-    
- 
\ No newline at end of file
+        data = {"meeting_id": meeting.meeting_id, "join_url": meeting.join_url, "password": meeting.password}
+        return Response({"message": "Meeting created successfully", "data": data}, status=201)
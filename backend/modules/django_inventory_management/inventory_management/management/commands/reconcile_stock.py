@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from modules.django_inventory_management.inventory_management.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild Product.on_hand from the Stock ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the products that are out of step without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        drifted = [
+            product_id
+            for product_id, on_hand, ledger in Product.objects.annotate(ledger=Product.ledger_expression()).values_list('id', 'on_hand', 'ledger')
+            if on_hand != ledger
+        ]
+        fixed = 0
+        for product_id in drifted:
+            with transaction.atomic():
+                # lock the product so stock movements wait until it is rebuilt
+                product = Product.objects.select_for_update().get(id=product_id)
+                ledger = product.ledger_stock()
+                if product.on_hand == ledger:
+                    continue
+                self.stdout.write(f"Product {product.id}: on_hand {product.on_hand}, ledger {ledger}")
+                if not options["dry_run"]:
+                    Product.objects.filter(id=product_id).update(on_hand=ledger)
+                fixed += 1
+        verb = "would be" if options["dry_run"] else "were"
+        self.stdout.write(self.style.SUCCESS(f"{fixed} product(s) {verb} reconciled"))
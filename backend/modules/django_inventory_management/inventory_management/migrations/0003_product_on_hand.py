@@ -0,0 +1,34 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:35
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def fill_on_hand(apps, schema_editor):
+    Product = apps.get_model('inventory_management', 'Product')
+    signed_quantity = Case(
+        When(product_stock__type=1, then=F('product_stock__quantity')),
+        When(product_stock__type=2, then=-F('product_stock__quantity')),
+        default=Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    ledger = Coalesce(Sum(signed_quantity), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2))
+    for product_id, on_hand in Product.objects.annotate(ledger=ledger).values_list('id', 'ledger'):
+        Product.objects.filter(id=product_id).update(on_hand=on_hand)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_management', '0002_auto_20240215_1753'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='on_hand',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.RunPython(fill_on_hand, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.23 on 2026-10-18 15:50
+
+from django.db import migrations
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def fill_created_at(apps, schema_editor):
+    # the cursor pages order by created_at, rows from before the column was added have none
+    now = timezone.now()
+    for model in apps.get_app_config('inventory_management').get_models():
+        field_names = {field.name for field in model._meta.get_fields()}
+        if 'created_at' in field_names:
+            model.objects.filter(created_at__isnull=True).update(
+                created_at=Coalesce('updated_at', 'last_updated_at', Value(now)) if 'updated_at' in field_names else now,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory_management', '0004_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_created_at, migrations.RunPython.noop),
+    ]
@@ -2,8 +2,11 @@ from datetime import date
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from phonenumber_field.modelfields import PhoneNumberField
 
 User = get_user_model()
@@ -36,6 +39,9 @@ class Supplier(Base):
 
     class Meta:
         verbose_name = "1 - Supplier"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='inv_supplier_created_idx'),
+        ]
 
 
 class Category(Base):
@@ -52,6 +58,9 @@ class Category(Base):
 
     class Meta:
         verbose_name = "2 - Category"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='inv_category_created_idx'),
+        ]
 
 
 class Product(Base):
@@ -68,20 +77,45 @@ class Product(Base):
     comments = models.TextField(null=True, blank=True)
     feedback = models.TextField(null=True, blank=True)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="product_supplier", null=True, blank=True)
+    # Stock-in minus stock-out, maintained by Stock.save and the Stock post_delete handler
+    on_hand = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, db_index=True)
 
     def __str__(self):
         return self.code + ' - ' + self.name
 
     class Meta:
         verbose_name = "3 - Product"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='inv_product_created_idx'),
+        ]
 
     @property
     def available_stock(self):
-        stock_in = self.product_stock.filter(type=1).aggregate(total_stock_in=Sum('quantity'))['total_stock_in'] or 0
-        stock_out = self.product_stock.filter(type=2).aggregate(total_stock_out=Sum('quantity'))[
-                        'total_stock_out'] or 0
-        available = stock_in - stock_out
-        return available
+        return self.on_hand
+
+    @staticmethod
+    def ledger_expression():
+        """
+        Stock-in minus stock-out summed over the product's Stock rows, for use in annotate().
+        """
+        signed_quantity = Case(
+            When(product_stock__type=1, then=F('product_stock__quantity')),
+            When(product_stock__type=2, then=-F('product_stock__quantity')),
+            default=Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        return Coalesce(Sum(signed_quantity), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+    def ledger_stock(self):
+        """
+        Computes the available stock from the Stock ledger instead of on_hand.
+        """
+        return Product.objects.filter(pk=self.pk).annotate(ledger=Product.ledger_expression()).values_list('ledger', flat=True).get()
+
+    @staticmethod
+    def adjust_on_hand(product_id, delta):
+        if product_id and delta:
+            Product.objects.filter(pk=product_id).update(on_hand=F('on_hand') + delta)
 
 
 class Stock(Base):
@@ -98,6 +132,33 @@ class Stock(Base):
 
     class Meta:
         verbose_name = "4 - Stock"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='inv_stock_created_idx'),
+        ]
+
+    @staticmethod
+    def signed_quantity(quantity, type):
+        quantity = Decimal(str(quantity or 0))
+        return -quantity if int(type) == 2 else quantity
+
+    def save(self, *args, **kwargs):
+        """
+        This save method override keeps the product on_hand in step with the stock row,
+        in the same transaction. An update first reverts the previous row.
+        """
+        with transaction.atomic():
+            if self.pk:
+                previous = Stock.objects.select_for_update().filter(pk=self.pk).values('product_id', 'quantity', 'type').first()
+                if previous:
+                    Product.adjust_on_hand(previous['product_id'], -Stock.signed_quantity(previous['quantity'], previous['type']))
+            super(Stock, self).save(*args, **kwargs)
+            Product.adjust_on_hand(self.product_id, Stock.signed_quantity(self.quantity, self.type))
+
+
+@receiver(post_delete, sender=Stock)
+def remove_stock_from_on_hand(sender, instance, **kwargs):
+    # Sent inside the delete transaction, also for queryset and cascade deletes
+    Product.adjust_on_hand(instance.product_id, -Stock.signed_quantity(instance.quantity, instance.type))
 
 
 class Invoice(Base):
@@ -119,6 +180,9 @@ class Invoice(Base):
 
     class Meta:
         verbose_name = "5 - Invoice"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='inv_invoice_created_idx'),
+        ]
 
     def quantity_count(self):
         return InvoiceItem.objects.filter(invoice=self).aggregate(Sum('quantity'))['quantity__sum']
@@ -148,3 +212,6 @@ class InvoiceItem(Base):
 
     class Meta:
         verbose_name = "6 - Invoice Item"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='inv_invoiceitem_created_idx'),
+        ]
@@ -22,6 +22,7 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+        read_only_fields = ['on_hand']
 
 
 class StockSerializer(serializers.ModelSerializer):
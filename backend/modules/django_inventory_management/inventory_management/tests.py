@@ -1,3 +1,7 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.authtoken.models import Token
@@ -425,3 +429,47 @@ class StrModelReturnTestCase(APITestCase):
         str_representation = str(self.invoice_item)
         expected_str_representation = str(self.product.name)
         self.assertEqual(str_representation, expected_str_representation)
+
+
+class ProductOnHandTestCase(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name="gloves", code="g-1", price=2)
+        self.stock_in = Stock.objects.create(product=self.product, quantity="35", type=1)
+        self.stock_out = Stock.objects.create(product=self.product, quantity="20", type="2")
+
+    def on_hand(self):
+        return Product.objects.get(id=self.product.id).on_hand
+
+    def test_stock_movements_update_on_hand(self):
+        self.assertEqual(self.on_hand(), 15)
+        self.stock_out.quantity = 5
+        self.stock_out.save()
+        self.assertEqual(self.on_hand(), 30)
+        self.stock_in.type = 2
+        self.stock_in.save()
+        self.assertEqual(self.on_hand(), -40)
+        Stock.objects.filter(id=self.stock_in.id).delete()
+        self.assertEqual(self.on_hand(), -5)
+        self.stock_out.delete()
+        self.assertEqual(self.on_hand(), 0)
+
+    def test_moving_stock_between_products(self):
+        other = Product.objects.create(name="masks", code="m-1", price=1)
+        self.stock_in.product = other
+        self.stock_in.save()
+        self.assertEqual(self.on_hand(), -20)
+        self.assertEqual(Product.objects.get(id=other.id).on_hand, 35)
+
+    def test_listing_does_not_aggregate_per_product(self):
+        products = list(Product.objects.all())
+        with self.assertNumQueries(0):
+            self.assertEqual([product.available_stock for product in products], [15])
+
+    def test_reconcile_rebuilds_from_ledger(self):
+        Product.objects.filter(id=self.product.id).update(on_hand=99)
+        out = StringIO()
+        call_command("reconcile_stock", "--dry-run", stdout=out)
+        self.assertEqual(self.on_hand(), 99)
+        call_command("reconcile_stock", stdout=out)
+        self.assertEqual(self.on_hand(), 15)
+        self.assertIn("1 product(s) were reconciled", out.getvalue())
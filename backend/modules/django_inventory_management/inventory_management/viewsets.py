@@ -1,6 +1,7 @@
 from rest_framework import viewsets
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
 from rest_framework.permissions import IsAdminUser
+from home.http_cache import conditional_get
 from modules.django_inventory_management.inventory_management.models import Supplier, Category, Product, Stock, Invoice, InvoiceItem
 
 from modules.django_inventory_management.inventory_management.serializers import SupplierSerializer, CategorySerializer, ProductSerializer, StockSerializer, InvoiceSerializer, InvoiceItemSerializer
@@ -19,6 +20,14 @@ class SupplierViewSet(viewsets.ModelViewSet):
     serializer_class = SupplierSerializer
     queryset = Supplier.objects.all()
 
+    @conditional_get('inventory-suppliers')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get('inventory-suppliers')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class CategoryViewSet(viewsets.ModelViewSet):
     """
@@ -33,6 +42,14 @@ class CategoryViewSet(viewsets.ModelViewSet):
     authentication_classes = [TokenAuthentication, SessionAuthentication]
     queryset = Category.objects.all()
 
+    @conditional_get('inventory-categories')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get('inventory-categories')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class ProductViewSet(viewsets.ModelViewSet):
     """
@@ -45,7 +62,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [IsAdminUser]
     authentication_classes = [TokenAuthentication, SessionAuthentication]
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category')
 
 
 class StockViewSet(viewsets.ModelViewSet):
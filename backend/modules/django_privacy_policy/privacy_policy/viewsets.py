@@ -2,6 +2,7 @@ from rest_framework import authentication, permissions
 from .models import PrivacyPolicy
 from .serializers import PrivacyPolicySerializer
 from rest_framework import viewsets
+from home.http_cache import conditional_get
 
 
 class PrivacyPolicyViewSet(viewsets.ModelViewSet):
@@ -18,3 +19,10 @@ class PrivacyPolicyViewSet(viewsets.ModelViewSet):
     # This is sliced because of the issues previously encountered with
     # querysets while using .first()
     queryset = PrivacyPolicy.objects.filter(is_active=True).order_by("-updated_at")[0:1]
+
+    # a single document, and the keyset paginator cannot reorder the slice
+    pagination_class = None
+
+    @conditional_get('privacy-policy')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
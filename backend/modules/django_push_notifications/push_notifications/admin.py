@@ -1,4 +1,12 @@
 from django.contrib import admin
-from .models import OneSignalApp
+from .models import OneSignalApp, OneSignalSubscription
 
 admin.site.register(OneSignalApp)
+
+
+class OneSignalSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('external_id', 'subscription_ids', 'registered', 'fetched_at',)
+    search_fields = ('external_id',)
+
+
+admin.site.register(OneSignalSubscription, OneSignalSubscriptionAdmin)
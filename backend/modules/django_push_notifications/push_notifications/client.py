@@ -1,6 +1,6 @@
 from typing import Dict
-import requests
 from requests import Response
+from integrations.http import get_client
 from os.path import join
 
 from .constants import (
@@ -35,6 +35,7 @@ class Client:
         self.rest_api_key = rest_api_key
         self.user_auth_key = user_auth_key
         self.api_root = api_root
+        self.http = get_client("onesignal")
 
     def _path(self, path: str, **kwargs) -> str:
         return join(self.api_root, path.format(**kwargs))
@@ -50,7 +51,7 @@ class Client:
         path = self._path(NOTIFICATIONS_PATH)
         payload = {"app_id": self.app_id, **body}
         print(path, header, payload)
-        return requests.post(path, headers=header, data=payload)
+        return self.http.post(path, headers=header, data=payload)
 
     def send_notification(self, external_id, message):
         headers = {
@@ -64,7 +65,7 @@ class Client:
             "contents": {"en": message}
         }
 
-        response = requests.post("https://onesignal.com/api/v1/notifications", headers=headers, json=payload)
+        response = self.http.post("https://onesignal.com/api/v1/notifications", headers=headers, json=payload)
         return response.json()
 
     def cancel_notification(self, id: int) -> Response:
@@ -77,7 +78,7 @@ class Client:
         header = get_header(self.rest_api_key)
         path = self._path(NOTIFICATION_PATH, id=id)
         payload = {"app_id": self.app_id}
-        return requests.delete(path, headers=header, params=payload)
+        return self.http.delete(path, headers=header, params=payload)
     
     def create_device(self, data):
         headers = {
@@ -86,7 +87,7 @@ class Client:
         }
         path = DEVICES_PATH
         payload = {"app_id": self.app_id, **data}
-        return requests.post(path, headers=headers, json=payload)
+        return self.http.post(path, headers=headers, json=payload)
 
     def view_apps(self) -> Response:
         """
@@ -96,7 +97,7 @@ class Client:
         """
         header = get_header(self.user_auth_key)
         path = self._path(APPS_PATH)
-        return requests.get(path, headers=header)
+        return self.http.get(path, headers=header)
 
     def view_app(self, app_id: int) -> Response:
         """
@@ -107,7 +108,7 @@ class Client:
         """
         header = get_header(self.user_auth_key)
         path = self._path(APP_PATH, app_id=app_id)
-        return requests.get(path, headers=header)
+        return self.http.get(path, headers=header)
 
     def create_app(self, body: Dict) -> Response:
         """
@@ -119,7 +120,7 @@ class Client:
         header = get_header(self.user_auth_key)
         path = self._path(APPS_PATH)
         payload = body
-        return requests.post(path, headers=header, data=payload)
+        return self.http.post(path, headers=header, data=payload)
 
     def update_app(self, app_id: int, body: Dict) -> Response:
         """
@@ -132,7 +133,7 @@ class Client:
         header = get_header(self.user_auth_key)
         path = self._path(APP_PATH, app_id=app_id)
         payload = body
-        return requests.post(path, headers=header, data=payload)
+        return self.http.post(path, headers=header, data=payload)
 
     def view_devices(self, limit: int, offset: int) -> Response:
         """
@@ -145,7 +146,7 @@ class Client:
         header = get_header(self.rest_api_key)
         path = self._path(DEVICES_PATH)
         payload = {"app_id": self.app_id, "limit": limit, "offset": offset}
-        return requests.get(path, headers=header, params=payload)
+        return self.http.get(path, headers=header, params=payload)
 
     def view_device(self, id: int) -> Response:
         """
@@ -156,7 +157,7 @@ class Client:
         """
         path = self._path(DEVICE_PATH, id=id)
         payload = {"app_id": self.app_id}
-        return requests.get(path, headers=get_header(), params=payload)
+        return self.http.get(path, headers=get_header(), params=payload)
 
     def add_device(self, body: Dict) -> Response:
         """
@@ -172,7 +173,7 @@ class Client:
         path = self._path(DEVICES_PATH)
         payload = body
         payload["app_id"] = self.app_id
-        return requests.post(path, headers=get_header(), data=payload)
+        return self.http.post(path, headers=get_header(), data=payload)
 
     def edit_device(self, id: int, body: Dict) -> Response:
         """
@@ -185,7 +186,7 @@ class Client:
         path = self._path(DEVICE_PATH, id=id)
         payload = body
         payload["app_id"] = self.app_id
-        return requests.put(path, headers=get_header(), data=payload)
+        return self.http.put(path, headers=get_header(), data=payload)
 
     def edit_tags(self, user_id: int, body: Dict) -> Response:
         """
@@ -198,7 +199,7 @@ class Client:
         :return: Response
         """
         path = self._path(EDIT_TAGS_PATH, app_id=self.app_id, user_id=user_id)
-        return requests.put(path, headers=get_header(), data=body)
+        return self.http.put(path, headers=get_header(), data=body)
 
     def new_session(self, id: int, body: Dict) -> Response:
         """
@@ -208,7 +209,7 @@ class Client:
         :param body: Body parameters
         """
         path = self._path(NEW_SESSION_PATH, id=id)
-        return requests.post(path, headers=get_header(), data=body)
+        return self.http.post(path, headers=get_header(), data=body)
 
     def new_purchase(self, id: int, body: Dict) -> Response:
         """
@@ -218,7 +219,7 @@ class Client:
         :param body: Body parameters
         """
         path = self._path(NEW_PURCHASE_PATH, id=id)
-        return requests.post(path, headers=get_header(), data=body)
+        return self.http.post(path, headers=get_header(), data=body)
 
     def csv_export(self, body: Dict) -> Response:
         """
@@ -229,7 +230,7 @@ class Client:
         header = get_header(self.rest_api_key)
         path = self._path(CSV_EXPORT_PATH)
         params = {"app_id": self.app_id}
-        return requests.post(path, headers=header, params=params, data=body)
+        return self.http.post(path, headers=header, params=params, data=body)
 
     def view_notification(self, id: int) -> Response:
         """
@@ -240,7 +241,7 @@ class Client:
         header = get_header(self.rest_api_key)
         path = self._path(NOTIFICATION_PATH, id=id)
         params = {"app_id": self.app_id}
-        return requests.get(path, headers=header, params=params)
+        return self.http.get(path, headers=header, params=params)
 
     def view_notifications(
         self, limit: int = 50, offset: int = 0, kind: int = None
@@ -264,7 +265,7 @@ class Client:
         params = {"app_id": self.app_id, "limit": limit, "offset": offset}
         if kind:
             params["kind"] = kind
-        return requests.get(path, headers=header, params=params)
+        return self.http.get(path, headers=header, params=params)
 
     def view_notification_history(self, notification_id: int, body: Dict) -> Response:
         """
@@ -279,7 +280,7 @@ class Client:
         path = self._path(NOTIFICATION_HISTORY_PATH, id=notification_id)
         payload = body
         payload["app_id"] = self.app_id
-        return requests.post(path, headers=header, data=payload)
+        return self.http.post(path, headers=header, data=payload)
 
     def create_segments(self, body: Dict) -> Response:
         """
@@ -290,7 +291,7 @@ class Client:
         """
         header = get_header(self.rest_api_key)
         path = self._path(SEGMENTS_PATH, app_id=self.app_id)
-        return requests.post(path, headers=header, data=body)
+        return self.http.post(path, headers=header, data=body)
 
     def delete_segments(self, segment_id: int) -> Response:
         """
@@ -301,7 +302,7 @@ class Client:
         """
         header = get_header(self.rest_api_key)
         path = self._path(SEGMENT_PATH, app_id=self.app_id, segment_id=segment_id)
-        return requests.delete(path, headers=header)
+        return self.http.delete(path, headers=header)
 
     def view_outcomes(
         self,
@@ -356,4 +357,4 @@ class Client:
         if outcome_attribution:
             params["outcome_attribution"] = outcome_attribution
         path = self._path(VIEW_OUTCOMES_PATH, app_id=self.app_id)
-        return requests.get(path, headers=header, params=params)
+        return self.http.get(path, headers=header, params=params)
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('push_notifications', '0003_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OneSignalSubscription',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_id', models.CharField(max_length=255, unique=True)),
+                ('subscription_ids', models.JSONField(blank=True, default=list)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+    ]
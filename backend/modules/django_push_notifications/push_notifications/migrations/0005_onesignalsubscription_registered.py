@@ -0,0 +1,18 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('push_notifications', '0004_onesignalsubscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onesignalsubscription',
+            name='registered',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -28,3 +28,20 @@ class Notification(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.message}"
+
+class OneSignalSubscription(models.Model):
+    """
+    Local cache of the OneSignal subscription ids of one external user id.
+
+    Rows are refreshed once they are older than the resolver TTL. An empty
+    list records that OneSignal has no subscriptions for the user.
+    `registered` is set once the user and its device subscriptions exist in
+    OneSignal, so logins skip the registration sync.
+    """
+    external_id = models.CharField(max_length=255, unique=True)
+    subscription_ids = models.JSONField(default=list, blank=True)
+    fetched_at = models.DateTimeField()
+    registered = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.external_id} - {len(self.subscription_ids)} subscription(s)"
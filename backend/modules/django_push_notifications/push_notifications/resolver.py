@@ -0,0 +1,124 @@
+"""
+Resolves OneSignal external user ids to subscription ids.
+
+Lookups are served from the OneSignalSubscription table while they are
+fresh. Misses are fetched from OneSignal concurrently over the pooled
+integration client and written back in bulk. A failed lookup raises, so
+the send waiting for it fails and its job is retried.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.utils import timezone
+
+from integrations.http import get_client
+from .models import OneSignalSubscription
+
+logger = logging.getLogger(__name__)
+
+APP_ID = os.environ.get('ONESIGNAL_APP_ID')
+REST_API_KEY = os.environ.get('ONESIGNAL_REST_API_KEY')
+
+SUBSCRIPTION_TTL = timedelta(hours=6)
+MAX_CONCURRENT_LOOKUPS = 8
+
+
+def headers():
+    return {
+        "accept": "application/json",
+        "content-type": "application/json",
+        "Authorization": f"Basic {REST_API_KEY}"
+    }
+
+
+def fetch_subscription_ids(external_id):
+    """
+    Fetches the subscription ids of one user from OneSignal.
+
+    Returns:
+        list: The subscription ids, empty if OneSignal does not know the user.
+
+    Raises:
+        requests.RequestException: If OneSignal cannot be reached or answers with an error.
+    """
+    url = f"https://api.onesignal.com/apps/{APP_ID}/users/by/external_id/{external_id}"
+    response = get_client('onesignal').get(url, headers=headers(), endpoint="apps/{app_id}/users/by/external_id/{id}")
+    if response.status_code == 404:
+        return []
+    response.raise_for_status()
+    return [item["id"] for item in response.json().get('subscriptions') or []]
+
+
+def remember_subscriptions(resolved):
+    """
+    Stores freshly fetched subscription ids, a dict of external_id to list.
+    """
+    if not resolved:
+        return
+    now = timezone.now()
+    existing = OneSignalSubscription.objects.in_bulk(list(resolved), field_name='external_id')
+    updated = []
+    for external_id, subscription_ids in resolved.items():
+        row = existing.get(external_id)
+        if row:
+            row.subscription_ids = subscription_ids
+            row.fetched_at = now
+            updated.append(row)
+    OneSignalSubscription.objects.bulk_update(updated, ['subscription_ids', 'fetched_at'])
+    OneSignalSubscription.objects.bulk_create(
+        [
+            OneSignalSubscription(external_id=external_id, subscription_ids=subscription_ids, fetched_at=now)
+            for external_id, subscription_ids in resolved.items() if external_id not in existing
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def add_subscription(external_id, subscription_id):
+    """
+    Appends a subscription created by this backend to the cached row.
+    """
+    row = OneSignalSubscription.objects.filter(external_id=str(external_id)).first()
+    if row is None:
+        remember_subscriptions({str(external_id): [subscription_id]})
+    elif subscription_id not in row.subscription_ids:
+        row.subscription_ids.append(subscription_id)
+        row.save(update_fields=['subscription_ids'])
+
+
+def resolve_subscription_ids(external_ids):
+    """
+    Returns a dict mapping each external id to its subscription ids.
+
+    The lookups that succeeded are stored even when others failed, so a
+    retried send only repeats the failed ones.
+
+    Raises:
+        requests.RequestException: The error of the first failed lookup.
+    """
+    external_ids = list(dict.fromkeys(str(external_id) for external_id in external_ids))
+    cutoff = timezone.now() - SUBSCRIPTION_TTL
+    resolved = dict(
+        OneSignalSubscription.objects.filter(external_id__in=external_ids, fetched_at__gte=cutoff)
+        .values_list('external_id', 'subscription_ids')
+    )
+    misses = [external_id for external_id in external_ids if external_id not in resolved]
+    if misses:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_LOOKUPS, len(misses))) as pool:
+            lookups = {external_id: pool.submit(fetch_subscription_ids, external_id) for external_id in misses}
+        fetched, errors = {}, []
+        for external_id, lookup in lookups.items():
+            try:
+                fetched[external_id] = lookup.result()
+            except requests.RequestException as e:
+                logger.warning("OneSignal lookup for %s failed: %s", external_id, e)
+                errors.append(e)
+        remember_subscriptions(fetched)
+        if errors:
+            # a send that skipped these users would report success
+            raise errors[0]
+        resolved.update(fetched)
+    return resolved
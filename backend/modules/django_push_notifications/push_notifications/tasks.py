@@ -0,0 +1,79 @@
+from django.utils import timezone
+
+from integrations.http import get_client
+from jobs.queue import enqueue
+from .models import OneSignalSubscription
+from .resolver import APP_ID, headers, add_subscription, remember_subscriptions
+
+SUBSCRIPTION_TYPES = ("AndroidPush", "iOSPush")
+
+
+def is_registered(user_id):
+    return OneSignalSubscription.objects.filter(external_id=str(user_id), registered=True).exists()
+
+
+def enqueue_registration(user):
+    """
+    Queues the OneSignal registration of a user that is not registered yet.
+
+    Concurrent logins share one job through its idempotency key.
+    """
+    if is_registered(user.id):
+        return None
+    return enqueue(register_onesignal_user, {'user_id': user.id}, key=f"onesignal:register:{user.id}", user=user)
+
+
+def register_onesignal_user(user_id):
+    """
+    Registers the user with OneSignal and subscribes it to Android and iOS push.
+
+    Safe to run more than once: an existing OneSignal user is not created
+    again, only the subscription types it is missing are added, so a run
+    that failed between the two is completed by the retry. The local flag
+    short-circuits later runs.
+    """
+    external_id = str(user_id)
+    if is_registered(external_id):
+        return {'registered': True, 'created': False}
+
+    onesignal = get_client('onesignal')
+    url = f"https://api.onesignal.com/apps/{APP_ID}/users/by/external_id/{external_id}"
+    response = onesignal.get(url, headers=headers(), endpoint="apps/{app_id}/users/by/external_id/{id}")
+    if response.status_code not in (200, 404):
+        response.raise_for_status()
+    data = response.json() if response.status_code == 200 else {}
+    subscriptions = data.get('subscriptions') or []
+
+    created = False
+    if not data.get('id'):
+        # Register the user with OneSignal
+        user_payload = {
+            "identity": {"external_id": external_id}
+        }
+        user_response = onesignal.post(f"https://api.onesignal.com/apps/{APP_ID}/users", json=user_payload, headers=headers(), endpoint="apps/{app_id}/users")
+        if user_response.status_code != 409:
+            user_response.raise_for_status()
+        created = True
+    remember_subscriptions({external_id: [item["id"] for item in subscriptions]})
+
+    # Subscribe the user to the Android and iOS push it is not subscribed to yet
+    existing_types = {item.get('type') for item in subscriptions}
+    for subscription_type in SUBSCRIPTION_TYPES:
+        if subscription_type in existing_types:
+            continue
+        sub_payload = {
+            "subscription": {
+                "type": subscription_type,
+                "enabled": True,
+                "token": external_id  # Using user's ID as token
+            }
+        }
+        sub_url = f"https://api.onesignal.com/apps/{APP_ID}/users/by/external_id/{external_id}/subscriptions"
+        sub_response = onesignal.post(sub_url, json=sub_payload, headers=headers(), endpoint="apps/{app_id}/users/by/external_id/{id}/subscriptions")
+        sub_response.raise_for_status()
+        subscription_id = sub_response.json().get('subscription', {}).get('id')
+        if subscription_id:
+            add_subscription(external_id, subscription_id)
+
+    OneSignalSubscription.objects.filter(external_id=external_id).update(registered=True, fetched_at=timezone.now())
+    return {'registered': True, 'created': created}
@@ -5,8 +5,8 @@ from .serializers import NotificationSerializer
 #from .serializers import OneSignalAppSerializer, NotificationSerializer
 from .client import Client
 from rest_framework.response import Response
-import requests
 import json
+from integrations.http import get_client
 
 # class OneSignalAppViewSet(viewsets.ModelViewSet):
 #     queryset = OneSignalApp.objects.all()
@@ -33,7 +33,7 @@ class NotificationViewSet(viewsets.ViewSet):
                 "contents": serializer.validated_data['contents']
             }
             headers = {"Content-Type": request.headers['Content-Type'], "Authorization": request.headers['Authorization'], "Accept": request.headers['Accept']}
-            response = requests.post("https://onesignal.com/api/v1/notifications/", headers=headers, data=json.dumps(request.data))
+            response = get_client('onesignal').post("https://onesignal.com/api/v1/notifications/", headers=headers, data=json.dumps(request.data))
             return Response({"message": "Notification created", "response": response.json()})
         except Exception as e:
             return Response({"message": "Error creating notification", "error": str(e)})
@@ -44,7 +44,7 @@ class NotificationViewSet(viewsets.ViewSet):
         headers = {
             "Authorization": request.headers['Authorization']
         }
-        response = requests.get(url, headers=headers)
+        response = get_client('onesignal').get(url, headers=headers)
         if response.status_code == 200:
             return Response(response.json())
         else:
@@ -56,7 +56,7 @@ class NotificationViewSet(viewsets.ViewSet):
         headers = {
             "Authorization": request.headers['Authorization']
         }
-        response = requests.get(url, headers=headers)
+        response = get_client('onesignal').get(url, headers=headers)
         if response.status_code == 200:
             return Response(response.json())
         else:
@@ -68,7 +68,7 @@ class NotificationViewSet(viewsets.ViewSet):
         headers = {
             "Authorization": request.headers['Authorization']
         }
-        response = requests.delete(url, headers=headers)
+        response = get_client('onesignal').delete(url, headers=headers)
         if response.status_code == 200:
             return Response({'message': 'Notification cancelled'})
         else:
@@ -3,6 +3,7 @@ from rest_framework.permissions import BasePermission, SAFE_METHODS, IsAdminUser
 from .models import TermAndCondition
 from .serializers import TermAndConditionSerializer
 from rest_framework import viewsets
+from home.http_cache import conditional_get
 
 
 class ReadOnly(BasePermission):
@@ -28,3 +29,10 @@ class TermAndConditionViewSet(viewsets.ModelViewSet):
     queryset = TermAndCondition.objects.filter(is_active=True).order_by("-updated_at")[
         0:1
     ]
+
+    # a single document, and the keyset paginator cannot reorder the slice
+    pagination_class = None
+
+    @conditional_get('terms-and-conditions')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
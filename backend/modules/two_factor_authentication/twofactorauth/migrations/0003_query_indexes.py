@@ -0,0 +1,17 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twofactorauth', '0002_auto_20240221_1937'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='verify',
+            index=models.Index(fields=['email', 'code'], name='verify_email_code_idx'),
+        ),
+    ]
@@ -15,4 +15,9 @@ class TwoFactorAuth(models.Model):
 class Verify(models.Model):
     auth = models.ForeignKey(TwoFactorAuth, on_delete=models.CASCADE, null=True, blank=True)
     email = models.EmailField(null=True, blank=True)    
-    code = models.IntegerField(null=True, blank=True)
\ No newline at end of file
+    code = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['email', 'code'], name='verify_email_code_idx'),
+        ]
@@ -0,0 +1,266 @@
+"""
+Dose schedules of medications and their reminders.
+
+A medication says when it is taken in free text, `time` like "morning,
+evening", "08:00, 20:00", "twice daily" or "every 6 hours", and until when,
+`to` or a `duration` like "7 days". `expand_doses` reads them into the
+datetimes of the doses.
+
+The doses are stored as MedicationDose rows up to
+settings.MEDICATION_DOSE_HORIZON_HOURS ahead. `generate_doses` extends the
+window of a medication from its `doses_until` mark once less than half of
+the window is left, so a run only touches the medications running low and
+only inserts the doses that are new to the window. The
+schedule_dose_reminders command runs it every few minutes. The upcoming
+doses of a medication that changes are rebuilt by the receiver in
+home.signals, and prescriptions written through patient.prescribing expand
+theirs in the same transaction.
+
+Reminders go out per time bucket of settings.DOSE_REMINDER_BUCKET_MINUTES.
+One job per bucket, keyed by its start, sends one push to every patient
+with a dose due in the bucket, instead of one call per dose. The doses are
+marked as reminded once their batch of the push went out, so a failed
+push is retried with the job for the patients not reached yet and a
+repeated job sends nothing. Doses added to a bucket after its job ran have
+the job queued again by the next scheduler run.
+"""
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from home.api.v1.utils import send_push
+from hospital_operations.pharmacy.models import Medication, MedicationDose
+from jobs.models import Job
+from jobs.queue import enqueue
+
+# Times of day of the named times, and of N doses a day
+NAMED_TIMES = {
+    'morning': time(8, 0),
+    'noon': time(12, 0),
+    'afternoon': time(14, 0),
+    'evening': time(19, 0),
+    'night': time(22, 0),
+    'bedtime': time(22, 0),
+}
+DAILY_TIMES = {
+    1: [time(8, 0)],
+    2: [time(8, 0), time(20, 0)],
+    3: [time(8, 0), time(14, 0), time(20, 0)],
+    4: [time(8, 0), time(12, 0), time(16, 0), time(20, 0)],
+}
+FREQUENCY_WORDS = {'once': 1, 'twice': 2, 'thrice': 3}
+DURATION_DAYS = {'day': 1, 'week': 7, 'month': 30}
+GENERATE_BATCH_SIZE = 1000
+DOSES_DUE_HOURS = 24
+REMINDER_LOOKAHEAD = timedelta(hours=1)
+
+
+def every_hours(step):
+    return sorted(time((8 + hour) % 24, 0) for hour in range(0, 24, step))
+
+
+def dose_times(text):
+    """
+    Reads the times of day of the doses from the `time` of a medication.
+
+    Returns:
+        list: The times of day in order, empty when the text names none.
+    """
+    text = (text or '').lower()
+    every = re.search(r'every\s+(\d+)\s*h', text)
+    if every and 0 < int(every.group(1)) <= 24:
+        return every_hours(int(every.group(1)))
+    times = {at for name, at in NAMED_TIMES.items() if re.search(rf'\b{name}\b', text)}
+    for hour, minute, meridiem in re.findall(r'\b(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\b', text):
+        if not (minute or meridiem):
+            continue
+        hour, minute = int(hour), int(minute or 0)
+        if meridiem:
+            hour = hour % 12 + (12 if meridiem == 'pm' else 0)
+        if hour < 24 and minute < 60:
+            times.add(time(hour, minute))
+    if times:
+        return sorted(times)
+
+    count = re.search(r'(\d+)\s*(?:x|times)\b', text)
+    word = re.search(r'\b(%s)\b' % '|'.join(FREQUENCY_WORDS), text)
+    if count or word:
+        count = int(count.group(1)) if count else FREQUENCY_WORDS[word.group(1)]
+        if 0 < count <= 24:
+            return DAILY_TIMES.get(count) or every_hours(24 // count)
+    return []
+
+
+def medication_end(medication):
+    """
+    Returns when a medication ends, from `to` or `duration`, None when it runs until it is removed.
+    """
+    if medication.to:
+        return medication.to
+    duration = re.search(r'(\d+)\s*(day|week|month)', (medication.duration or '').lower())
+    if duration and medication.frm:
+        return medication.frm + timedelta(days=int(duration.group(1)) * DURATION_DAYS[duration.group(2)])
+    return None
+
+
+def expand_doses(medication, start, end):
+    """
+    Returns the due times of the doses of a medication from start, included,
+    to end, excluded. A medication ends before its `to`.
+
+    A medication without a readable `time` is taken once a day at the time of its `frm`.
+    """
+    first = medication.frm or medication.created_at
+    if first is None:
+        return []
+    stop = medication_end(medication)
+    start = max(start, first)
+    times = dose_times(medication.time) or [timezone.localtime(first).time()]
+    doses = []
+    day, last_day = timezone.localtime(start).date(), timezone.localtime(end).date()
+    while day <= last_day:
+        for at in times:
+            due = timezone.make_aware(datetime.combine(day, at))
+            if start <= due < end and (stop is None or due < stop):
+                doses.append(due)
+        day += timedelta(days=1)
+    return doses
+
+
+def generate_doses(medications=None, now=None):
+    """
+    Extends the doses of the medications, every medication by default, to
+    the horizon. Only the medications with less than half of the horizon
+    left are extended.
+
+    Returns:
+        int: The number of doses in the extended windows.
+    """
+    now = now or timezone.now()
+    hours = settings.MEDICATION_DOSE_HORIZON_HOURS
+    horizon = now + timedelta(hours=hours)
+    medications = Medication.objects.all() if medications is None else medications
+    pending = (
+        medications.filter(prescription__user__isnull=False)
+        .filter(Q(doses_until__isnull=True) | Q(doses_until__lt=now + timedelta(hours=hours / 2)))
+        .exclude(to__lt=now)
+        .annotate(patient_id=F('prescription__user_id'))
+        .order_by('id')
+    )
+    total, last_id = 0, 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id)[:GENERATE_BATCH_SIZE])
+        if not batch:
+            break
+        doses = [
+            MedicationDose(medication_id=medication.id, user_id=medication.patient_id, due_at=due)
+            for medication in batch
+            for due in expand_doses(medication, max(medication.doses_until or now, now), horizon)
+        ]
+        # a run cut short between the two only repeats the inserts it made
+        MedicationDose.objects.bulk_create(doses, batch_size=GENERATE_BATCH_SIZE, ignore_conflicts=True)
+        Medication.objects.filter(id__in=[medication.id for medication in batch]).update(doses_until=horizon)
+        total += len(doses)
+        if len(batch) < GENERATE_BATCH_SIZE:
+            break
+        last_id = batch[-1].id
+    return total
+
+
+def rebuild_doses(medication, now=None):
+    """
+    Replaces the upcoming doses of a medication after a change, the doses
+    already reminded are kept.
+    """
+    now = now or timezone.now()
+    MedicationDose.objects.filter(medication=medication, due_at__gte=now, reminded_at__isnull=True).delete()
+    medications = Medication.objects.filter(id=medication.id)
+    medications.update(doses_until=None)
+    return generate_doses(medications, now)
+
+
+def doses_due(user_ids, hours=DOSES_DUE_HOURS, now=None):
+    """
+    Returns the doses of the users due in the next hours, by due time.
+    """
+    now = now or timezone.now()
+    return (
+        MedicationDose.objects.filter(user__in=user_ids, due_at__gte=now, due_at__lt=now + timedelta(hours=hours))
+        .select_related('medication')
+        .order_by('due_at', 'id')
+    )
+
+
+def bucket_size():
+    return timedelta(minutes=settings.DOSE_REMINDER_BUCKET_MINUTES)
+
+
+def bucket_start(moment):
+    seconds = int(moment.timestamp())
+    return datetime.fromtimestamp(seconds - seconds % int(bucket_size().total_seconds()), tz=dt_timezone.utc)
+
+
+def schedule_reminders(now=None, lookahead=REMINDER_LOOKAHEAD):
+    """
+    Queues the reminder job of every bucket with doses due within the lookahead.
+    The job of a bucket that already ran is queued again while the bucket
+    has doses without a reminder.
+
+    Returns:
+        list: The queued jobs.
+    """
+    now = now or timezone.now()
+    due = (
+        MedicationDose.objects.filter(reminded_at__isnull=True, due_at__gte=bucket_start(now), due_at__lt=now + lookahead)
+        .values_list('due_at', flat=True)
+        .distinct()
+    )
+    jobs = []
+    for bucket in sorted({bucket_start(due_at) for due_at in due}):
+        job = enqueue(send_dose_reminders, {'bucket': bucket.isoformat()}, key=f"doses:reminders:{bucket.isoformat()}", run_at=bucket)
+        if job.status == Job.Status.SUCCEEDED:
+            # doses were added to the bucket after its job ran, one scheduler run queues it again
+            Job.objects.filter(id=job.id, status=Job.Status.SUCCEEDED).update(
+                status=Job.Status.PENDING, attempts=0, run_at=timezone.now(),
+            )
+            job.refresh_from_db()
+        jobs.append(job)
+    return jobs
+
+
+def send_dose_reminders(bucket):
+    """
+    Sends one push to the patients with doses due in the bucket starting at
+    `bucket`. The doses of a bucket that ended a bucket ago or more are
+    marked without a push, a late reminder would be misleading.
+
+    The doses are marked per batch of the push once it is sent, so a job
+    retried after a failed batch only reminds the patients not reached yet.
+    """
+    start = datetime.fromisoformat(bucket)
+    end = start + bucket_size()
+    rows = list(
+        MedicationDose.objects.filter(due_at__gte=start, due_at__lt=end, reminded_at__isnull=True)
+        .values_list('id', 'user_id')
+    )
+    user_ids = sorted({user_id for _, user_id in rows})
+
+    def mark_reminded(external_ids):
+        reached = {int(external_id) for external_id in external_ids}
+        MedicationDose.objects.filter(
+            id__in=[dose_id for dose_id, user_id in rows if user_id in reached], reminded_at__isnull=True,
+        ).update(reminded_at=timezone.now())
+
+    notification_ids = []
+    if user_ids and timezone.now() < end + bucket_size():
+        notification_ids = send_push([str(user_id) for user_id in user_ids], "Medication reminder", {
+            "message": "It's time to take your medication",
+            "due_from": start.isoformat(),
+            "due_until": end.isoformat(),
+        }, on_sent=mark_reminded)
+    # the doses of patients without a subscription, or of a late bucket
+    MedicationDose.objects.filter(id__in=[dose_id for dose_id, _ in rows], reminded_at__isnull=True).update(reminded_at=timezone.now())
+    return {'bucket': bucket, 'doses': len(rows), 'users': len(user_ids), 'notification_ids': notification_ids}
@@ -0,0 +1,188 @@
+"""
+Batch ingestion of vitals readings synced from wearables and devices.
+
+A batch is a JSON array or NDJSON, one reading object per line. The batch
+is validated one column at a time with the model field cleaners instead of
+a serializer pass per reading, valid readings are inserted with bulk_create
+in chunks, and every rejected reading is reported with its row index.
+`measured_at` is the idempotency key, a reading whose timestamp is already
+stored for the user is skipped, so a failed sync can be sent again as is.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+from rest_framework.parsers import BaseParser
+
+from users.models import PatientInfo, Vitals
+
+MAX_READINGS = 5000
+CHUNK_SIZE = 500
+METRIC_FIELDS = ('heart_rate', 'blood_status', 'blood_count', 'glucose_level', 'weight', 'temperature', 'pulse')
+FIELDS = ('measured_at',) + METRIC_FIELDS
+# Physically plausible values, anything outside is a device error
+RANGES = {
+    'heart_rate': (20, 300),
+    'pulse': (20, 300),
+    'blood_count': (0, 1000000),
+    'glucose_level': (10, 1000),
+    'weight': (1, 500),
+    'temperature': (25, 45),
+}
+
+
+class InvalidLine(str):
+    """
+    The error message of an NDJSON line that is not valid JSON.
+    """
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline delimited JSON into a list, blank lines are skipped and
+    invalid lines become InvalidLine so they are reported with the other rows.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        rows = []
+        for line in stream.read().decode(encoding).splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                rows.append(InvalidLine(f"Invalid JSON: {e}"))
+        return rows
+
+
+def clean_value(field, value):
+    if isinstance(field, models.DecimalField) and isinstance(value, (int, float, str)):
+        # devices send floats, keep the precision the column stores
+        try:
+            value = Decimal(str(value)).quantize(Decimal(1).scaleb(-field.decimal_places))
+        except InvalidOperation:
+            pass
+    value = field.clean(value, None)
+    if isinstance(value, datetime) and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def validate_readings(rows):
+    """
+    Validates the readings column by column.
+
+    Returns:
+        tuple: The valid readings as (row index, cleaned values) pairs, and
+            a dict of the errors of each rejected row index, by field.
+    """
+    errors = defaultdict(dict)
+    columns = {name: [] for name in FIELDS}
+    for index, row in enumerate(rows):
+        if isinstance(row, InvalidLine):
+            errors[index]['non_field_errors'] = [str(row)]
+        elif not isinstance(row, dict):
+            errors[index]['non_field_errors'] = ["Expected an object."]
+        else:
+            unknown = sorted(set(row) - set(FIELDS))
+            if unknown:
+                errors[index]['non_field_errors'] = [f"Unknown fields: {', '.join(unknown)}."]
+            for name, column in columns.items():
+                if row.get(name) is not None:
+                    column.append((index, row[name]))
+
+    cleaned = defaultdict(dict)
+    for name, column in columns.items():
+        field = Vitals._meta.get_field(name)
+        low, high = RANGES.get(name, (None, None))
+        for index, value in column:
+            try:
+                value = clean_value(field, value)
+            except ValidationError as e:
+                errors[index][name] = e.messages
+                continue
+            if low is not None and not low <= value <= high:
+                errors[index][name] = [f"Must be between {low} and {high}."]
+                continue
+            cleaned[index][name] = value
+
+    readings = []
+    for index in range(len(rows)):
+        if index in errors:
+            continue
+        values = cleaned[index]
+        if 'measured_at' not in values:
+            errors[index]['measured_at'] = ["This field is required."]
+        elif not any(name in values for name in METRIC_FIELDS):
+            errors[index]['non_field_errors'] = ["A reading needs at least one metric."]
+        else:
+            readings.append((index, values))
+    return readings, errors
+
+
+def ingest_readings(user, rows):
+    """
+    Stores the valid readings of a batch for the user.
+
+    Returns:
+        dict: The number of readings received and created, the row indexes
+            skipped as duplicates and the errors of each rejected row.
+    """
+    readings, errors = validate_readings(rows)
+
+    # the first reading of a timestamp in the batch wins
+    unique, duplicates = {}, []
+    for index, values in readings:
+        if values['measured_at'] in unique:
+            duplicates.append(index)
+        else:
+            unique[values['measured_at']] = (index, values)
+    unique = list(unique.values())
+
+    patient = PatientInfo.objects.filter(user=user).first()
+    created = 0
+    for start in range(0, len(unique), CHUNK_SIZE):
+        chunk = unique[start:start + CHUNK_SIZE]
+        stored = set(
+            Vitals.objects.filter(user=user, measured_at__in=[values['measured_at'] for _, values in chunk])
+            .values_list('measured_at', flat=True)
+        )
+        new = []
+        # marks the rows of this chunk, bulk_create returns no ids when it ignores conflicts
+        stamp = timezone.now()
+        for index, values in chunk:
+            if values['measured_at'] in stored:
+                duplicates.append(index)
+                continue
+            new.append((index, Vitals(
+                user=user, patient=patient, date=timezone.localdate(values['measured_at']),
+                last_updated_by=user, last_updated_at=stamp, **values
+            )))
+        if not new:
+            continue
+        with transaction.atomic():
+            # a concurrent sync of the same readings wins on the unique constraint
+            Vitals.objects.bulk_create([vital for _, vital in new], ignore_conflicts=True)
+            inserted = set(
+                Vitals.objects.filter(user=user, measured_at__in=[vital.measured_at for _, vital in new], last_updated_at=stamp)
+                .values_list('measured_at', flat=True)
+            )
+        for index, vital in new:
+            if vital.measured_at in inserted:
+                created += 1
+            else:
+                duplicates.append(index)
+
+    return {
+        'received': len(rows),
+        'created': created,
+        'duplicates': sorted(duplicates),
+        'errors': [{'row': index, 'errors': errors[index]} for index in sorted(errors)],
+    }
@@ -0,0 +1,124 @@
+"""
+Prescription writes with their medications.
+
+A prescription is sent as {"prescription": {...}, "medications": [...]}.
+`create_prescription` saves the prescription and bulk-inserts its
+medications in one transaction, with their upcoming doses, so a
+prescription is never stored without its medications.
+`create_prescriptions` writes a batch of them, for doctors writing up a
+clinic session: the patients and doctors of the whole batch are loaded with
+one query each, every prescription is written in its own savepoint, and the
+invalid or failed ones are reported by row index while the others are kept.
+Every prescription of a batch names its patient, and only staff write them
+in the name of another doctor.
+"""
+import logging
+
+from django.db import DatabaseError, transaction
+
+from home.agenda import invalidate_agenda
+from patient.doses import generate_doses
+from hospital_operations.pharmacy.models import Medication
+from patient.serializers import MedicationSerializer, PrescriptionSerializer
+from users.models import Doctor, User
+
+logger = logging.getLogger(__name__)
+
+MAX_PRESCRIPTIONS = 100
+
+
+def validate_prescription(item, context=None):
+    """
+    Validates a prescription with its medications.
+
+    Returns:
+        tuple: The prescription and medication serializers, and the errors by part, empty when valid.
+    """
+    if not isinstance(item, dict):
+        return None, None, {'non_field_errors': ["Expected an object."]}
+    prescription = PrescriptionSerializer(data=item.get('prescription'), context=context or {})
+    medications = MedicationSerializer(data=item.get('medications', []), many=True)
+    errors = {}
+    if not prescription.is_valid():
+        errors['prescription'] = prescription.errors
+    if not medications.is_valid():
+        errors['medications'] = medications.errors
+    return prescription, medications, errors
+
+
+def create_prescription(prescription, medications, author, **values):
+    """
+    Saves a validated prescription and inserts its medications in one statement.
+
+    Returns:
+        Prescription: The saved prescription.
+    """
+    with transaction.atomic():
+        saved = prescription.save(last_updated_by=author, **values)
+        Medication.objects.bulk_create([
+            Medication(prescription=saved, last_updated_by=author, **medication)
+            for medication in medications.validated_data
+        ])
+        generate_doses(Medication.objects.filter(prescription=saved))
+    # bulk_create sends no post_save, the patient's agenda lists today's medications
+    transaction.on_commit(lambda: invalidate_agenda(saved.user_id))
+    return saved
+
+
+def preload(items):
+    """
+    Loads the patients and doctors the batch refers to, by primary key.
+    """
+    ids = {'user': set(), 'doctor': set()}
+    for item in items:
+        prescription = item.get('prescription') if isinstance(item, dict) else None
+        if isinstance(prescription, dict):
+            for field, values in ids.items():
+                if isinstance(prescription.get(field), int):
+                    values.add(prescription[field])
+    return {
+        User: User.objects.in_bulk(ids['user']),
+        Doctor: Doctor.objects.in_bulk(ids['doctor']),
+    }
+
+
+def batch_errors(prescription, author, doctor):
+    """
+    Returns the errors of a valid prescription the batch does not accept, empty when accepted.
+    """
+    errors = {}
+    if prescription.validated_data.get('user') is None:
+        errors['user'] = ["This field is required."]
+    chosen = prescription.validated_data.get('doctor')
+    if chosen is not None and chosen != doctor and not author.is_staff:
+        errors['doctor'] = ["Only staff can write prescriptions for another doctor."]
+    return {'prescription': errors} if errors else {}
+
+
+def create_prescriptions(items, author, doctor=None):
+    """
+    Writes a batch of prescriptions by `author`. The prescriptions without a
+    doctor are written by `doctor`, the doctor of the author.
+
+    Returns:
+        dict: The number of prescriptions received, the IDs of the created
+            ones in batch order and the errors of each rejected row.
+    """
+    context = {'preloaded': preload(items)}
+    created, errors = [], []
+    with transaction.atomic():
+        for index, item in enumerate(items):
+            prescription, medications, item_errors = validate_prescription(item, context)
+            item_errors = item_errors or batch_errors(prescription, author, doctor)
+            if item_errors:
+                errors.append({'row': index, 'errors': item_errors})
+                continue
+            values = {} if prescription.validated_data.get('doctor') else {'doctor': doctor}
+            try:
+                # its own savepoint, a failed prescription leaves no rows behind
+                created.append(create_prescription(prescription, medications, author, **values).id)
+            except DatabaseError:
+                # the database error may show table and column names, it is only logged
+                logger.exception("Prescription %s of a batch by user %s failed", index, author.pk)
+                errors.append({'row': index, 'errors': {'non_field_errors': ["The prescription could not be saved."]}})
+    return {'received': len(items), 'created': created, 'errors': errors}
@@ -1,13 +1,18 @@
 import os
-import boto3
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from urllib.parse import urlparse
-from users.models import PatientInfo
+from users.models import Doctor, PatientInfo, User
 from home.api.v1.serializers import UserSerializer
 from users.models import Vitals
-from hospital_operations.pharmacy.models import Prescription, Medication
-from hospital_operations.emr.models import MedicalRecord, TestResult
+from hospital_operations.pharmacy.models import Prescription, Medication, MedicationDose
+from hospital_operations.emr.models import MedicalRecord, TestResult, TestResultUpload
+from home.signed_urls import sign_key, signed_url
+from patient.doses import DOSES_DUE_HOURS
+from patient.series import DEFAULT_METRICS, MAX_POINTS, METRICS, TRUNCATE
+from patient.timeline import MAX_PAGE_SIZE, PAGE_SIZE, TYPES, decode_cursor
 
 import environ
  
@@ -21,6 +26,39 @@ class VitalsSerializer(serializers.ModelSerializer):
         model = Vitals
         fields = '__all__'
 
+class VitalsSeriesQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the vitals series.
+
+    Attributes:
+        user_id (int): The patient, the requesting user by default.
+        metrics (str): Comma separated metrics, see patient.series.METRICS.
+        start (date): First day of the range, 90 days before `end` by default.
+        end (date): Last day of the range, today by default.
+        bucket (str): Aggregation period, day, week or month.
+        points (int): Raw points returned per metric after downsampling.
+    """
+    user_id = serializers.IntegerField(required=False)
+    metrics = serializers.CharField(required=False, default=','.join(DEFAULT_METRICS))
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    bucket = serializers.ChoiceField(choices=list(TRUNCATE), default='day')
+    points = serializers.IntegerField(min_value=0, max_value=MAX_POINTS, default=200)
+
+    def validate_metrics(self, value):
+        metrics = [metric.strip() for metric in value.split(',') if metric.strip()]
+        unknown = [metric for metric in metrics if metric not in METRICS]
+        if unknown or not metrics:
+            raise serializers.ValidationError(f"Choose from {', '.join(METRICS)}")
+        return list(dict.fromkeys(metrics))
+
+    def validate(self, data):
+        data['end'] = data.get('end') or timezone.localdate()
+        data['start'] = data.get('start') or data['end'] - timedelta(days=90)
+        if data['start'] > data['end']:
+            raise serializers.ValidationError({'start': "start must not be after end"})
+        return data
+
 class PatientProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer()
     class Meta:
@@ -33,7 +71,42 @@ class MedicationSerializer(serializers.ModelSerializer):
         fields = ['item', 'dosage', 'quantity', 'duration', 'frm', 'to', 'time']
 
 
+class MedicationDoseSerializer(serializers.ModelSerializer):
+    item = serializers.CharField(source='medication.item', read_only=True)
+    dosage = serializers.CharField(source='medication.dosage', read_only=True)
+
+    class Meta:
+        model = MedicationDose
+        fields = ['id', 'medication', 'item', 'dosage', 'due_at', 'reminded_at']
+
+
+class DosesQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the due doses.
+
+    Attributes:
+        hours (int): The doses due in the next hours are listed, up to the dose horizon.
+    """
+    hours = serializers.IntegerField(min_value=1, max_value=settings.MEDICATION_DOSE_HORIZON_HOURS, default=DOSES_DUE_HOURS)
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    A primary key field that first looks the object up in the `preloaded`
+    context, a dict of the objects by primary key per model, so a batch
+    resolves its keys with one query per model. Other keys are looked up
+    in the database as usual.
+    """
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded', {}).get(self.get_queryset().model, {})
+        if isinstance(data, int) and not isinstance(data, bool) and data in preloaded:
+            return preloaded[data]
+        return super().to_internal_value(data)
+
+
 class PrescriptionSerializer(serializers.ModelSerializer):
+    user = PreloadedPrimaryKeyRelatedField(queryset=User.objects.all(), required=False, allow_null=True)
+    doctor = PreloadedPrimaryKeyRelatedField(queryset=Doctor.objects.all(), required=False, allow_null=True)
     medications = MedicationSerializer(many=True, read_only=True)
     doctor_name = serializers.SerializerMethodField()
 
@@ -52,34 +125,8 @@ class TestResultSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'test_results', 'test_results_signed_url', 'test_name', 'units', 'reference_ranges', 'result']
 
     
-    def get_test_results_signed_url(self, obj):        
-        medical_record_url = obj.test_results.url if obj.test_results else None
-        
-        if medical_record_url:
-            parsed_url = urlparse(medical_record_url)
-            object_key = parsed_url.path[1:]  # Remove the leading slash
-
-            # Extract patient ID from the object
-            patient_id = self.context['request'].user.id
-            now = datetime.now()
-            date_time = now.strftime("%m-%d-%Y")
-
-            # Construct the object key in the format of patient_id/datetime/records/filename
-            file_name = os.path.basename(object_key)
-            folder_path = f"{str(patient_id)}/{str(date_time)}/records/{file_name}"
-
-            # Generate a signed URL using the constructed object key
-            s3 = boto3.client('s3', region_name=env.str("AWS_STORAGE_REGION", ""),
-                            config=boto3.session.Config(signature_version='s3v4'))
-            signed_url = s3.generate_presigned_url(
-                'get_object', Params={'Bucket': 'loopafrica-44703', 'Key': object_key},
-                HttpMethod='GET'
-            )
-            obj.test_reults_signed = signed_url
-            obj.save()
-            return signed_url
-        else:
-            return None
+    def get_test_results_signed_url(self, obj):
+        return signed_url(obj.test_results)
     
 
 class MedicalRecordSerializer(serializers.ModelSerializer):
@@ -92,24 +139,10 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
         medical_record_url = obj.records.url if obj.records else None
         
         if medical_record_url:
-            parsed_url = urlparse(medical_record_url)
-            object_key = parsed_url.path[1:]  # Remove the leading slash
-
-            # Extract patient ID from the object
-            patient_id = obj.patient.id
-
             # Construct the object key in the format of patient_id/datetime/records/filename
-            file_name = os.path.basename(object_key)
-            folder_path = f"{patient_id}/{datetime.now().strftime('%Y/%m/%d')}/records/{file_name}"
-
-            # Generate a signed URL using the constructed object key
-            s3 = boto3.client('s3', region_name=env.str("AWS_STORAGE_REGION", ""),
-                            config=boto3.session.Config(signature_version='s3v4'))
-            signed_url = s3.generate_presigned_url(
-                'get_object', Params={'Bucket': 'loopafrica-44703', 'Key': folder_path},
-                HttpMethod='GET'
-            )
-            return signed_url
+            file_name = os.path.basename(urlparse(medical_record_url).path)
+            folder_path = f"{obj.patient.id}/{datetime.now().strftime('%Y/%m/%d')}/records/{file_name}"
+            return sign_key(folder_path)
         else:
             return None
 
@@ -121,34 +154,8 @@ class TestResultUploadSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'test_results', 'test_results_signed_url']
 
     
-    def get_test_results_signed_url(self, obj):        
-        medical_record_url = obj.test_results.url if obj.test_results else None
-        
-        if medical_record_url:
-            parsed_url = urlparse(medical_record_url)
-            object_key = parsed_url.path[1:]  # Remove the leading slash
-
-            # Extract patient ID from the object
-            patient_id = self.context['request'].user.id
-            now = datetime.now()
-            date_time = now.strftime("%m-%d-%Y")
-
-            # Construct the object key in the format of patient_id/datetime/records/filename
-            file_name = os.path.basename(object_key)
-            folder_path = f"{str(patient_id)}/{str(date_time)}/records/{file_name}"
-
-            # Generate a signed URL using the constructed object key
-            s3 = boto3.client('s3', region_name=env.str("AWS_STORAGE_REGION", ""),
-                            config=boto3.session.Config(signature_version='s3v4'))
-            signed_url = s3.generate_presigned_url(
-                'get_object', Params={'Bucket': 'loopafrica-44703', 'Key': object_key},
-                HttpMethod='GET'
-            )
-            obj.test_reults_signed = signed_url
-            obj.save()
-            return signed_url
-        else:
-            return None
+    def get_test_results_signed_url(self, obj):
+        return signed_url(obj.test_results)
  
     def update(self, instance, validated_data):
         test_results = validated_data.get('test_results', None)
@@ -157,3 +164,87 @@ class TestResultUploadSerializer(serializers.ModelSerializer):
             instance.test_results = test_results
             instance.save()
         return instance
+
+
+
+class MultipartUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TestResultUpload
+        fields = ['id', 'filename', 'content_type', 'size', 'part_size', 'status', 'test_result', 'created_at']
+
+
+class MultipartUploadStartSerializer(serializers.Serializer):
+    """
+    The file of a test result upload.
+
+    Attributes:
+        filename (str): The name of the file on the device.
+        content_type (str): The media type of the file.
+        size (int): The size of the file in bytes.
+    """
+    filename = serializers.CharField(max_length=200)
+    content_type = serializers.CharField(max_length=255, default='application/octet-stream')
+    size = serializers.IntegerField(min_value=1, max_value=settings.TEST_RESULT_UPLOAD_MAX_SIZE)
+
+
+class MultipartUploadCompleteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TestResult
+        fields = ['medical_record', 'test_name', 'units', 'reference_ranges', 'result']
+
+class TimelinePrescriptionSerializer(PrescriptionSerializer):
+    medications = MedicationSerializer(source='medication_set', many=True, read_only=True)
+
+    class Meta(PrescriptionSerializer.Meta):
+        fields = ['id'] + PrescriptionSerializer.Meta.fields
+
+    def get_doctor_name(self, obj):
+        return obj.doctor.user.username if obj.doctor else None
+
+
+# The serializer of each entry type of the timeline
+TIMELINE_SERIALIZERS = {
+    'medical_record': MedicalRecordSerializer,
+    'prescription': TimelinePrescriptionSerializer,
+    'test_result': TestResultSerializer,
+    'vitals': VitalsSerializer,
+}
+
+
+class TimelineQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the medical history timeline.
+
+    Attributes:
+        user_id (int): The patient, the requesting user by default.
+        types (str): Comma separated entry types, see patient.timeline.TYPES.
+        from_date (date): First day of the timeline.
+        to_date (date): Last day of the timeline.
+        cursor (str): The next cursor returned by the previous page.
+        page_size (int): The number of entries per page.
+    """
+    user_id = serializers.IntegerField(required=False)
+    types = serializers.CharField(required=False, default=','.join(TYPES))
+    from_date = serializers.DateField(required=False)
+    to_date = serializers.DateField(required=False)
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(min_value=1, max_value=MAX_PAGE_SIZE, default=PAGE_SIZE)
+
+    def validate_types(self, value):
+        types = [entry_type.strip() for entry_type in value.split(',') if entry_type.strip()]
+        unknown = [entry_type for entry_type in types if entry_type not in TYPES]
+        if unknown or not types:
+            raise serializers.ValidationError(f"Choose from {', '.join(TYPES)}")
+        return list(dict.fromkeys(types))
+
+    def validate_cursor(self, value):
+        try:
+            decode_cursor(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def validate(self, data):
+        if data.get('from_date') and data.get('to_date') and data['from_date'] > data['to_date']:
+            raise serializers.ValidationError({'from_date': "from_date must not be after to_date"})
+        return data
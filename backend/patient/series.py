@@ -0,0 +1,150 @@
+"""
+Vitals time series for the chart screens.
+
+`bucket_aggregates` computes min/max/avg/last per day, week or month in SQL,
+and `lttb` thins the readings of a metric down to a fixed number of points
+that keep the shape of the curve (Largest-Triangle-Three-Buckets,
+Steinarsson 2013). `downsampled_points` reduces the readings in SQL first,
+so lttb only sees a few times as many points as it keeps.
+"""
+from datetime import date
+
+from django.db.models import Avg, Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+METRICS = ('heart_rate', 'glucose_level', 'weight', 'temperature', 'pulse', 'blood_count')
+DEFAULT_METRICS = ('heart_rate', 'glucose_level', 'weight', 'temperature')
+MAX_POINTS = 1000
+# Buckets per requested point the readings are reduced to before lttb
+PREBUCKET_FACTOR = 4
+TRUNCATE = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def number(value):
+    return None if value is None else round(float(value), 2)
+
+
+def bucket_aggregates(queryset, metrics, bucket):
+    """
+    Returns one dict per bucket, oldest first, with the reading count and the
+    min/max/avg/last of each metric. "last" is the latest reading in the bucket.
+    """
+    truncate = TRUNCATE[bucket]
+    annotations = {'count': Count('id')}
+    for metric in metrics:
+        annotations[f'{metric}__min'] = Min(metric)
+        annotations[f'{metric}__max'] = Max(metric)
+        annotations[f'{metric}__avg'] = Avg(metric)
+        annotations[f'{metric}__last'] = Subquery(
+            queryset.filter(**{f'{metric}__isnull': False})
+            .annotate(bucket=truncate('date'))
+            .filter(bucket=OuterRef('bucket'))
+            .order_by('-date', '-created_at', '-id')
+            .values(metric)[:1]
+        )
+    rows = queryset.annotate(bucket=truncate('date')).order_by().values('bucket').annotate(**annotations).order_by('bucket')
+    return [
+        {
+            'start': row['bucket'],
+            'count': row['count'],
+            **{
+                metric: {
+                    aggregate: number(row[f'{metric}__{aggregate}'])
+                    for aggregate in ('min', 'max', 'avg', 'last')
+                }
+                for metric in metrics
+            },
+        }
+        for row in rows
+    ]
+
+
+def lttb(points, threshold):
+    """
+    Downsamples (x, y) points sorted by x to `threshold` points.
+
+    The first and last points are kept. The rest are split into equal
+    buckets and from each the point forming the largest triangle with the
+    point kept before it and the average of the next bucket is kept.
+    """
+    if threshold >= len(points):
+        return list(points)
+    if threshold < 3:
+        return [points[0], points[-1]][:threshold]
+
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    previous = 0
+    for index in range(threshold - 2):
+        start = int(index * every) + 1
+        end = int((index + 1) * every) + 1
+        next_end = min(int((index + 2) * every) + 1, len(points))
+        following = points[end:next_end] or points[-1:]
+        avg_x = sum(x for x, _ in following) / len(following)
+        avg_y = sum(y for _, y in following) / len(following)
+
+        x_a, y_a = points[previous]
+        best, best_area = start, -1.0
+        for candidate in range(start, end):
+            x, y = points[candidate]
+            area = abs((x_a - avg_x) * (y - y_a) - (x_a - x) * (avg_y - y_a))
+            if area > best_area:
+                best, best_area = candidate, area
+        sampled.append(points[best])
+        previous = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def prebucket(start, end, threshold):
+    """
+    Returns the finest of day, week and month that splits start to end into
+    at most PREBUCKET_FACTOR times `threshold` buckets.
+    """
+    days = (end - start).days + 1
+    for bucket, width in (('day', 1), ('week', 7)):
+        if days / width <= threshold * PREBUCKET_FACTOR:
+            return bucket
+    return 'month'
+
+
+def downsampled_points(queryset, metrics, threshold, start=None, end=None):
+    """
+    Returns the readings of each metric from start to end, the whole queryset
+    by default, as [date, value] pairs thinned with lttb.
+
+    The readings are first reduced in SQL to the min and max of each metric
+    per day, week or month, whichever leaves a few times `threshold` buckets,
+    so the rows sent to Python do not grow with the history. A bucket is
+    dated by its first day.
+    """
+    points = {metric: [] for metric in metrics}
+    if not threshold:
+        return points
+    if start is None or end is None:
+        bounds = queryset.aggregate(first=Min('date'), last=Max('date'))
+        if bounds['first'] is None:
+            return points
+        start, end = bounds['first'], bounds['last']
+    annotations = {}
+    for metric in metrics:
+        annotations[f'{metric}__min'] = Min(metric)
+        annotations[f'{metric}__max'] = Max(metric)
+    truncate = TRUNCATE[prebucket(start, end, threshold)]
+    rows = list(queryset.annotate(bucket=truncate('date')).order_by().values('bucket').annotate(**annotations).order_by('bucket'))
+    for metric in metrics:
+        reduced = []
+        for row in rows:
+            low, high = row[f'{metric}__min'], row[f'{metric}__max']
+            if low is None:
+                continue
+            reduced.append((row['bucket'].toordinal(), float(low)))
+            if high != low:
+                # both extremes of the bucket, lttb keeps the one that shapes the curve
+                reduced.append((row['bucket'].toordinal(), float(high)))
+        points[metric] = [[date.fromordinal(x), round(y, 2)] for x, y in lttb(reduced, threshold)]
+    return points
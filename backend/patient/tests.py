@@ -1,3 +1,677 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import boto3
+import requests
+from botocore.stub import ANY, Stubber
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from users.models import Doctor, User, Vitals
+from hospital_operations.pharmacy.models import Medication, MedicationDose, Prescription
+from modules.django_push_notifications.push_notifications.models import OneSignalSubscription
+from hospital_operations.emr.models import MedicalRecord, TestResult, TestResultUpload
+from integrations.http import get_client
+from jobs.models import Job
+from jobs.queue import run_pending
+from patient.doses import dose_times, generate_doses, schedule_reminders, send_dose_reminders
+from patient.serializers import TestResultSerializer, TestResultUploadSerializer
+from patient.series import lttb
+
+
+class TestResultSignedUrlTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        for index in range(20):
+            TestResult.objects.create(user=self.user, test_name=f"test {index}", test_results=f"MRO/medrec/{self.user.id}/result-{index % 5}.pdf")
+        self.request = APIRequestFactory().get("/")
+        self.request.user = self.user
+
+    @mock.patch("home.signed_urls.get_s3_client")
+    def test_listing_signs_each_key_once_without_writes(self, get_s3_client):
+        get_s3_client.return_value.generate_presigned_url.side_effect = lambda *args, **kwargs: "https://signed/" + kwargs['Params']['Key']
+        results = list(TestResult.objects.all())
+        for serializer_class in (TestResultSerializer, TestResultUploadSerializer):
+            with self.assertNumQueries(0):
+                data = serializer_class(results, many=True, context={'request': self.request}).data
+            self.assertTrue(data[0]['test_results_signed_url'].endswith(f"/MRO/medrec/{self.user.id}/result-0.pdf"))
+        # five distinct files, signed once each across both serializers
+        self.assertEqual(get_s3_client.return_value.generate_presigned_url.call_count, 5)
+
+
+class CursorPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass@123")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_vitals_pages_follow_cursors(self):
+        vitals = [Vitals.objects.create(user=self.user, heart_rate=60 + index) for index in range(7)]
+        url = reverse("patient_profile:vitals-list") + "?page_size=3"
+        seen = []
+        while url:
+            # token lookup and one page, however deep the page is
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 3)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, [vital.id for vital in reversed(vitals)])
+
+    def test_test_results_are_scoped_to_user(self):
+        own = TestResult.objects.create(user=self.user, test_name="own")
+        TestResult.objects.create(user=self.other, test_name="other")
+        response = self.client.get(reverse("patient_profile:test-result-upload-list"))
+        self.assertEqual([row['id'] for row in response.data['results']], [own.id])
+        self.assertIsNone(response.data['next'])
+
+
+class VitalsSeriesTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.other = User.objects.create_user(username="other", email="other@example.com", password="pass@123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        # Monday 2024-01-01 to Sunday 2024-01-14, two weeks of readings
+        for day in range(14):
+            Vitals.objects.create(user=self.user, date=date(2024, 1, 1) + timedelta(days=day), heart_rate=60 + day, weight=Decimal("80.50"))
+        Vitals.objects.create(user=self.other, date=date(2024, 1, 2), heart_rate=150)
+
+    def series(self, **params):
+        return self.client.get(reverse("patient_profile:vitals-series"), {'start': "2024-01-01", 'end': "2024-01-14", **params})
+
+    def test_weekly_aggregates(self):
+        # token lookup and one grouped query, no raw points asked for
+        with self.assertNumQueries(2):
+            response = self.series(metrics="heart_rate,weight", bucket="week", points=0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first, second = response.data['buckets']
+        self.assertEqual(first['start'], date(2024, 1, 1))
+        self.assertEqual(first['count'], 7)
+        self.assertEqual(first['heart_rate'], {'min': 60, 'max': 66, 'avg': 63, 'last': 66})
+        self.assertEqual(second['heart_rate'], {'min': 67, 'max': 73, 'avg': 70, 'last': 73})
+        self.assertEqual(second['weight']['avg'], 80.5)
+        self.assertEqual(response.data['points'], {'heart_rate': [], 'weight': []})
+
+    def test_points_are_downsampled(self):
+        response = self.series(metrics="heart_rate", bucket="month", points=5)
+        points = response.data['points']['heart_rate']
+        self.assertEqual(len(points), 5)
+        self.assertEqual(points[0], [date(2024, 1, 1), 60])
+        self.assertEqual(points[-1], [date(2024, 1, 14), 73])
+        self.assertEqual(response.data['buckets'][0]['heart_rate']['max'], 73)
+
+    def test_long_ranges_are_reduced_in_sql(self):
+        # 14 days for 2 points: weekly min and max, one grouped query for the points
+        with self.assertNumQueries(3):
+            response = self.series(metrics="heart_rate", bucket="month", points=2)
+        self.assertEqual(response.data['points']['heart_rate'], [[date(2024, 1, 1), 60], [date(2024, 1, 8), 73]])
+
+    def test_other_user(self):
+        response = self.series(user_id=self.other.id, metrics="heart_rate", bucket="month")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        Doctor.objects.create(user=self.user, specialized="general_physician")
+        response = self.series(user_id=self.other.id, metrics="heart_rate", bucket="month")
+        self.assertEqual(response.data['buckets'][0]['heart_rate']['last'], 150)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.series(metrics="heart_rate,password").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.series(bucket="year").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.series(start="2024-02-01").status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_lttb_keeps_peaks(self):
+        points = [(x, 0.0) for x in range(100)]
+        points[50] = (50, 10.0)
+        sampled = lttb(points, 10)
+        self.assertEqual(len(sampled), 10)
+        self.assertIn((50, 10.0), sampled)
+        self.assertEqual((sampled[0], sampled[-1]), (points[0], points[-1]))
+        self.assertEqual(lttb(points[:5], 10), points[:5])
+
+
+class VitalsBulkIngestTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        self.url = reverse("patient_profile:vitals-bulk")
+
+    def readings(self, count):
+        return [
+            {'measured_at': f"2024-03-01T{hour:02d}:00:00Z", 'heart_rate': 60 + hour, 'temperature': 36.666}
+            for hour in range(count)
+        ]
+
+    def test_batch_is_inserted_in_constant_queries(self):
+        # token lookup, patient lookup, duplicate lookup, savepoint, insert, inserted lookup, release
+        with self.assertNumQueries(7):
+            response = self.client.post(self.url, self.readings(20), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'received': 20, 'created': 20, 'duplicates': [], 'errors': []})
+        vital = Vitals.objects.get(user=self.user, heart_rate=65)
+        self.assertEqual((vital.date, vital.temperature), (date(2024, 3, 1), Decimal("36.67")))
+
+    def test_resent_readings_are_skipped(self):
+        self.client.post(self.url, self.readings(3), format='json')
+        response = self.client.post(self.url, self.readings(5) + self.readings(1), format='json')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['duplicates'], [0, 1, 2, 5])
+        self.assertEqual(Vitals.objects.filter(user=self.user).count(), 5)
+
+    def test_readings_of_a_concurrent_sync_are_not_counted(self):
+        bulk_create = Vitals.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            # another sync stores the first reading between the duplicate lookup and the insert
+            Vitals.objects.create(user=self.user, measured_at=objs[0].measured_at, heart_rate=60)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(Vitals.objects, 'bulk_create', side_effect=racing_bulk_create):
+            response = self.client.post(self.url, self.readings(3), format='json')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['duplicates'], [0])
+        self.assertEqual(Vitals.objects.filter(user=self.user).count(), 3)
+
+    def test_ndjson_with_row_errors(self):
+        body = "\n".join([
+            '{"measured_at": "2024-03-01T08:00:00Z", "heart_rate": 72}',
+            '{"measured_at": "2024-03-01T09:00:00Z", "heart_rate": 900}',
+            'not json',
+            '',
+            '{"heart_rate": 70}',
+            '{"measured_at": "2024-03-01T10:00:00Z", "weight": "heavy", "mood": "ok"}',
+        ])
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.data['created'], 1)
+        errors = {row['row']: row['errors'] for row in response.data['errors']}
+        self.assertEqual(sorted(errors), [1, 2, 3, 4])
+        self.assertIn('heart_rate', errors[1])
+        self.assertIn('Invalid JSON', errors[2]['non_field_errors'][0])
+        self.assertEqual(errors[3], {'measured_at': ["This field is required."]})
+        self.assertEqual(set(errors[4]), {'non_field_errors', 'weight'})
+
+    def test_batch_limits(self):
+        self.assertEqual(self.client.post(self.url, {'heart_rate': 70}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        with mock.patch("patient.viewsets.MAX_READINGS", 2):
+            self.assertEqual(self.client.post(self.url, self.readings(3), format='json').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PrescriptionWriteTestCase(APITestCase):
+    def setUp(self):
+        doctor_user = User.objects.create_user(username="doctor", email="doctor@example.com", password="pass@123")
+        self.doctor = Doctor.objects.create(user=doctor_user, specialized="general_physician")
+        self.patients = [
+            User.objects.create_user(username=f"patient{index}", email=f"patient{index}@example.com", password="pass@123")
+            for index in range(4)
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=doctor_user).key)
+        self.batch_url = reverse("patient_profile:prescription-batch")
+
+    def item(self, patient, medications=2):
+        return {
+            'prescription': {'user': patient.id, 'issue_date': "2024-03-01", 'notes': "After meals"},
+            'medications': [
+                {'item': f"Medicine {index}", 'dosage': "500mg", 'quantity': 10, 'frm': "2024-03-01T08:00:00Z", 'to': "2024-03-08T08:00:00Z"}
+                for index in range(medications)
+            ],
+        }
+
+    def test_create_writes_medications_in_one_insert(self):
+        # token lookup, patient lookup, savepoint, prescription, medications, their doses, release
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse("patient_profile:prescription-list"), self.item(self.patients[0], medications=5), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        prescription = Prescription.objects.get(id=response.data['id'])
+        self.assertEqual(Medication.objects.filter(prescription=prescription).count(), 5)
+
+    def test_invalid_medications_leave_no_prescription(self):
+        item = self.item(self.patients[0])
+        item['medications'][1]['quantity'] = "many"
+        response = self.client.post(reverse("patient_profile:prescription-list"), item, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('quantity', response.data[1])
+        self.assertFalse(Prescription.objects.exists())
+
+    def test_batch_reports_rejected_rows(self):
+        invalid = self.item(self.patients[1])
+        invalid['medications'][0]['frm'] = "yesterday"
+        unknown_patient = self.item(self.patients[2])
+        unknown_patient['prescription']['user'] = 999
+        response = self.client.post(self.batch_url, {'prescriptions': [self.item(self.patients[0]), invalid, unknown_patient, "x", self.item(self.patients[3])]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['received'], 5)
+        self.assertEqual([row['row'] for row in response.data['errors']], [1, 2, 3])
+        self.assertIn('medications', response.data['errors'][0]['errors'])
+        self.assertIn('user', response.data['errors'][1]['errors']['prescription'])
+
+        created = Prescription.objects.filter(id__in=response.data['created'])
+        self.assertEqual({prescription.user_id for prescription in created}, {self.patients[0].id, self.patients[3].id})
+        self.assertEqual({prescription.doctor_id for prescription in created}, {self.doctor.id})
+        self.assertEqual(Prescription.objects.count(), 2)
+        self.assertEqual(Medication.objects.count(), 4)
+
+    def test_batch_queries_per_prescription_are_constant(self):
+        def queries(count):
+            with CaptureQueriesContext(connection) as captured:
+                self.client.post(self.batch_url, {'prescriptions': [self.item(patient, medications=3) for patient in self.patients[:count]]}, format='json')
+            return len(captured)
+
+        # savepoint, prescription, medications, their doses and release for each prescription
+        self.assertEqual(queries(4) - queries(1), 3 * 5)
+
+    def test_failed_write_is_rolled_back_alone(self):
+        bulk_create = Medication.objects.bulk_create
+        calls = []
+
+        def fail_second(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise DatabaseError("disk full")
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(Medication.objects, 'bulk_create', side_effect=fail_second):
+            response = self.client.post(self.batch_url, {'prescriptions': [self.item(patient) for patient in self.patients[:3]]}, format='json')
+        self.assertEqual(response.data['errors'], [{'row': 1, 'errors': {'non_field_errors': ["The prescription could not be saved."]}}])
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertFalse(Prescription.objects.filter(user=self.patients[1]).exists())
+
+    def test_batch_rows_name_the_patient_and_own_doctor(self):
+        other = Doctor.objects.create(
+            user=User.objects.create_user(username="other", email="other@example.com", password="pass@123"),
+            specialized="general_physician",
+        )
+        without_patient = self.item(self.patients[0])
+        del without_patient['prescription']['user']
+        other_doctor = self.item(self.patients[1])
+        other_doctor['prescription']['doctor'] = other.id
+        own_doctor = self.item(self.patients[2])
+        own_doctor['prescription']['doctor'] = self.doctor.id
+        response = self.client.post(self.batch_url, {'prescriptions': [without_patient, other_doctor, own_doctor]}, format='json')
+        self.assertEqual([row['row'] for row in response.data['errors']], [0, 1])
+        self.assertIn('user', response.data['errors'][0]['errors']['prescription'])
+        self.assertIn('doctor', response.data['errors'][1]['errors']['prescription'])
+        self.assertEqual(len(response.data['created']), 1)
+
+        staff = User.objects.create_user(username="staff", email="staff@example.com", password="pass@123", is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=staff).key)
+        response = self.client.post(self.batch_url, {'prescriptions': [other_doctor]}, format='json')
+        self.assertEqual(response.data['errors'], [])
+        self.assertTrue(Prescription.objects.filter(user=self.patients[1], doctor=other).exists())
+
+    def test_batch_is_for_doctors(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.patients[0]).key)
+        response = self.client.post(self.batch_url, {'prescriptions': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DoseScheduleTestCase(APITestCase):
+    def setUp(self):
+        self.patients = [
+            User.objects.create_user(username=f"patient{index}", email=f"patient{index}@example.com", password="pass@123")
+            for index in range(3)
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.patients[0]).key)
+        self.now = timezone.make_aware(datetime(2030, 1, 1, 7, 50))
+
+    def medication(self, patient, **fields):
+        prescription = Prescription.objects.create(user=patient, issue_date=date(2030, 1, 1))
+        fields.setdefault('frm', timezone.make_aware(datetime(2030, 1, 1, 8, 0)))
+        return Medication.objects.create(prescription=prescription, item="Amoxicillin", dosage="500mg", **fields)
+
+    def due_times(self, medication):
+        return [timezone.localtime(due_at).strftime('%d %H:%M') for due_at in medication.doses.order_by('due_at').values_list('due_at', flat=True)]
+
+    def test_dose_times(self):
+        self.assertEqual(dose_times("Morning, evening"), [time(8, 0), time(19, 0)])
+        self.assertEqual(dose_times("08:30 and 8pm"), [time(8, 30), time(20, 0)])
+        self.assertEqual(dose_times("twice daily"), [time(8, 0), time(20, 0)])
+        self.assertEqual(dose_times("3 times a day"), [time(8, 0), time(14, 0), time(20, 0)])
+        self.assertEqual(dose_times("every 6 hours"), [time(2, 0), time(8, 0), time(14, 0), time(20, 0)])
+        self.assertEqual(dose_times("as needed"), [])
+
+    def test_doses_are_generated_incrementally(self):
+        medication = self.medication(self.patients[0], time="morning,evening", duration="3 days")
+        self.assertEqual(generate_doses(now=self.now), 4)
+        self.assertEqual(self.due_times(medication), ["01 08:00", "01 19:00", "02 08:00", "02 19:00"])
+
+        # more than half of the window is left, nothing to do
+        with self.assertNumQueries(1):
+            self.assertEqual(generate_doses(now=self.now + timedelta(hours=12)), 0)
+
+        self.assertEqual(generate_doses(now=self.now + timedelta(days=1, hours=1)), 2)
+        # the medication ends 3 days after its start
+        self.assertEqual(generate_doses(now=self.now + timedelta(days=3)), 0)
+        self.assertEqual(self.due_times(medication), ["01 08:00", "01 19:00", "02 08:00", "02 19:00", "03 08:00", "03 19:00"])
+
+    def test_changed_medication_rebuilds_upcoming_doses(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        medication = self.medication(self.patients[0], time="morning", duration="1 day", frm=timezone.make_aware(datetime.combine(tomorrow, time(0, 0))))
+        self.assertEqual(self.due_times(medication), [f"{tomorrow:%d} 08:00"])
+        medication.time = "9pm"
+        medication.save()
+        self.assertEqual(self.due_times(medication), [f"{tomorrow:%d} 21:00"])
+
+    def test_prescriptions_are_written_with_their_doses(self):
+        start = timezone.now() + timedelta(hours=1)
+        item = {
+            'prescription': {'user': self.patients[0].id},
+            'medications': [{'item': "Ibuprofen", 'time': "every 8 hours", 'frm': start.isoformat(), 'duration': "1 day"}],
+        }
+        response = self.client.post(reverse("patient_profile:prescription-list"), item, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(MedicationDose.objects.filter(user=self.patients[0]).count(), 3)
+
+    def test_due_doses(self):
+        self.medication(self.patients[0], time="morning,evening", frm=timezone.now(), duration="7 days")
+        self.medication(self.patients[1], time="morning,evening", frm=timezone.now(), duration="7 days")
+        url = reverse("patient_profile:doses", args=[self.patients[0].id])
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'hours': 24})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response.data[0]['item'], "Amoxicillin")
+        self.assertLess(response.data[0]['due_at'], response.data[1]['due_at'])
+
+        response = self.client.get(url, {'hours': 1000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # only staff and doctors read the doses of another patient
+        other = reverse("patient_profile:doses", args=[self.patients[1].id])
+        self.assertEqual(self.client.get(other).status_code, status.HTTP_403_FORBIDDEN)
+        Doctor.objects.create(user=self.patients[0], specialized="general_physician")
+        self.assertEqual(len(self.client.get(other, {'hours': 24}).data), 2)
+
+    @mock.patch("patient.doses.send_push", return_value=["n-1"])
+    def test_reminders_are_sent_once_per_bucket(self, send_push):
+        for patient in self.patients:
+            self.medication(patient, time="morning", duration="1 day")
+        self.medication(self.patients[0], time="08:20", duration="1 day")
+        generate_doses(now=self.now)
+
+        jobs = schedule_reminders(now=self.now)
+        self.assertEqual([job.kwargs['bucket'] for job in jobs], ["2030-01-01T08:00:00+00:00", "2030-01-01T08:15:00+00:00"])
+        self.assertEqual(schedule_reminders(now=self.now), jobs)
+
+        result = send_dose_reminders("2030-01-01T08:00:00+00:00")
+        self.assertEqual((result['doses'], result['users']), (3, 3))
+        send_push.assert_called_once()
+        self.assertEqual(send_push.call_args[0][0], [str(patient.id) for patient in self.patients])
+        self.assertEqual(MedicationDose.objects.filter(reminded_at__isnull=True).count(), 1)
+
+        # a repeated job finds nothing left to send
+        self.assertEqual(send_dose_reminders("2030-01-01T08:00:00+00:00")['doses'], 0)
+        self.assertEqual(send_push.call_count, 1)
+
+    @mock.patch("patient.doses.send_push", return_value=["n-1"])
+    def test_doses_added_after_the_job_ran_are_reminded(self, send_push):
+        self.medication(self.patients[0], time="morning", duration="1 day")
+        generate_doses(now=self.now)
+        with mock.patch("django.utils.timezone.now", return_value=self.now + timedelta(minutes=12)):
+            schedule_reminders(now=self.now)
+            self.assertEqual(run_pending(), 1)
+            self.medication(self.patients[1], time="08:05", duration="1 day")
+            generate_doses(now=self.now)
+            job, = schedule_reminders(now=self.now)
+            self.assertEqual(job.status, Job.Status.PENDING)
+            self.assertEqual(run_pending(), 1)
+        self.assertEqual(send_push.call_count, 2)
+        self.assertEqual(send_push.call_args[0][0], [str(self.patients[1].id)])
+        self.assertFalse(MedicationDose.objects.filter(reminded_at__isnull=True).exists())
+
+    @mock.patch("home.api.v1.utils.MAX_RECIPIENTS_PER_SEND", 1)
+    def test_retried_reminders_skip_the_batches_sent(self):
+        for patient in self.patients:
+            self.medication(patient, time="morning", duration="1 day")
+            OneSignalSubscription.objects.create(external_id=str(patient.id), subscription_ids=[f"sub-{patient.id}"], fetched_at=self.now)
+        generate_doses(now=self.now)
+        sent = requests.Response()
+        sent.status_code, sent._content = 200, b'{"id": "n-1"}'
+        failed = requests.Response()
+        failed.status_code = 503
+        onesignal = get_client('onesignal')
+        with mock.patch("django.utils.timezone.now", return_value=self.now + timedelta(minutes=12)), \
+                mock.patch.object(onesignal, 'post', side_effect=[sent, failed]):
+            with self.assertRaises(requests.HTTPError):
+                send_dose_reminders("2030-01-01T08:00:00+00:00")
+        self.assertEqual(MedicationDose.objects.filter(reminded_at__isnull=True).count(), 2)
+
+        with mock.patch("django.utils.timezone.now", return_value=self.now + timedelta(minutes=13)), \
+                mock.patch.object(onesignal, 'post', return_value=sent) as post:
+            send_dose_reminders("2030-01-01T08:00:00+00:00")
+        # the first patient was reminded by the failed run
+        self.assertEqual(
+            [call.kwargs['json']['include_external_user_ids'] for call in post.call_args_list],
+            [[str(self.patients[1].id)], [str(self.patients[2].id)]],
+        )
+        self.assertFalse(MedicationDose.objects.filter(reminded_at__isnull=True).exists())
+
+    @mock.patch("patient.doses.send_push")
+    def test_late_reminders_are_dropped(self, send_push):
+        self.medication(self.patients[0], time="morning", duration="1 day")
+        generate_doses(now=self.now)
+        with mock.patch("django.utils.timezone.now", return_value=self.now + timedelta(hours=2)):
+            result = send_dose_reminders("2030-01-01T08:00:00+00:00")
+        self.assertEqual(result['doses'], 1)
+        send_push.assert_not_called()
+        self.assertFalse(MedicationDose.objects.filter(reminded_at__isnull=True).exists())
+
+
+class TimelineTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        other = User.objects.create_user(username="other", email="other@example.com", password="pass@123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        self.url = reverse("patient_profile:medicalrecord-timeline")
+
+        self.expected = []
+        for day in range(1, 5):
+            issued = date(2024, 3, day)
+            record = MedicalRecord.objects.create(user=self.user, date=issued, diagnosis=f"Diagnosis {day}")
+            prescription = Prescription.objects.create(user=self.user, issue_date=issued)
+            Medication.objects.create(prescription=prescription, item="Paracetamol")
+            vitals = [Vitals.objects.create(user=self.user, date=issued, heart_rate=60 + index) for index in range(2)]
+            result = TestResult.objects.create(user=self.user, test_name=f"Test {day}")
+            TestResult.objects.filter(id=result.id).update(created_at=timezone.make_aware(datetime.combine(issued, time(10, 0))))
+            # newest first: the test result of the morning, then the entries of midnight by type
+            self.expected = [
+                ('test_result', result.id),
+                ('medical_record', record.id), ('prescription', prescription.id),
+                ('vitals', vitals[1].id), ('vitals', vitals[0].id),
+            ] + self.expected
+            MedicalRecord.objects.create(user=other, date=issued)
+            Vitals.objects.create(user=other, date=issued)
+        MedicalRecord.objects.create(user=self.user, date=None)
+
+    def pages(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen += [(entry['type'], entry['id']) for entry in response.data['results']]
+            url = response.data['next']
+        return seen
+
+    def test_entries_are_merged_newest_first(self):
+        self.assertEqual(self.pages(self.url + "?page_size=3"), self.expected)
+        self.assertEqual(self.pages(self.url + "?page_size=50"), self.expected)
+
+    def test_pages_cost_one_query_per_type(self):
+        url = self.url + "?page_size=2&types=medical_record,vitals"
+        seen = []
+        while url:
+            # token lookup and one query per type, however deep the page is
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            seen += [(entry['type'], entry['id']) for entry in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, [entry for entry in self.expected if entry[0] in ('medical_record', 'vitals')])
+
+    def test_entries_show_their_rows(self):
+        response = self.client.get(self.url, {'types': "prescription", 'page_size': 1})
+        entry = response.data['results'][0]
+        self.assertEqual(entry['at'].date(), date(2024, 3, 4))
+        self.assertEqual([medication['item'] for medication in entry['data']['medications']], ["Paracetamol"])
+
+    def test_date_range(self):
+        response = self.client.get(self.url, {'from_date': "2024-03-02", 'to_date': "2024-03-03"})
+        self.assertEqual([(entry['type'], entry['id']) for entry in response.data['results']], self.expected[5:15])
+        response = self.client.get(self.url, {'from_date': "2024-03-04"})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_invalid_parameters(self):
+        for params in ({'types': "emails"}, {'cursor': "not-a-cursor"}, {'from_date': "2024-03-04", 'to_date': "2024-03-01"}):
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_timelines_are_for_staff_and_doctors(self):
+        other = User.objects.get(username="other")
+        response = self.client.get(self.url, {'user_id': other.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(self.url, {'user_id': self.user.id}).status_code, status.HTTP_200_OK)
+
+        Doctor.objects.create(user=other, specialized="general_physician")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=other).key)
+        response = self.client.get(self.url, {'user_id': self.user.id, 'page_size': 50})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), len(self.expected))
+
+    def test_medical_records_filter_from_date_alone(self):
+        MedicalRecord.objects.filter(user=self.user).update(frmdate=date(2024, 3, 1), todate=date(2024, 3, 5))
+        MedicalRecord.objects.filter(user=self.user, date=date(2024, 3, 4)).update(frmdate=date(2024, 3, 4))
+        response = self.client.get(reverse("patient_profile:medicalrecord-list"), {'user_id': self.user.id, 'from_date': "2024-03-03"})
+        self.assertEqual([record['diagnosis'] for record in response.data['results']], ["Diagnosis 4"])
+
+
+MB = 1024 * 1024
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME="results", TEST_RESULT_UPLOAD_PART_SIZE=5 * MB)
+class TestResultMultipartUploadTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="patient", email="patient@example.com", password="pass@123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        # a local S3 stand-in, every call has to be one the test expects
+        s3 = boto3.client(
+            's3', region_name='us-east-1', aws_access_key_id='testing', aws_secret_access_key='testing',
+            config=boto3.session.Config(signature_version='s3v4'),
+        )
+        self.s3 = Stubber(s3)
+        self.s3.activate()
+        for target in ("patient.uploads.get_s3_client", "home.signed_urls.get_s3_client"):
+            patcher = mock.patch(target, return_value=s3)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.url = reverse("patient_profile:test-result-multipart-list")
+
+    def start(self, size=12 * MB):
+        self.s3.add_response(
+            'create_multipart_upload', {'UploadId': "upload-1", 'Bucket': "results", 'Key': "key"},
+            {'Bucket': "results", 'Key': ANY, 'ContentType': "application/pdf"},
+        )
+        return self.client.post(self.url, {'filename': "chest x-ray.pdf", 'content_type': "application/pdf", 'size': size}, format='json')
+
+    def list_parts(self, upload, sizes):
+        parts = [{'PartNumber': number, 'ETag': f'"etag-{number}"', 'Size': size} for number, size in enumerate(sizes, 1)]
+        self.s3.add_response('list_parts', {'Parts': parts}, {'Bucket': "results", 'Key': upload.name, 'UploadId': "upload-1"})
+        return parts
+
+    def test_file_is_uploaded_in_parts_and_completed(self):
+        response = self.start()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload = TestResultUpload.objects.get(id=response.data['id'])
+        self.assertTrue(upload.name.startswith(f"MRO/medrec/{self.user.id}/"))
+        self.assertTrue(upload.name.endswith("-chest_x-ray.pdf"))
+        self.assertEqual([part['part_number'] for part in response.data['parts']], [1, 2, 3])
+        self.assertIn("partNumber=2", response.data['parts'][1]['url'])
+        self.assertIn("uploadId=upload-1", response.data['parts'][1]['url'])
+
+        # the connection dropped after the first part
+        self.list_parts(upload, [5 * MB])
+        response = self.client.get(reverse("patient_profile:test-result-multipart-detail", args=[upload.id]))
+        self.assertEqual(response.data['uploaded'], [1])
+        self.assertEqual([part['part_number'] for part in response.data['parts']], [2, 3])
+
+        complete_url = reverse("patient_profile:test-result-multipart-complete", args=[upload.id])
+        self.list_parts(upload, [5 * MB, 5 * MB])
+        response = self.client.post(complete_url, {'test_name': "Chest X-ray"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("3", response.data['error'])
+
+        parts = self.list_parts(upload, [5 * MB, 5 * MB, 2 * MB])
+        self.s3.add_response('complete_multipart_upload', {}, {
+            'Bucket': "results", 'Key': upload.name, 'UploadId': "upload-1",
+            'MultipartUpload': {'Parts': [{'PartNumber': part['PartNumber'], 'ETag': part['ETag']} for part in parts]},
+        })
+        response = self.client.post(complete_url, {'test_name': "Chest X-ray"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        result = TestResult.objects.get(id=response.data['id'])
+        self.assertEqual((result.user, result.test_name, result.test_results.name), (self.user, "Chest X-ray", upload.name))
+
+        # a repeated callback returns the same test result without calling S3
+        response = self.client.post(complete_url, {'test_name': "Chest X-ray"}, format='json')
+        self.assertEqual(response.data['id'], result.id)
+        self.assertEqual(TestResult.objects.count(), 1)
+        self.s3.assert_no_pending_responses()
+
+    def test_size_must_match(self):
+        upload = TestResultUpload.objects.get(id=self.start(size=6 * MB).data['id'])
+        self.list_parts(upload, [5 * MB, 2 * MB])
+        response = self.client.post(reverse("patient_profile:test-result-multipart-complete", args=[upload.id]), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TestResult.objects.exists())
+
+    def test_aborted_upload(self):
+        upload = TestResultUpload.objects.get(id=self.start().data['id'])
+        self.s3.add_response('abort_multipart_upload', {}, {'Bucket': "results", 'Key': upload.name, 'UploadId': "upload-1"})
+        response = self.client.delete(reverse("patient_profile:test-result-multipart-detail", args=[upload.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.post(reverse("patient_profile:test-result-multipart-complete", args=[upload.id]), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.s3.assert_no_pending_responses()
+
+    def test_upload_removed_by_s3(self):
+        upload = TestResultUpload.objects.get(id=self.start().data['id'])
+        detail_url = reverse("patient_profile:test-result-multipart-detail", args=[upload.id])
+        self.s3.add_client_error('list_parts', service_error_code='NoSuchUpload', http_status_code=404)
+        response = self.client.get(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, TestResultUpload.Status.ABORTED)
+        # aborted, the other endpoints answer without calling S3
+        response = self.client.post(reverse("patient_profile:test-result-multipart-complete", args=[upload.id]), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        upload = TestResultUpload.objects.get(id=self.start().data['id'])
+        self.s3.add_client_error('list_parts', service_error_code='NoSuchUpload', http_status_code=404)
+        response = self.client.post(reverse("patient_profile:test-result-multipart-complete", args=[upload.id]), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        upload = TestResultUpload.objects.get(id=self.start().data['id'])
+        self.s3.add_client_error('abort_multipart_upload', service_error_code='NoSuchUpload', http_status_code=404)
+        response = self.client.delete(reverse("patient_profile:test-result-multipart-detail", args=[upload.id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(TestResultUpload.objects.filter(status=TestResultUpload.Status.PENDING).exists())
+        self.s3.assert_no_pending_responses()
+
+    def test_invalid_files_are_refused_before_s3(self):
+        for size in (0, 2 * 1024 * MB):
+            response = self.client.post(self.url, {'filename': "scan.dcm", 'size': size}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_uploads_are_private(self):
+        upload = TestResultUpload.objects.get(id=self.start().data['id'])
+        other = User.objects.create_user(username="other", email="other@example.com", password="pass@123")
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=other).key)
+        response = self.client.get(reverse("patient_profile:test-result-multipart-detail", args=[upload.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
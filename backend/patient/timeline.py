@@ -0,0 +1,159 @@
+"""
+The medical history of a patient as one timeline.
+
+Medical records, prescriptions, test results and vitals are each read as a
+stream, newest first, from a (user, time column, id) index: the record
+date, the prescription issue date, the test result upload time and the
+vitals date. A page takes `size + 1` rows of every stream and merges them
+with heapq.merge on the (time, type, id) key, the `size` newest make the
+page and the one after tells whether there is a next page.
+
+The next cursor is the key of the last entry of the page. Every stream
+continues strictly below it with a range condition on its own index, so a
+page deep into the history costs the same one query per stream as the
+first page, where an offset would have to skip over every earlier entry.
+Rows without a date are not on the timeline.
+"""
+import base64
+import heapq
+import json
+from datetime import datetime, time, timedelta
+
+from django.db.models import DateTimeField, Q, prefetch_related_objects
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from hospital_operations.emr.models import MedicalRecord, TestResult
+from hospital_operations.pharmacy.models import Prescription
+from users.models import Vitals
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class TimelineStream:
+    """
+    The rows of one model on the timeline.
+
+    Attributes:
+        type (str): The entry type of the rows.
+        model (Model): The model the rows are read from.
+        field (str): The date or datetime column the rows are ordered by.
+        select_related (tuple): The relations the entries show.
+    """
+
+    def __init__(self, entry_type, model, field, select_related=()):
+        self.type = entry_type
+        self.model = model
+        self.field = field
+        self.select_related = select_related
+        self.is_date = not isinstance(model._meta.get_field(field), DateTimeField)
+
+    def at(self, row):
+        """
+        Returns the time of a row, midnight of its day for date columns.
+        """
+        value = getattr(row, self.field)
+        return start_of(value) if self.is_date else value
+
+    def bounds(self, from_date, to_date):
+        """
+        Returns the condition of the rows from from_date to to_date, both included.
+        """
+        condition = Q()
+        if from_date:
+            condition &= Q(**{f'{self.field}__gte': from_date if self.is_date else start_of(from_date)})
+        if to_date:
+            condition &= Q(**{f'{self.field}__lte': to_date} if self.is_date else {f'{self.field}__lt': start_of(to_date + timedelta(days=1))})
+        return condition
+
+    def before(self, cursor):
+        """
+        Returns the condition of the rows whose key is below the cursor.
+        """
+        at, rank, row_id = cursor
+        value = at
+        if self.is_date:
+            value = timezone.localtime(at).date()
+            if at > start_of(value):
+                # every row of the day sorts before a time later in the day
+                return Q(**{f'{self.field}__lte': value})
+        older = Q(**{f'{self.field}__lt': value})
+        if self.rank < rank:
+            return older | Q(**{self.field: value})
+        if self.rank == rank:
+            return older | Q(**{self.field: value, 'id__lt': row_id})
+        return older
+
+    @property
+    def rank(self):
+        return TYPES.index(self.type)
+
+    def rows(self, user_id, from_date, to_date, cursor, limit):
+        rows = self.model.objects.filter(self.bounds(from_date, to_date), user_id=user_id, **{f'{self.field}__isnull': False})
+        if cursor is not None:
+            rows = rows.filter(self.before(cursor))
+        return rows.select_related(*self.select_related).order_by(f'-{self.field}', '-id')[:limit]
+
+    def entries(self, rows):
+        for row in rows:
+            yield self.at(row), self.rank, row.id, row
+
+
+def start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+# Entries of the same time are ordered by type, then by ID, newest first
+TYPES = ('vitals', 'test_result', 'prescription', 'medical_record')
+STREAMS = {
+    stream.type: stream for stream in (
+        TimelineStream('medical_record', MedicalRecord, 'date'),
+        TimelineStream('prescription', Prescription, 'issue_date', select_related=('doctor__user',)),
+        TimelineStream('test_result', TestResult, 'created_at'),
+        TimelineStream('vitals', Vitals, 'date'),
+    )
+}
+
+
+def encode_cursor(key):
+    at, rank, row_id = key
+    return base64.urlsafe_b64encode(json.dumps([at.isoformat(), rank, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns the key of a cursor.
+
+    Raises:
+        ValueError: If the cursor is not one of encode_cursor.
+    """
+    try:
+        at, rank, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        at = parse_datetime(at)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if at is None or timezone.is_naive(at) or not isinstance(rank, int) or not isinstance(row_id, int):
+        raise ValueError("Invalid cursor")
+    return at, rank, row_id
+
+
+def timeline_page(user_id, types=TYPES, from_date=None, to_date=None, cursor=None, size=PAGE_SIZE):
+    """
+    Returns a page of the timeline of a user, newest first.
+
+    Returns:
+        tuple: The (type, time, object) entries of the page, and the cursor of the next page or None.
+    """
+    key = decode_cursor(cursor) if cursor else None
+    streams = [
+        STREAMS[entry_type].entries(STREAMS[entry_type].rows(user_id, from_date, to_date, key, size + 1))
+        for entry_type in types
+    ]
+    merged = heapq.merge(*streams, key=lambda entry: entry[:3], reverse=True)
+    entries = [entry for _, entry in zip(range(size + 1), merged)]
+
+    page = entries[:size]
+    prefetch_related_objects([row for _, rank, _, row in page if TYPES[rank] == 'prescription'], 'medication_set')
+    next_cursor = encode_cursor(page[-1][:3]) if len(entries) > size else None
+    return [(TYPES[rank], at, row) for at, rank, _, row in page], next_cursor
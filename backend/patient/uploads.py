@@ -0,0 +1,204 @@
+"""
+Test result files uploaded straight to S3.
+
+The multipart endpoints of TestResultUploadViewSet and TestResultViewSet
+stream the whole file through a worker, which buffers it and uploads it to
+S3 again. Here the API only hands out credentials: `start_upload` opens an
+S3 multipart upload, the client PUTs the parts of the file to presigned
+URLs in any order, and `complete_upload` joins them in S3 and creates the
+TestResult pointing at the object. A client that lost its connection asks
+for the upload again and gets the parts S3 already holds, with fresh URLs
+for the others, so only the missing parts are sent again.
+
+The parts are listed from S3 when the upload is completed, the client's
+word on what it sent is not needed. Uploads that are never completed are
+removed by an AbortIncompleteMultipartUpload lifecycle rule on the bucket,
+and an upload S3 no longer holds is marked aborted when it is next used.
+"""
+import math
+import posixpath
+import uuid
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from home.signed_urls import get_s3_client, storage_bucket
+from hospital_operations.emr.models import TestResult, TestResultUpload
+
+# Seconds a presigned part URL stays valid
+UPLOAD_URL_EXPIRY = 6 * 60 * 60
+# S3 accepts at most this many parts in an upload
+MAX_PARTS = 10000
+
+
+class UploadError(Exception):
+    """
+    Raised when a multipart upload cannot be completed.
+    """
+
+
+class UploadGone(UploadError):
+    """
+    Raised when S3 no longer holds a multipart upload, the upload is marked aborted.
+    """
+
+
+def upload_gone(upload, error):
+    """
+    Returns the UploadGone of an upload after marking it aborted, or None
+    when `error` is not S3's NoSuchUpload.
+    """
+    if error.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+        return None
+    TestResultUpload.objects.filter(id=upload.id, status=TestResultUpload.Status.PENDING).update(
+        status=TestResultUpload.Status.ABORTED, completed_at=timezone.now(),
+    )
+    upload.refresh_from_db()
+    return UploadGone("The upload no longer exists")
+
+
+def upload_name(user_id, filename):
+    """
+    Returns the media storage name of a new test result file, next to the
+    ones uploaded through the API.
+    """
+    folder = posixpath.join('MRO', 'medrec', str(user_id), timezone.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    return posixpath.join(folder, f'{uuid.uuid4().hex[:8]}-{get_valid_filename(filename)}')
+
+
+def media_key(name):
+    """
+    Returns the S3 object key of a media storage name.
+    """
+    location = getattr(settings, 'AWS_MEDIA_LOCATION', '')
+    return posixpath.join(location, name) if location else name
+
+
+def upload_params(upload):
+    return {'Bucket': storage_bucket(), 'Key': media_key(upload.name), 'UploadId': upload.upload_id}
+
+
+def part_count(upload):
+    return max(1, math.ceil(upload.size / upload.part_size))
+
+
+def start_upload(user, filename, content_type, size):
+    """
+    Opens the S3 multipart upload of a test result file.
+
+    Returns:
+        TestResultUpload: The upload.
+    """
+    part_size = max(settings.TEST_RESULT_UPLOAD_PART_SIZE, math.ceil(size / MAX_PARTS))
+    name = upload_name(user.id, filename)
+    response = get_s3_client().create_multipart_upload(
+        Bucket=storage_bucket(), Key=media_key(name), ContentType=content_type,
+    )
+    return TestResultUpload.objects.create(
+        user=user, name=name, upload_id=response['UploadId'], filename=filename,
+        content_type=content_type, size=size, part_size=part_size,
+    )
+
+
+def part_urls(upload, part_numbers):
+    """
+    Returns the presigned PUT URL of each part.
+    """
+    client = get_s3_client()
+    return [
+        {
+            'part_number': part_number,
+            'url': client.generate_presigned_url(
+                'upload_part', Params={**upload_params(upload), 'PartNumber': part_number},
+                ExpiresIn=UPLOAD_URL_EXPIRY, HttpMethod='PUT',
+            ),
+        }
+        for part_number in part_numbers
+    ]
+
+
+def uploaded_parts(upload):
+    """
+    Returns the parts S3 holds of an upload, by part number.
+
+    Raises:
+        UploadGone: If S3 no longer holds the upload.
+    """
+    parts = []
+    try:
+        for page in get_s3_client().get_paginator('list_parts').paginate(**upload_params(upload)):
+            parts += page.get('Parts', [])
+    except ClientError as e:
+        raise upload_gone(upload, e) or e
+    return sorted(parts, key=lambda part: part['PartNumber'])
+
+
+def missing_parts(upload, parts):
+    uploaded = {part['PartNumber'] for part in parts}
+    return [part_number for part_number in range(1, part_count(upload) + 1) if part_number not in uploaded]
+
+
+def complete_upload(upload, **fields):
+    """
+    Joins the parts of an upload in S3 and creates its test result with
+    `fields`. Completing a completed upload returns its test result.
+
+    Raises:
+        UploadError: If parts are missing, the size differs or S3 refuses the parts.
+        UploadGone: If S3 no longer holds the upload.
+    """
+    if upload.status == TestResultUpload.Status.COMPLETED:
+        return upload.test_result
+    parts = uploaded_parts(upload)
+    missing = missing_parts(upload, parts)
+    if missing:
+        raise UploadError(f"Parts {', '.join(map(str, missing))} are not uploaded yet.")
+    size = sum(part['Size'] for part in parts)
+    if size != upload.size:
+        raise UploadError(f"The parts hold {size} bytes, {upload.size} were announced.")
+    try:
+        get_s3_client().complete_multipart_upload(
+            **upload_params(upload),
+            MultipartUpload={'Parts': [{'PartNumber': part['PartNumber'], 'ETag': part['ETag']} for part in parts]},
+        )
+    except ClientError as e:
+        upload.refresh_from_db()
+        if upload.status == TestResultUpload.Status.COMPLETED:
+            # completed by a concurrent request in the meantime
+            return upload.test_result
+        gone = upload_gone(upload, e)
+        if gone:
+            raise gone from e
+        raise UploadError(e.response.get('Error', {}).get('Message', str(e))) from e
+
+    with transaction.atomic():
+        # of two completions racing, one creates the test result
+        claimed = TestResultUpload.objects.filter(id=upload.id, status=TestResultUpload.Status.PENDING).update(
+            status=TestResultUpload.Status.COMPLETED, completed_at=timezone.now(),
+        )
+        if not claimed:
+            upload.refresh_from_db()
+            return upload.test_result
+        # the file is in place already, only its name is stored
+        result = TestResult.objects.create(user=upload.user, test_results=upload.name, **fields)
+        TestResultUpload.objects.filter(id=upload.id).update(test_result=result)
+    return result
+
+
+def abort_upload(upload):
+    """
+    Aborts an upload and frees the parts S3 holds of it.
+
+    Raises:
+        UploadGone: If S3 no longer holds the upload.
+    """
+    try:
+        get_s3_client().abort_multipart_upload(**upload_params(upload))
+    except ClientError as e:
+        raise upload_gone(upload, e) or e
+    TestResultUpload.objects.filter(id=upload.id, status=TestResultUpload.Status.PENDING).update(
+        status=TestResultUpload.Status.ABORTED, completed_at=timezone.now(),
+    )
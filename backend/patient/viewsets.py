@@ -1,15 +1,24 @@
 from rest_framework.viewsets import ModelViewSet
-from users.models import Vitals
-from .serializers import VitalsSerializer, PrescriptionSerializer, MedicationSerializer, MedicalRecordSerializer, TestResultSerializer, TestResultUploadSerializer
+from users.access import can_view_records
+from users.models import Doctor, Vitals
+from .doses import doses_due
+from .ingest import MAX_READINGS, NDJSONParser, ingest_readings
+from .prescribing import MAX_PRESCRIPTIONS, create_prescription, create_prescriptions, validate_prescription
+from .series import bucket_aggregates, downsampled_points
+from .timeline import timeline_page
+from .uploads import UploadError, UploadGone, abort_upload, complete_upload, missing_parts, part_urls, start_upload, uploaded_parts
+from .serializers import DosesQuerySerializer, MedicationDoseSerializer, VitalsSeriesQuerySerializer, VitalsSerializer, PrescriptionSerializer, MedicationSerializer, MedicalRecordSerializer, TestResultSerializer, TestResultUploadSerializer, MultipartUploadSerializer, MultipartUploadStartSerializer, MultipartUploadCompleteSerializer, TIMELINE_SERIALIZERS, TimelineQuerySerializer
 from hospital_operations.pharmacy.models import Prescription, Medication
-from hospital_operations.emr.models import MedicalRecord, TestResult
+from hospital_operations.emr.models import MedicalRecord, TestResult, TestResultUpload
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.utils import timezone
 
 class VitalsViewSet(ModelViewSet):
     """
@@ -37,6 +46,61 @@ class VitalsViewSet(ModelViewSet):
             return Vitals.objects.filter(user=user)
         return Vitals.objects.all()
 
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        """
+        Stores a batch of readings of the requesting user, for device sync.
+
+        The body is a JSON array, or NDJSON with the application/x-ndjson content
+        type, of readings with a `measured_at` timestamp and any of the metric
+        fields. Readings already stored for the same timestamp are skipped, the
+        others are validated and inserted in chunks, see patient.ingest.
+
+        Returns:
+        - The number of readings created, the rows skipped as duplicates and the errors of each rejected row, with HTTP status 200.
+        - An error with HTTP status 400 if the body is not a list or has more than MAX_READINGS readings.
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({"error": "Expected a list of readings"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > MAX_READINGS:
+            return Response({"error": f"A batch has at most {MAX_READINGS} readings"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ingest_readings(request.user, rows))
+
+    @action(detail=False, methods=['get'])
+    def series(self, request):
+        """
+        Chart data of a patient's vitals.
+
+        Returns the min/max/avg/last of each metric per day, week or month,
+        computed in the database, and the readings of each metric
+        downsampled to at most `points` points, so a chart covering years
+        fetches a few hundred numbers.
+
+        Query parameters:
+            user_id, metrics, start, end, bucket, points: See VitalsSeriesQuerySerializer.
+                Only staff and doctors chart the vitals of another user.
+        """
+        query = VitalsSeriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        user_id = params.get('user_id') or request.user.id
+        if not user_id:
+            return Response({"user_id": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        if not can_view_records(request.user, user_id):
+            return Response({"error": "You can only view your own vitals"}, status=status.HTTP_403_FORBIDDEN)
+
+        vitals = Vitals.objects.filter(user=user_id, date__gte=params['start'], date__lte=params['end'])
+        return Response({
+            'user': user_id,
+            'metrics': params['metrics'],
+            'start': params['start'],
+            'end': params['end'],
+            'bucket': params['bucket'],
+            'buckets': bucket_aggregates(vitals, params['metrics'], params['bucket']),
+            'points': downsampled_points(vitals, params['metrics'], params['points'], params['start'], params['end']),
+        })
+
 class PrescriptionViewSet(ModelViewSet):
     """
     A viewset for handling Prescription related operations.
@@ -55,6 +119,9 @@ class PrescriptionViewSet(ModelViewSet):
         """
         Create a new Prescription and associated Medications.
 
+        The prescription and its medications are written in one transaction and
+        the medications with one INSERT, see patient.prescribing.
+
         Args:
             request (Request): The HTTP request object.
             *args: Variable length argument list.
@@ -66,27 +133,39 @@ class PrescriptionViewSet(ModelViewSet):
         Raises:
             HTTP 400 Bad Request: If the prescription data or medication data is invalid.
         """
-        prescription_data = request.data.pop('prescription', None)
-        medications_data = request.data.pop('medications', [])
+        prescription, medications, errors = validate_prescription(request.data)
+        if errors:
+            # the errors of the prescription first, as before
+            return Response(errors.get('prescription') or errors.get('medications') or errors, status=status.HTTP_400_BAD_REQUEST)
+        saved = create_prescription(prescription, medications, request.user, user=request.user)
+        return Response({'message': 'Prescription and medications created successfully', 'id': saved.id}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def batch(self, request):
+        """
+        Create many prescriptions at once, for a doctor writing up a clinic session.
 
-        # Create Prescription
-        prescription_serializer = self.get_serializer(data=prescription_data)
-        if prescription_serializer.is_valid():
-            prescription = prescription_serializer.save(user=request.user)
-        else:
-            return Response(prescription_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        The body is {"prescriptions": [...]} with each prescription in the shape
+        create takes, with the patient in its `user`. The prescriptions without
+        a doctor are written by the requesting doctor, and only staff name
+        another doctor. Every prescription is written with its medications or
+        not at all.
 
-        # Create Medications
-        medication_serializer = MedicationSerializer(data=medications_data, many=True)
-        if medication_serializer.is_valid():
-            medication_serializer.save(prescription=prescription)
-        else:
-            # If medication data is invalid, delete the prescription
-            prescription.delete()
-            return Response(medication_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        Returns:
+        - The number of prescriptions received, the IDs of the created ones and the errors of each rejected row, with HTTP status 200.
+        - An error with HTTP status 400 if `prescriptions` is not a list or has more than MAX_PRESCRIPTIONS items.
+        - An error with HTTP status 403 if the requesting user is neither a doctor nor staff.
+        """
+        doctor = Doctor.objects.filter(user=request.user).first()
+        if doctor is None and not request.user.is_staff:
+            return Response({"error": "Only doctors can write prescriptions in batches"}, status=status.HTTP_403_FORBIDDEN)
+        items = request.data.get('prescriptions') if isinstance(request.data, dict) else None
+        if not isinstance(items, list):
+            return Response({"error": "Expected a list of prescriptions"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_PRESCRIPTIONS:
+            return Response({"error": f"A batch has at most {MAX_PRESCRIPTIONS} prescriptions"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(create_prescriptions(items, request.user, doctor=doctor))
 
-        return Response({'message': 'Prescription and medications created successfully'}, status=status.HTTP_201_CREATED)
-    
     @action(detail=False, methods=['get'])
     def medicationlist(self, request, user_id=None):
         """
@@ -127,11 +206,39 @@ class PrescriptionViewSet(ModelViewSet):
         Returns:
             Response: The HTTP response object.
         """
-        today = datetime.now()
-        todays_medications = Medication.objects.filter(prescription__user=user_id, frm__date__lte=today, to__date__gte=today)
+        # Compare against the bounds of today so the (prescription, frm, to) index applies
+        start_of_today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        start_of_tomorrow = start_of_today + timedelta(days=1)
+        todays_medications = Medication.objects.filter(prescription__user=user_id, frm__lt=start_of_tomorrow, to__gte=start_of_today)
         serializer = MedicationSerializer(todays_medications, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def doses(self, request, user_id=None):
+        """
+        Retrieve the doses a specific user has to take in the next hours.
+
+        The doses are expanded from the medications ahead of time, see
+        patient.doses, and read by user and due time from one index.
+
+        Args:
+            request (Request): The HTTP request object.
+            user_id (int): The ID of the user.
+
+        Query parameters:
+            hours: See DosesQuerySerializer.
+
+        Returns:
+            Response: The HTTP response object, with HTTP status 403 for the
+            doses of another user unless the requester is staff or a doctor.
+        """
+        if not can_view_records(request.user, user_id):
+            return Response({"error": "You can only view your own doses"}, status=status.HTTP_403_FORBIDDEN)
+        query = DosesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        serializer = MedicationDoseSerializer(doses_due([user_id], query.validated_data['hours']), many=True)
+        return Response(serializer.data)
+
 # class MedicalRecordViewSet(ModelViewSet):
 #     queryset = MedicalRecord.objects.all()
 #     serializer_class = MedicalRecordSerializer
@@ -162,7 +269,7 @@ class TestResultUploadViewSet(ModelViewSet):
 
     This viewset provides the following actions:
     - create: Upload a new test result.
-    - list: Retrieve a list of all test results.
+    - list: Retrieve a page of the authenticated user's test results.
     - delete: Delete a specific test result.
 
     Only authenticated users are allowed to perform these actions.
@@ -193,17 +300,18 @@ class TestResultUploadViewSet(ModelViewSet):
 
     def list(self, request):
         """
-        Retrieve a list of all test results.
+        Retrieve a page of the authenticated user's test results.
 
         Parameters:
         - request: The HTTP request object.
 
         Returns:
-        - A Response object with the serialized data of all test results.
+        - A Response object with the serialized page and the next and previous cursors.
         """
-        queryset = TestResult.objects.all()
-        serializer = TestResultUploadSerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        queryset = self.get_queryset().filter(user=request.user)
+        page = self.paginate_queryset(queryset)
+        serializer = TestResultUploadSerializer(page, many=True, context={'request': request})
+        return self.get_paginated_response(serializer.data)
     
     def delete(self, request, *args, **kwargs):
         """
@@ -232,6 +340,97 @@ class TestResultUploadViewSet(ModelViewSet):
         self.check_object_permissions(self.request, obj)
         return obj
 
+class TestResultMultipartUploadViewSet(ModelViewSet):
+    """
+    A viewset for uploading test result files straight to S3 in parts.
+
+    This viewset provides the following actions:
+    - create: Start an upload, returns the presigned URL of every part.
+    - retrieve: Resume an upload, returns the parts already uploaded and fresh URLs for the others.
+    - complete: Join the parts and create the test result.
+    - destroy: Abort an upload.
+
+    The file never passes through the API, see patient.uploads.
+    """
+
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = MultipartUploadSerializer
+    http_method_names = ['get', 'post', 'delete']
+
+    def get_queryset(self):
+        return TestResultUpload.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        """
+        Start the upload of a test result file.
+
+        Returns:
+        - The upload with the presigned PUT URL of each part, HTTP status 201.
+        """
+        serializer = MultipartUploadStartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = start_upload(request.user, **serializer.validated_data)
+        data = MultipartUploadSerializer(upload).data
+        data['parts'] = part_urls(upload, missing_parts(upload, []))
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve an upload. A pending upload lists the part numbers S3 holds
+        and the presigned PUT URLs of the missing parts, or answers HTTP
+        status 409 when S3 no longer holds it.
+        """
+        upload = self.get_object()
+        data = MultipartUploadSerializer(upload).data
+        if upload.status == TestResultUpload.Status.PENDING:
+            try:
+                parts = uploaded_parts(upload)
+            except UploadGone as e:
+                return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+            data['uploaded'] = [part['PartNumber'] for part in parts]
+            data['parts'] = part_urls(upload, missing_parts(upload, parts))
+        return Response(data)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        """
+        Complete an upload once every part is uploaded, and create its test
+        result with the test details of the request.
+
+        Returns:
+        - The test result, HTTP status 201.
+        - If parts are missing, the error with HTTP status 400.
+        - If the upload was aborted or S3 no longer holds it, the error with HTTP status 409.
+        """
+        upload = self.get_object()
+        if upload.status == TestResultUpload.Status.ABORTED:
+            return Response({"error": "The upload was aborted"}, status=status.HTTP_409_CONFLICT)
+        serializer = MultipartUploadCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = complete_upload(upload, **serializer.validated_data)
+        except UploadGone as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(TestResultSerializer(result).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Abort a pending upload. An upload S3 no longer holds is marked
+        aborted and answered with HTTP status 409.
+        """
+        upload = self.get_object()
+        if upload.status == TestResultUpload.Status.COMPLETED:
+            return Response({"error": "The upload is completed"}, status=status.HTTP_409_CONFLICT)
+        if upload.status == TestResultUpload.Status.PENDING:
+            try:
+                abort_upload(upload)
+            except UploadGone as e:
+                return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class MedicalRecordViewSet(ModelViewSet):
     """
     A viewset for handling medical records.
@@ -283,7 +482,7 @@ class MedicalRecordViewSet(ModelViewSet):
             request (Request): The HTTP request object.
 
         Returns:
-            Response: The HTTP response object with the serialized data.
+            Response: The HTTP response object with the serialized page and the next and previous cursors.
         """
         # Get the from_date and to_date from query parameters
         user_id = request.query_params.get('user_id')
@@ -305,10 +504,49 @@ class MedicalRecordViewSet(ModelViewSet):
         queryset = MedicalRecord.objects.all()
         if user_id:
             queryset = queryset.filter(user_id=user_id)
-        if from_date and to_date:
-            queryset = queryset.filter(frmdate__gte=from_date , todate__lte=to_date)
+        if from_date:
+            queryset = queryset.filter(frmdate__gte=from_date)
+        if to_date:
+            queryset = queryset.filter(todate__lte=to_date)
         
-        # Serialize the queryset and return the response
-        serializer = MedicalRecordSerializer(queryset, many=True)
-        return Response(serializer.data)
+        # Serialize the page and return it with the next and previous cursors
+        page = self.paginate_queryset(queryset)
+        serializer = MedicalRecordSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def timeline(self, request):
+        """
+        Retrieve the medical history of a patient, newest first: medical
+        records, prescriptions, test results and vitals in one list.
+
+        Each page is read with one query per entry type however deep it is,
+        see patient.timeline.
+
+        Query parameters:
+            user_id, types, from_date, to_date, cursor, page_size: See TimelineQuerySerializer.
+                Only staff and doctors see the timeline of another user.
+
+        Returns:
+            Response: The entries of the page with the cursor URL of the next page.
+            An error with HTTP status 403 for the timeline of another user.
+        """
+        query = TimelineQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        user_id = params.get('user_id') or request.user.id
+        if not can_view_records(request.user, user_id):
+            return Response({"error": "You can only view your own timeline"}, status=status.HTTP_403_FORBIDDEN)
+
+        entries, cursor = timeline_page(
+            user_id, params['types'], params.get('from_date'), params.get('to_date'), params.get('cursor'), params['page_size'],
+        )
+        context = self.get_serializer_context()
+        return Response({
+            'next': replace_query_param(request.build_absolute_uri(), 'cursor', cursor) if cursor else None,
+            'results': [
+                {'type': entry_type, 'id': row.id, 'at': at, 'data': TIMELINE_SERIALIZERS[entry_type](row, context=context).data}
+                for entry_type, at, row in entries
+            ],
+        })
     
\ No newline at end of file
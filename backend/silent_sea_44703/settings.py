@@ -87,6 +87,7 @@ LOCAL_APPS = [
     'hospital_operations.emr',    
     'modules.two_factor_authentication.twofactorauth',
     'meeting.zoom',
+    'jobs',
 ]
 THIRD_PARTY_APPS = [
     'rest_framework',
@@ -113,6 +114,7 @@ MODULES_APPS = get_modules()
 INSTALLED_APPS += LOCAL_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
+    'home.middleware.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -160,6 +162,18 @@ if env.str("DATABASE_URL", default=None):
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Holds the daily agendas, the doctor search facets and the cached API
+# responses, which are invalidated from model signals. Local memory is per
+# process, so deployments with several workers set CACHE_URL to a shared
+# cache, e.g. rediscache://redis:6379/1
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -247,6 +261,8 @@ REST_FRAMEWORK = {
             #'rest_framework.authentication.BasicAuthentication',
             #'rest_framework.schemas.coreapi.AutoSchema',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'home.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
 # Custom user model
@@ -257,6 +273,46 @@ EMAIL_HOST_USER = env.str("SENDGRID_USERNAME", "")
 EMAIL_HOST_PASSWORD = env.str("SENDGRID_PASSWORD", "")
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
+# The SMTP backend, timing each send as outbound time of the request
+EMAIL_BACKEND = env.str("EMAIL_BACKEND", "home.instrumentation.EmailBackend")
+
+
+# Request instrumentation, see home.middleware
+REQUEST_INSTRUMENTATION = env.bool("REQUEST_INSTRUMENTATION", True)
+# A statement run this many times in one request is logged as an N+1 query (0 disables it)
+REQUEST_N_PLUS_ONE_THRESHOLD = env.int("REQUEST_N_PLUS_ONE_THRESHOLD", 10)
+# Bearer token Prometheus scrapes /metrics/ with, staff users can always read it
+METRICS_TOKEN = env.str("METRICS_TOKEN", "")
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # INFO logs one JSON line per request, WARNING only the N+1 queries
+        'home.middleware': {
+            'handlers': ['console'],
+            'level': env.str("REQUEST_LOG_LEVEL", "WARNING"),
+            'propagate': False,
+        },
+    },
+}
+
+
+# Zoom meeting pool, pre-created meetings handed out at booking time (0 disables it)
+ZOOM_POOL_SIZE = env.int("ZOOM_POOL_SIZE", 0)
+ZOOM_POOL_MAX_AGE_DAYS = env.int("ZOOM_POOL_MAX_AGE_DAYS", 14)
+
+
+# Days ahead doctor slots are generated from the weekly schedules
+DOCTOR_SLOT_HORIZON_DAYS = env.int("DOCTOR_SLOT_HORIZON_DAYS", 28)
+
+
+# Hours ahead medication doses are expanded, and the window one reminder push covers
+MEDICATION_DOSE_HORIZON_HOURS = env.int("MEDICATION_DOSE_HORIZON_HOURS", 48)
+DOSE_REMINDER_BUCKET_MINUTES = env.int("DOSE_REMINDER_BUCKET_MINUTES", 15)
 
 
 # AWS S3 config
@@ -285,6 +341,10 @@ if USE_S3:
 AWS_S3_SIGNATURE_VERSION = "s3v4"
 AWS_QUERYSTRING_AUTH = False
 
+# Largest test result file uploaded straight to S3, and the size of its parts (S3 needs at least 5 MB)
+TEST_RESULT_UPLOAD_MAX_SIZE = env.int("TEST_RESULT_UPLOAD_MAX_SIZE", 1024 * 1024 * 1024)
+TEST_RESULT_UPLOAD_PART_SIZE = env.int("TEST_RESULT_UPLOAD_PART_SIZE", 8 * 1024 * 1024)
+
 SPECTACULAR_SETTINGS = {
     # available SwaggerUI configuration parameters
     # https://swagger.io/docs/open-source-tools/swagger-ui/usage/configuration/
@@ -20,6 +20,7 @@ from django.views.generic.base import TemplateView
 from allauth.account.views import confirm_email
 from rest_framework import permissions
 from drf_spectacular.views import SpectacularJSONAPIView, SpectacularSwaggerView
+from home.views import MetricsView
 
 urlpatterns = [
     
@@ -38,6 +39,7 @@ urlpatterns = [
     #path("rest-auth/registration/", include("dj_rest_auth.registration.urls")),
     path("rest-auth/registration/", include("rest_auth.registration.urls")),    
     path("meeting/", include("meeting.zoom.urls")),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
     #path('paystack/', include('paystack.urls')),
 ]
 
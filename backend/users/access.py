@@ -0,0 +1,15 @@
+"""
+Who may read the records of a patient.
+
+Patients read their own agenda, vitals, doses and history. Staff and
+doctors read those of any patient, the views take the patient's id from
+the URL or the query string for them.
+"""
+from users.models import Doctor
+
+
+def can_view_records(user, user_id):
+    """
+    Returns whether `user` may read the records of the user with id `user_id`.
+    """
+    return user_id == user.id or user.is_staff or Doctor.objects.filter(user=user).exists()
@@ -1,9 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth import admin as auth_admin
 from django.contrib.auth import get_user_model
-from .models import Doctor, Instructor, Feedback
+from .models import Doctor, DoctorSchedule, Instructor, Feedback
 
 from users.forms import UserChangeForm, UserCreationForm
+from home.slots import rebuild_slots
 
 User = get_user_model()
 
@@ -19,9 +20,29 @@ class UserAdmin(auth_admin.UserAdmin):
 class DoctorAdmin(admin.ModelAdmin):
     list_display = ('user', 'age', 'address', 'qualification', 'last_updated_date', 'last_updated_by')
 
+class DoctorScheduleAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'weekday', 'start_time', 'end_time', 'slot_minutes')
+    list_filter = ('weekday',)
+
+    # the free slots follow the schedule
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rebuild_slots(obj.doctor_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_slots(obj.doctor_id)
+
+    def delete_queryset(self, request, queryset):
+        doctor_ids = set(queryset.values_list('doctor_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for doctor_id in doctor_ids:
+            rebuild_slots(doctor_id)
+
 class InstructorAdmin(admin.ModelAdmin):
     list_display = ('user', 'age', 'address', 'qualification', 'last_updated_date', 'last_updated_by')
 
 admin.site.register(Doctor, DoctorAdmin)
+admin.site.register(DoctorSchedule, DoctorScheduleAdmin)
 admin.site.register(Instructor, InstructorAdmin)
 admin.site.register(Feedback)
\ No newline at end of file
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0027_alter_doctor_specialized'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='doctor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='doctor_appointment', to='users.doctor'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['created_at', 'id'], name='feedback_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todolist',
+            index=models.Index(fields=['created_at', 'id'], name='todolist_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vitals',
+            index=models.Index(fields=['created_at', 'id'], name='vitals_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0028_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['user', 'date'], name='appt_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'date'], name='appt_doctor_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['user', 'doctor', 'date', 'consult_time'], name='appt_user_doctor_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'Completed')), fields=['doctor'], name='appt_doctor_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vitals',
+            index=models.Index(fields=['user', 'date'], name='vitals_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0029_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vitals',
+            name='measured_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='vitals',
+            constraint=models.UniqueConstraint(fields=('user', 'measured_at'), name='vitals_user_measured_uniq'),
+        ),
+    ]
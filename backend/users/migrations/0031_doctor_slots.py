@@ -0,0 +1,56 @@
+# Generated by Django 3.2.23 on 2026-10-18 14:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0030_vitals_measured_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSlot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('appointment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='slot', to='users.appointment')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='users.doctor')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DoctorSchedule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='users.doctor')),
+            ],
+            options={
+                'ordering': ['weekday', 'start_time'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='doctorslot',
+            index=models.Index(condition=models.Q(('appointment__isnull', True)), fields=['doctor', 'date', 'start_time'], name='doctor_slot_free_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorslot',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date', 'start_time'), name='doctor_slot_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorschedule',
+            constraint=models.CheckConstraint(check=models.Q(('start_time__lt', django.db.models.expressions.F('end_time'))), name='doctor_schedule_start_before_end'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorschedule',
+            constraint=models.CheckConstraint(check=models.Q(('slot_minutes__gt', 0)), name='doctor_schedule_slot_minutes_positive'),
+        ),
+    ]
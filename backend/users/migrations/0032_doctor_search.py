@@ -0,0 +1,88 @@
+# Generated by Django 3.2.23 on 2026-10-18 15:02
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# A frozen copy of the folding in home.search at the time of this migration,
+# later changes to that module must not change what this migration writes.
+USER_FIELDS = ('full_name', 'name', 'first_name', 'last_name', 'username')
+
+
+def fold(text):
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip()
+
+
+def display_name(user):
+    if user is None:
+        return ''
+    full_name = ' '.join(part for part in (user.first_name, user.last_name) if part)
+    return user.full_name or user.name or full_name or user.username
+
+
+def document_values(doctor, labels):
+    user = doctor.user
+    parts = [getattr(user, field, None) for field in USER_FIELDS] if user else []
+    parts += [doctor.specialized, labels.get(doctor.specialized), doctor.qualification]
+    folded = list(dict.fromkeys(part for part in map(fold, parts) if part))
+    return {
+        'name': fold(display_name(user))[:255],
+        'specialized': doctor.specialized,
+        'document': ' '.join(folded),
+    }
+
+
+def fill_documents(apps, schema_editor):
+    Doctor = apps.get_model('users', 'Doctor')
+    DoctorSearchDocument = apps.get_model('users', 'DoctorSearchDocument')
+    labels = dict(Doctor._meta.get_field('specialized').choices or ())
+    DoctorSearchDocument.objects.bulk_create(
+        [DoctorSearchDocument(doctor=doctor, **document_values(doctor, labels)) for doctor in Doctor.objects.select_related('user')],
+        batch_size=1000,
+    )
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # infix LIKE '%term%' can only use a trigram index, which is PostgreSQL only
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX doctor_search_document_trgm_idx ON users_doctorsearchdocument USING gin (document gin_trgm_ops)')
+    schema_editor.execute('CREATE INDEX doctor_search_name_trgm_idx ON users_doctorsearchdocument USING gin (name gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS doctor_search_document_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS doctor_search_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0031_doctor_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSearchDocument',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='users.doctor')),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('specialized', models.CharField(blank=True, max_length=255, null=True)),
+                ('document', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='doctorsearchdocument',
+            index=models.Index(fields=['specialized'], name='doctor_search_specialized_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+    ]
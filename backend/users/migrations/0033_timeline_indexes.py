@@ -0,0 +1,21 @@
+# Generated by Django 3.2.23 on 2026-10-18 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0032_doctor_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vitals',
+            name='vitals_user_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='vitals',
+            index=models.Index(fields=['user', 'date', 'id'], name='vitals_user_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.23 on 2026-10-18 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0034_user_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vitals',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='vitals_user_created_idx'),
+        ),
+    ]
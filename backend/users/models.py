@@ -8,6 +8,7 @@ from django.db.models.signals import post_save
 from django.utils import timezone
 import uuid
 import os
+from datetime import datetime, timedelta
 
 def get_upload_path(instance, filename):
     return os.path.join('images', 'avatars', str(instance.pk), filename)
@@ -49,6 +50,8 @@ class User(AbstractUser):
     phone_number = models.CharField(max_length=15, null=True, blank=True)
     avatar = models.ImageField(upload_to=get_upload_path, blank=True, null=True,)
     profile_picture = models.ImageField(upload_to=get_upload_profile_pic, null=True, blank=True)
+    # The resized copies of avatar and profile_picture written by home.thumbnails, by field
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     linkedin = models.CharField(max_length=255, null=True, blank=True)  
     dob = models.DateTimeField(null=True, blank=True)
     last_updated_by = models.DateTimeField(null=True, blank=True)   
@@ -198,6 +201,38 @@ class Doctor(models.Model):
     def __str__(self):
         return f"Doctor Info for {self.user.username}"
 
+class DoctorSearchDocument(models.Model):
+    """
+    The denormalized search text of a doctor, see home.search.
+
+    The names of the doctor's user, the specialization and the qualification
+    are folded to lowercase ASCII in one column, so a search is a substring
+    match on one table instead of ORed ILIKEs across the user join. On
+    PostgreSQL the columns have trigram indexes (migration 0032).
+
+    Attributes:
+        doctor (Doctor): The doctor the document describes.
+        name (str): The folded display name, for prefix autocomplete.
+        specialized (str): The specialization, for facet counts.
+        document (str): The folded text searched.
+        updated_at (DateTime): When the document was last rebuilt.
+    """
+
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    name = models.CharField(max_length=255, blank=True, default='')
+    specialized = models.CharField(max_length=255, null=True, blank=True)
+    document = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['specialized'], name='doctor_search_specialized_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
 class Instructor(models.Model):
     """
     Represents an instructor in the system.
@@ -236,6 +271,11 @@ class Feedback(models.Model):
     ratings = models.IntegerField(null=True, blank=True)
     last_updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='feedback_last_updated_by')    
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='feedback_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Feedback from {self.user.username}"
 
@@ -271,9 +311,104 @@ class Appointment(models.Model):
     last_updated_date = models.DateTimeField(auto_now=True)
     last_updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='appoinment_last_updated_by')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='appt_user_date_idx'),
+            models.Index(fields=['doctor', 'date'], name='appt_doctor_date_idx'),
+            models.Index(fields=['user', 'doctor', 'date', 'consult_time'], name='appt_user_doctor_slot_idx'),
+            models.Index(fields=['doctor'], condition=models.Q(status='Completed'), name='appt_doctor_completed_idx'),
+        ]
+
     def __str__(self):
         return f"Appointment for {self.user.username} with {self.doctor.user.username}"
  
+class DoctorSchedule(models.Model):
+    """
+    A weekly working period of a doctor, cut into consultation slots.
+
+    Attributes:
+        doctor (Doctor): The doctor working the period.
+        weekday (int): The day of the week, Monday is 0.
+        start_time (Time): The start of the first slot.
+        end_time (Time): No slot runs past this time.
+        slot_minutes (int): The length of a consultation.
+    """
+
+    class Weekday(models.IntegerChoices):
+        MONDAY = 0, _('Monday')
+        TUESDAY = 1, _('Tuesday')
+        WEDNESDAY = 2, _('Wednesday')
+        THURSDAY = 3, _('Thursday')
+        FRIDAY = 4, _('Friday')
+        SATURDAY = 5, _('Saturday')
+        SUNDAY = 6, _('Sunday')
+
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='schedules')
+    weekday = models.PositiveSmallIntegerField(choices=Weekday.choices)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+
+    class Meta:
+        ordering = ['weekday', 'start_time']
+        constraints = [
+            models.CheckConstraint(check=models.Q(start_time__lt=models.F('end_time')), name='doctor_schedule_start_before_end'),
+            models.CheckConstraint(check=models.Q(slot_minutes__gt=0), name='doctor_schedule_slot_minutes_positive'),
+        ]
+
+    def slot_times(self):
+        """
+        Returns the (start, end) times of the slots in the period.
+        """
+        day = datetime.min.date()
+        start = datetime.combine(day, self.start_time)
+        end = datetime.combine(day, self.end_time)
+        length = timedelta(minutes=self.slot_minutes)
+        times = []
+        while start + length <= end:
+            times.append((start.time(), (start + length).time()))
+            start += length
+        return times
+
+    def __str__(self):
+        return f"{self.doctor} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+
+class DoctorSlot(models.Model):
+    """
+    A bookable consultation slot of a doctor on a date.
+
+    Slots are generated ahead from the weekly schedule, see home.slots. A
+    booking claims its slot by setting the appointment on a free row, and a
+    doctor, date and start time has one row at most, so a slot cannot be
+    booked twice.
+
+    Attributes:
+        doctor (Doctor): The doctor of the slot.
+        date (Date): The date of the slot.
+        start_time (Time): The start of the consultation.
+        end_time (Time): The end of the consultation.
+        appointment (Appointment): The booking holding the slot, empty while it is free.
+    """
+
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='slots')
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    appointment = models.OneToOneField(Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='slot')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date', 'start_time'], name='doctor_slot_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'date', 'start_time'], condition=models.Q(appointment__isnull=True), name='doctor_slot_free_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} {self.date} {self.start_time}"
+
+
 class Vitals(models.Model):
     """
     Represents the vital signs and health measurements of a patient.
@@ -289,6 +424,7 @@ class Vitals(models.Model):
         temperature (Decimal): The temperature in Celsius.
         pulse (int): The pulse count.
         date (Date): The date of the vitals.
+        measured_at (DateTime): When a device took the reading, unique per user so a repeated sync is ignored.
         created_at (DateTime): The date and time when the vitals were created.
         updated_at (DateTime): The date and time when the vitals were last updated.
         last_updated_by (User): The user who last updated the vitals.
@@ -305,11 +441,22 @@ class Vitals(models.Model):
     temperature = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # Temperature in Celsius
     pulse = models.IntegerField(null=True, blank=True)  # Pulse count
     date = models.DateField(default=timezone.now, null=True, blank=True)
+    measured_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_updated_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='%(class)s_last_updated_by', null=True, blank=True)
     last_updated_at = models.DateTimeField(null=True, blank=True)
  
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='vitals_created_id_idx'),
+            models.Index(fields=['user', 'date', 'id'], name='vitals_user_date_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='vitals_user_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'measured_at'], name='vitals_user_measured_uniq'),
+        ]
+
     def __str__(self):
         return f"Vitals of {self.patient_info.user.username} on {self.date}"
     
@@ -335,6 +482,11 @@ class ToDoList(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='todo_created_by')
     updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='todo_updated_by')
  
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='todolist_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.title
     